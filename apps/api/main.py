@@ -5,6 +5,7 @@ This module initializes the FastAPI application with all routes,
 middleware, and startup/shutdown handlers.
 """
 
+import asyncio
 import os
 import pathlib
 from contextlib import asynccontextmanager
@@ -18,6 +19,8 @@ from fastapi.middleware.cors import CORSMiddleware
 load_dotenv(pathlib.Path(__file__).parent.parent.parent / ".env")
 
 from database import init_supabase
+from services import ai_clients, context_cache, executors, llm_cache, llm_gateway, metrics, prompt_budget
+from services.transcription_jobs import job_manager
 from routers import (
     assessment,
     auth,
@@ -77,10 +80,20 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
         print(f"Warning: Supabase initialization failed: {e}")
         print("The API will still work, but database features will be unavailable.")
 
+    await job_manager.start()
+    # Token counts use an estimate until the local tokenizers are loaded
+    tokenizers = asyncio.create_task(prompt_budget.preload(llm_gateway.GEMINI_MODELS))
+
     yield
 
     # Shutdown (cleanup if needed)
     print("Shutting down YouEdu API...")
+    tokenizers.cancel()
+    await job_manager.stop()
+    await context_cache.close()
+    await ai_clients.close_clients()
+    llm_cache.close()
+    executors.shutdown()
 
 
 # Create FastAPI application
@@ -149,6 +162,12 @@ async def health_check() -> dict:
     }
 
 
+@app.get("/api/metrics")
+async def get_metrics() -> dict:
+    """In-process service metrics (counters, gauges, latency percentiles)."""
+    return metrics.snapshot()
+
+
 @app.get("/")
 async def root() -> dict:
     """Root endpoint with API information."""
@@ -3,6 +3,7 @@ Router for Assessments - Checkpoints and Final Evaluations.
 """
 
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from uuid import uuid4
@@ -16,9 +17,11 @@ from schemas.assessment import (
 )
 from services.checkpoint_ai_service import (
     generate_checkpoint_questions as ai_generate_checkpoints,
+    generate_checkpoint_questions_progressively as ai_generate_checkpoints_progressively,
     calculate_checkpoint_score_impact,
     CHECKPOINT_PERCENTAGES
 )
+from services import checkpoint_progress, single_flight
 
 router = APIRouter()
 
@@ -28,6 +31,7 @@ checkpoint_results_db = {}
 final_assessments_db = {}
 assessment_results_db = {}
 generated_checkpoints_cache = {}  # Cache for generated checkpoints
+checkpoint_flights = single_flight.SingleFlight("checkpoints")
 
 
 # Request model for generating checkpoints
@@ -35,6 +39,9 @@ class GenerateCheckpointsRequest(BaseModel):
     video_id: str
     duration_seconds: int
     transcript: str
+    # Return once the first checkpoint is ready; fetch the rest via
+    # /checkpoints/{video_id}/progress or /checkpoints/{video_id}/events
+    progressive: bool = False
 
 
 # Request model for skipping a checkpoint
@@ -103,24 +110,81 @@ async def get_video_checkpoints(video_id: str, duration_seconds: int = 300) -> L
 
 @router.post("/checkpoints/generate")
 async def generate_ai_checkpoints(request: GenerateCheckpointsRequest) -> List[CheckpointQuestion]:
-    """Generate AI-powered checkpoint questions based on video transcript."""
+    """
+    Generate AI-powered checkpoint questions based on video transcript.
+
+    With "progressive": true, responds as soon as the first checkpoint is
+    ready; the others follow via /checkpoints/{video_id}/progress or
+    /checkpoints/{video_id}/events.
+    """
     cache_key = f"{request.video_id}:{request.duration_seconds}"
     
     # Check cache first
     if cache_key in generated_checkpoints_cache:
         return generated_checkpoints_cache[cache_key]
-    
-    # Generate checkpoints using AI
-    checkpoints = await ai_generate_checkpoints(
-        transcript=request.transcript,
-        duration_seconds=request.duration_seconds,
-        video_id=request.video_id
+
+    if request.progressive:
+        def remember(checkpoints: List[CheckpointQuestion]) -> None:
+            generated_checkpoints_cache[cache_key] = checkpoints
+
+        # Answer with the first checkpoint; the rest keep generating
+        run = checkpoint_progress.start(
+            request.video_id,
+            request.duration_seconds,
+            request.transcript,
+            len(CHECKPOINT_PERCENTAGES),
+            lambda emit: ai_generate_checkpoints_progressively(
+                request.transcript, request.duration_seconds, request.video_id, emit
+            ),
+            on_complete=remember,
+        )
+        await run.wait_for(1)
+        return list(run.checkpoints)
+    
+    async def generate() -> List[CheckpointQuestion]:
+        checkpoints = await ai_generate_checkpoints(
+            transcript=request.transcript,
+            duration_seconds=request.duration_seconds,
+            video_id=request.video_id
+        )
+        generated_checkpoints_cache[cache_key] = checkpoints
+        return checkpoints
+
+    # Generate checkpoints using AI, once for concurrent identical requests
+    fingerprint = single_flight.fingerprint(
+        request.video_id, request.duration_seconds, single_flight.normalize_text(request.transcript)
+    )
+    return await checkpoint_flights.do(fingerprint, generate)
+
+
+@router.get("/checkpoints/{video_id}/progress")
+async def get_checkpoint_progress(video_id: str):
+    """Checkpoints generated so far by a progressive generation, with its status."""
+    run = checkpoint_progress.get(video_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="No checkpoint generation for this video")
+    return run.view()
+
+
+@router.get("/checkpoints/{video_id}/events")
+async def stream_checkpoint_progress(video_id: str):
+    """
+    Stream a progressive generation as Server-Sent Events: a "progress"
+    event every time a checkpoint becomes ready, until it is complete.
+    """
+    run = checkpoint_progress.get(video_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="No checkpoint generation for this video")
+
+    async def event_stream():
+        async for view in run.updates():
+            yield f"event: progress\ndata: {json.dumps(view, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    
-    # Cache the result
-    generated_checkpoints_cache[cache_key] = checkpoints
-    
-    return checkpoints
 
 
 @router.post("/checkpoint/answer")
@@ -1,9 +1,12 @@
 from fastapi import APIRouter, HTTPException
 from schemas.challenges import ChallengeGenerateRequest, ChallengesResponse
+from services import single_flight
 from services.gemini_service import analyze_video
 
 router = APIRouter()
 
+challenge_flights = single_flight.SingleFlight("challenges")
+
 
 @router.post("/generate", response_model=ChallengesResponse)
 async def generate_challenges(request: ChallengeGenerateRequest):
@@ -16,9 +19,10 @@ async def generate_challenges(request: ChallengeGenerateRequest):
     3. Returns timestamped challenges (quiz or code exercises)
     """
     try:
-        result = await analyze_video(
-            video_base64=request.videoBase64,
-            mime_type=request.mimeType
+        fingerprint = single_flight.fingerprint(request.mimeType, request.videoBase64)
+        result = await challenge_flights.do(
+            fingerprint,
+            lambda: analyze_video(video_base64=request.videoBase64, mime_type=request.mimeType),
         )
         
         return ChallengesResponse(challenges=result['challenges'])
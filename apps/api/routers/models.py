@@ -2,9 +2,10 @@
 Router for Gemini model management and diagnostics.
 """
 from fastapi import APIRouter, HTTPException
-from google import genai
 import os
 
+from services import ai_clients, executors, llm_cache, llm_gateway
+
 router = APIRouter()
 
 API_KEY = os.getenv("GEMINI_API_KEY")
@@ -19,10 +20,10 @@ async def list_available_models():
         raise HTTPException(status_code=500, detail="GEMINI_API_KEY not configured")
     
     try:
-        client = genai.Client(api_key=API_KEY)
+        client = ai_clients.get_gemini_client(API_KEY)
         
         models = []
-        for model in client.models.list():
+        for model in await executors.run_blocking("llm", lambda: list(client.models.list())):
             models.append({
                 "name": model.name,
                 "display_name": getattr(model, 'display_name', model.name),
@@ -41,3 +42,20 @@ async def list_available_models():
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list models: {str(e)}")
+
+
+@router.get("/routing")
+async def get_model_routing():
+    """
+    Routing table of the LLM gateway: sticky model, current attempt order
+    and, per model, cooldown state, quota errors and latency.
+    """
+    return llm_gateway.router.snapshot(llm_gateway.GEMINI_MODELS)
+
+
+@router.get("/cache/stats")
+async def get_llm_cache_stats():
+    """
+    Persistent LLM response cache: entries, size and hit/miss counts per purpose.
+    """
+    return await llm_cache.stats()
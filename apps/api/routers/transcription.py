@@ -2,17 +2,46 @@
 Router for video transcription endpoints
 """
 
-from fastapi import APIRouter, HTTPException, UploadFile, File
+import json
+import os
+
+from fastapi import APIRouter, HTTPException, UploadFile, File, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
 from services.transcription_service import (
+    UploadTooLargeError,
+    save_upload_to_disk,
     transcribe_video,
     generate_quiz_from_transcript
 )
 from services.captions_service import get_youtube_captions, get_captions_from_url
+from services import local_asr, single_flight, streaming_transcription, transcript_cache, transcription_service
+from services.transcription_jobs import job_manager, public_view
 
 router = APIRouter()
 
+quiz_flights = single_flight.SingleFlight("quiz")
+
+
+class UploadStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that removes the saved upload it streams from once the
+    response is over, including when the client disconnects before the body
+    generator ever runs.
+    """
+
+    def __init__(self, upload_path: str, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_path = upload_path
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if os.path.exists(self.upload_path):
+                os.unlink(self.upload_path)
+
 
 class CaptionsRequest(BaseModel):
     video_id: str = None
@@ -21,7 +50,11 @@ class CaptionsRequest(BaseModel):
 
 
 @router.post("/transcribe")
-async def transcribe_video_endpoint(file: UploadFile = File(...)):
+async def transcribe_video_endpoint(
+    file: UploadFile = File(...),
+    profile: str = Query("accurate", description="accurate | fast"),
+    upgrade: bool = Query(False, description="Re-run the accurate profile in the background"),
+):
     """
     Transcribe uploaded video file using real transcription services.
     
@@ -30,14 +63,149 @@ async def transcribe_video_endpoint(file: UploadFile = File(...)):
     2. AssemblyAI
     3. Gemini AI
     
+    The upload is streamed to disk in chunks (never fully buffered in
+    memory) and rejected with 413 once it exceeds TRANSCRIPTION_MAX_UPLOAD_MB.
+    Re-uploads of identical media are served from the transcript cache.
+
+    profile=fast returns a quicker, cheaper preview. With upgrade=true the
+    accurate profile is then run as a background job (see /jobs); its id
+    is returned as "upgrade_job_id", and once it finishes the accurate
+    transcript replaces the preview for this media.
+
     Returns transcript with timestamps.
     """
+    if profile not in transcription_service.PROFILES:
+        raise HTTPException(status_code=400, detail=f"Unknown profile: {profile}")
+
+    try:
+        upload = await save_upload_to_disk(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
     try:
-        video_data = await file.read()
-        transcript_data = await transcribe_video(video_data, file.content_type or "video/mp4")
+        transcript_data = await transcribe_video(
+            upload.path,
+            content_hash=upload.sha256,
+            size_bytes=upload.size_bytes,
+            profile=profile,
+        )
+        default_profile = transcription_service.DEFAULT_PROFILE
+        if upgrade and transcript_data.get("profile", default_profile) != default_profile:
+            job, _ = await job_manager.submit(upload, file.filename or "")
+            transcript_data = {**transcript_data, "upgrade_job_id": job["id"]}
         return transcript_data
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
+    finally:
+        if os.path.exists(upload.path):
+            os.unlink(upload.path)
+
+
+@router.post("/transcribe/stream")
+async def transcribe_video_stream_endpoint(file: UploadFile = File(...)):
+    """
+    Transcribe an uploaded video, streaming segments as Server-Sent Events
+    while the audio is still being decoded.
+
+    Emits a "segment" event per recognized segment and a final "done" event
+    with the full transcript (or "error"). Without Google Cloud streaming
+    recognition, the regular provider chain runs and its segments are sent
+    when it finishes. Media transcribed before is replayed from the
+    transcript cache, and streamed transcripts are cached for next time.
+    """
+    try:
+        upload = await save_upload_to_disk(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    def sse(event: str, data) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    async def event_stream():
+        try:
+            cached = await transcription_service.cached_transcript(
+                upload.sha256, transcription_service.DEFAULT_PROFILE, upload.size_bytes
+            )
+            if cached is not None:
+                result = cached
+                for segment in result.get("segments") or []:
+                    yield sse("segment", segment)
+            elif streaming_transcription.is_available():
+                segments = []
+                async for segment in streaming_transcription.iter_segments(upload.path):
+                    segments.append(segment)
+                    yield sse("segment", segment)
+                result = streaming_transcription.result_from_segments(segments)
+                if segments:
+                    key = transcript_cache.make_key(
+                        upload.sha256, transcription_service.transcription_settings()
+                    )
+                    await transcript_cache.put(key, result)
+            else:
+                result = await transcribe_video(
+                    upload.path, content_hash=upload.sha256, size_bytes=upload.size_bytes
+                )
+                for segment in result.get("segments") or []:
+                    yield sse("segment", segment)
+            yield sse("done", result)
+        except Exception as e:
+            yield sse("error", {"detail": f"Transcription failed: {str(e)}"})
+
+    return UploadStreamingResponse(
+        upload.path,
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/jobs", status_code=202)
+async def submit_transcription_job(file: UploadFile = File(...)):
+    """
+    Submit a video for background transcription and return immediately.
+
+    The response carries a job_id to poll (GET /jobs/{job_id}) or follow
+    over Server-Sent Events (GET /jobs/{job_id}/events). Submitting media
+    that already has a job returns that job with "attached": true.
+    """
+    try:
+        upload = await save_upload_to_disk(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    job, created = await job_manager.submit(upload, file.filename or "")
+    return {**public_view(job), "attached": not created}
+
+
+@router.get("/jobs/{job_id}")
+async def get_transcription_job(job_id: str):
+    """
+    Current state of a transcription job: status, stage, progress (0-1),
+    and the transcript once done.
+    """
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return public_view(job)
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_transcription_job(job_id: str):
+    """
+    Stream job progress as Server-Sent Events until it is done or failed.
+    """
+    if await job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        async for job in job_manager.events(job_id):
+            yield f"event: progress\ndata: {json.dumps(job, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.post("/youtube-captions")
@@ -104,9 +272,12 @@ async def generate_quiz_endpoint(request: QuizRequest):
         if not request.transcript:
             raise HTTPException(status_code=400, detail="Transcript text is required")
 
-        quiz_data = generate_quiz_from_transcript(
-            request.transcript,
-            request.duration_seconds
+        fingerprint = single_flight.fingerprint(
+            single_flight.normalize_text(request.transcript), request.duration_seconds
+        )
+        quiz_data = await quiz_flights.do(
+            fingerprint,
+            lambda: generate_quiz_from_transcript(request.transcript, request.duration_seconds),
         )
 
         return quiz_data
@@ -119,20 +290,45 @@ async def generate_quiz_endpoint(request: QuizRequest):
 @router.get("/providers")
 async def get_available_providers():
     """
-    Check which transcription providers are configured.
+    Check which transcription providers are configured, plus their
+    circuit-breaker state, latency/error EWMAs and the current attempt order.
     """
     import os
     
     google_cloud = bool(os.getenv("GOOGLE_APPLICATION_CREDENTIALS"))
     assemblyai = bool(os.getenv("ASSEMBLYAI_API_KEY"))
     gemini = bool(os.getenv("GEMINI_API_KEY"))
+    local = local_asr.is_available()
+    
+    health = transcription_service.provider_health.snapshot(transcription_service.PROVIDER_ORDER)
+    
+    providers = {
+        "google_cloud": {"configured": google_cloud, "priority": 1, "health": health["google_cloud"]},
+        "assemblyai": {"configured": assemblyai, "priority": 2, "health": health["assemblyai"]},
+        "gemini": {"configured": gemini, "priority": 3, "health": health["gemini"]}
+    }
+    if "local" in transcription_service.PROVIDER_ORDER:
+        providers["local"] = {
+            "configured": local,
+            "priority": transcription_service.PROVIDER_ORDER.index("local") + 1,
+            "mode": local_asr.MODE,
+            "health": health["local"],
+        }
     
     return {
-        "providers": {
-            "google_cloud": {"configured": google_cloud, "priority": 1},
-            "assemblyai": {"configured": assemblyai, "priority": 2},
-            "gemini": {"configured": gemini, "priority": 3}
-        },
-        "active_count": sum([google_cloud, assemblyai, gemini]),
+        "providers": providers,
+        "active_count": sum([google_cloud, assemblyai, gemini, local]),
+        "policy": transcription_service.PROVIDER_POLICY,
+        "order": transcription_service.provider_health.order(
+            transcription_service.configured_providers()
+        ),
         "message": "At least one provider must be configured for transcription"
     }
+
+
+@router.get("/cache/stats")
+async def get_transcript_cache_stats():
+    """
+    Transcript cache usage: entries, size, hit/miss counts and bytes saved.
+    """
+    return await transcript_cache.stats()
@@ -24,6 +24,19 @@ class CheckpointQuestion(BaseModel):
     timestamp_seconds: int = Field(..., description="When to show this checkpoint")
 
 
+class CheckpointQuestionContent(BaseModel):
+    """The generated part of a CheckpointQuestion (no id or timestamp yet)."""
+    question: str = Field(..., min_length=1)
+    options: List[str] = Field(..., min_length=4, max_length=4)
+    correct_answer: int = Field(..., ge=0, le=3)
+    explanation: str = ""
+
+
+class GeneratedCheckpoint(CheckpointQuestionContent):
+    """A checkpoint question from a batched generation, tagged with its segment."""
+    segment: int = Field(..., description="1-based transcript segment the question is about")
+
+
 class CheckpointResult(BaseModel):
     """Result of a checkpoint answer."""
     checkpoint_id: str
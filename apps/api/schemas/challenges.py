@@ -31,6 +31,11 @@ class CodeChallenge(ChallengeBase):
 Challenge = Union[QuizChallenge, CodeChallenge]
 
 
+class GeneratedChallenges(BaseModel):
+    """Video analysis output as generated by Gemini (also its response schema)."""
+    challenges: list[Challenge]
+
+
 class ChallengeGenerateRequest(BaseModel):
     videoBase64: str = Field(..., description="Base64 encoded video data")
     mimeType: str = Field(..., description="Video MIME type (e.g., video/mp4)")
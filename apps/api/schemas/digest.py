@@ -0,0 +1,12 @@
+"""
+Pydantic schemas for transcript digests (see services/transcript_digest).
+"""
+
+from pydantic import BaseModel, Field
+from typing import List
+
+
+class TranscriptSummary(BaseModel):
+    """Summary of a transcript chunk or group of summaries (also its response schema)."""
+    summary: str = Field(..., min_length=1)
+    key_points: List[str] = []
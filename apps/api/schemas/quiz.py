@@ -0,0 +1,28 @@
+"""
+Pydantic schemas for transcript quizzes (POST /api/transcription/generate-quiz).
+"""
+
+from pydantic import BaseModel, Field
+from typing import List
+
+
+class QuizQuestion(BaseModel):
+    id: str
+    question: str = Field(..., min_length=1)
+    options: List[str] = Field(..., min_length=2)
+    correctAnswer: int = Field(..., ge=0)
+    explanation: str = ""
+
+
+class CodingExercise(BaseModel):
+    id: str
+    title: str
+    description: str
+    starterCode: str = ""
+    expectedOutput: str = ""
+
+
+class GeneratedQuiz(BaseModel):
+    """The quiz as generated by Gemini (also its response schema)."""
+    questions: List[QuizQuestion]
+    codingExercises: List[CodingExercise] = []
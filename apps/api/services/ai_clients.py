@@ -0,0 +1,126 @@
+"""
+Process-wide AI SDK clients.
+
+Building a genai.Client or a SpeechClient sets up a new HTTP connection
+pool or gRPC channel, so constructing one per request pays the TCP/TLS
+(and HTTP/2) handshake every time. This registry creates each client once
+per process, on first use, and shares it:
+
+- Gemini clients are backed by keep-alive httpx clients (HTTP/2 when the
+  ``h2`` package is installed) for both the sync and async APIs, one per
+  API key.
+- The Google Cloud Speech client keeps a single gRPC channel. Setting
+  SPEECH_EMULATOR_HOST points it at a plaintext local emulator or fake
+  server instead of speech.googleapis.com.
+
+close_clients() is called from the FastAPI lifespan on shutdown.
+"""
+
+import os
+import threading
+from typing import Dict, List, Optional
+
+import httpx
+from google import genai
+from google.genai import types
+
+try:
+    import grpc
+    from google.cloud import speech
+    from google.cloud.speech_v1.services.speech.transports import SpeechGrpcTransport
+    GOOGLE_CLOUD_AVAILABLE = True
+except ImportError:
+    GOOGLE_CLOUD_AVAILABLE = False
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Connection pool sizing for the shared Gemini HTTP clients
+MAX_CONNECTIONS = int(os.getenv("GEMINI_MAX_CONNECTIONS", "32"))
+KEEPALIVE_SECONDS = float(os.getenv("GEMINI_KEEPALIVE_SECONDS", "120"))
+
+# host:port of a local Speech emulator / fake server (plaintext gRPC)
+SPEECH_EMULATOR_HOST = os.getenv("SPEECH_EMULATOR_HOST")
+
+_lock = threading.Lock()
+_gemini_clients: Dict[str, genai.Client] = {}
+_http_clients: List[httpx.Client] = []
+_async_http_clients: List[httpx.AsyncClient] = []
+_speech_client = None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_SECONDS,
+    )
+
+
+def get_gemini_client(api_key: Optional[str] = None) -> genai.Client:
+    """Shared Gemini client for api_key (defaults to GEMINI_API_KEY)."""
+    api_key = api_key or os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise Exception("GEMINI_API_KEY not set")
+
+    client = _gemini_clients.get(api_key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _gemini_clients.get(api_key)
+        if client is None:
+            http_client = httpx.Client(http2=HTTP2_AVAILABLE, limits=_limits())
+            async_http_client = httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=_limits())
+            client = genai.Client(
+                api_key=api_key,
+                http_options=types.HttpOptions(
+                    httpx_client=http_client,
+                    httpx_async_client=async_http_client,
+                ),
+            )
+            _http_clients.append(http_client)
+            _async_http_clients.append(async_http_client)
+            _gemini_clients[api_key] = client
+        return client
+
+
+def get_speech_client():
+    """Shared Google Cloud Speech client (one gRPC channel per process)."""
+    global _speech_client
+    if not GOOGLE_CLOUD_AVAILABLE:
+        raise Exception("google-cloud-speech not installed")
+
+    if _speech_client is None:
+        with _lock:
+            if _speech_client is None and SPEECH_EMULATOR_HOST:
+                channel = grpc.insecure_channel(SPEECH_EMULATOR_HOST)
+                _speech_client = speech.SpeechClient(
+                    transport=SpeechGrpcTransport(channel=channel)
+                )
+            elif _speech_client is None:
+                _speech_client = speech.SpeechClient()
+    return _speech_client
+
+
+async def close_clients() -> None:
+    """Close every shared client and its connections."""
+    global _speech_client
+    with _lock:
+        http_clients = list(_http_clients)
+        async_http_clients = list(_async_http_clients)
+        speech_client = _speech_client
+        _gemini_clients.clear()
+        _http_clients.clear()
+        _async_http_clients.clear()
+        _speech_client = None
+
+    for http_client in http_clients:
+        http_client.close()
+    for async_http_client in async_http_clients:
+        await async_http_client.aclose()
+    if speech_client is not None:
+        speech_client.transport.close()
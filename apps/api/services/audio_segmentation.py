@@ -0,0 +1,383 @@
+"""
+Audio segmentation helpers for the transcription pipeline.
+
+Splits the extracted 16 kHz mono WAV into chunks cut at silence
+boundaries (so no word is cut in half) and stitches the per-chunk
+transcripts back into a single timeline.
+
+Sources are WAV file paths (as produced by the media pipeline) or WAV
+bytes. Silence detection only decodes a small window around each planned
+cut, so planning stays cheap for a 90-minute lecture, and chunks are
+copied block by block.
+
+trim_silence() removes long pauses before transcription and returns an
+OffsetMap that maps timestamps in the trimmed audio back to the original
+video timeline.
+"""
+
+import bisect
+import io
+import os
+import re
+import wave
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+try:
+    from pydub import AudioSegment
+    from pydub.silence import detect_silence
+    from pydub.utils import audioop
+    PYDUB_AVAILABLE = True
+except ImportError:
+    PYDUB_AVAILABLE = False
+
+# How far around a planned cut point to look for a pause
+SILENCE_SEARCH_SECONDS = 20.0
+MIN_SILENCE_MS = 400
+# Silence is anything this many dB below the window's average loudness
+SILENCE_RELATIVE_DB = 16
+
+# Audio repeated at the start of the next chunk so boundary words survive
+CHUNK_OVERLAP_SECONDS = 1.0
+
+# Frames copied per read when writing chunks
+COPY_BLOCK_FRAMES = 16000 * 10
+
+# Silence trimming: pauses longer than TRIM_MIN_SILENCE_SECONDS are cut,
+# keeping TRIM_PAD_SECONDS of the pause on each side of the cut
+TRIM_ENABLED = os.getenv("TRANSCRIPTION_TRIM_SILENCE", "true").lower() == "true"
+TRIM_MIN_SILENCE_SECONDS = float(os.getenv("TRANSCRIPTION_TRIM_MIN_SILENCE_SECONDS", "2.0"))
+TRIM_PAD_SECONDS = 0.3
+# Below this much removable silence the audio is left untouched
+TRIM_MIN_SAVED_SECONDS = 5.0
+# Energy analysis frame, and how far below the speech level (the 90th
+# percentile frame energy) a frame must be to count as silence
+TRIM_FRAME_MS = 30
+TRIM_RELATIVE_DB = 30
+
+WavSource = Union[str, bytes]
+
+
+def _open(source: WavSource) -> wave.Wave_read:
+    return wave.open(io.BytesIO(source) if isinstance(source, bytes) else source, "rb")
+
+
+def wav_duration(source: WavSource) -> float:
+    """Duration of WAV audio in seconds."""
+    with _open(source) as wav:
+        return wav.getnframes() / float(wav.getframerate())
+
+
+def _read_window(wav: wave.Wave_read, start_s: float, end_s: float) -> bytes:
+    rate = wav.getframerate()
+    start = max(0, int(start_s * rate))
+    end = min(wav.getnframes(), int(end_s * rate))
+    wav.setpos(start)
+    return wav.readframes(max(0, end - start))
+
+
+def find_silence_near(
+    wav: wave.Wave_read,
+    target_s: float,
+    search_s: float = SILENCE_SEARCH_SECONDS,
+) -> float:
+    """
+    Return the midpoint of the pause closest to target_s (in seconds).
+
+    Falls back to target_s itself when pydub is unavailable or the window
+    contains no pause long enough.
+    """
+    if not PYDUB_AVAILABLE:
+        return target_s
+
+    window_start = max(0.0, target_s - search_s)
+    data = _read_window(wav, window_start, target_s + search_s)
+    if not data:
+        return target_s
+
+    segment = AudioSegment(
+        data=data,
+        sample_width=wav.getsampwidth(),
+        frame_rate=wav.getframerate(),
+        channels=wav.getnchannels(),
+    )
+    if segment.dBFS == float("-inf"):
+        return target_s  # the whole window is digital silence
+
+    pauses = detect_silence(
+        segment,
+        min_silence_len=MIN_SILENCE_MS,
+        silence_thresh=segment.dBFS - SILENCE_RELATIVE_DB,
+        seek_step=10,
+    )
+    if not pauses:
+        return target_s
+
+    midpoints = [window_start + (start + end) / 2000.0 for start, end in pauses]
+    return min(midpoints, key=lambda point: abs(point - target_s))
+
+
+def plan_chunks(source: WavSource, chunk_seconds: float) -> List[Tuple[float, float]]:
+    """
+    Plan (start, end) ranges of roughly chunk_seconds, cut at pauses.
+
+    Audio shorter than 1.5 chunks is returned as a single range.
+    """
+    with _open(source) as wav:
+        duration = wav.getnframes() / float(wav.getframerate())
+        if duration < chunk_seconds * 1.5:
+            return [(0.0, duration)]
+
+        cuts = [0.0]
+        while duration - cuts[-1] >= chunk_seconds * 1.5:
+            cut = find_silence_near(wav, cuts[-1] + chunk_seconds)
+            if cut <= cuts[-1] + chunk_seconds / 2:
+                cut = cuts[-1] + chunk_seconds  # keep chunks from collapsing
+            cuts.append(cut)
+        cuts.append(duration)
+
+    return list(zip(cuts[:-1], cuts[1:], strict=True))
+
+
+def _copy_frames(src: wave.Wave_read, dst: wave.Wave_write, position: int, end: int) -> None:
+    end = min(src.getnframes(), end)
+    src.setpos(position)
+    while position < end:
+        count = min(COPY_BLOCK_FRAMES, end - position)
+        dst.writeframes(src.readframes(count))
+        position += count
+
+
+def slice_wav(source: WavSource, start_s: float, end_s: float) -> bytes:
+    """Return the [start_s, end_s) range of WAV audio as a new WAV."""
+    output = io.BytesIO()
+    with _open(source) as src, wave.open(output, "wb") as dst:
+        dst.setparams(src.getparams())
+        rate = src.getframerate()
+        _copy_frames(src, dst, max(0, int(start_s * rate)), int(end_s * rate))
+    return output.getvalue()
+
+
+def write_slice(source: WavSource, start_s: float, end_s: float, target: str) -> None:
+    """Write the [start_s, end_s) range of WAV audio to a WAV file, block by block."""
+    with _open(source) as src, wave.open(target, "wb") as dst:
+        dst.setparams(src.getparams())
+        rate = src.getframerate()
+        _copy_frames(src, dst, max(0, int(start_s * rate)), int(end_s * rate))
+
+
+def chunk_ranges(source: WavSource, chunk_seconds: float) -> List[Tuple[float, float]]:
+    """
+    Silence-aligned (offset, end) ranges to transcribe separately.
+
+    Each range after the first starts CHUNK_OVERLAP_SECONDS early so words
+    spoken right at the cut are heard by both sides; the duplicates are
+    removed by merge_chunk_results.
+    """
+    return [
+        (max(0.0, start - CHUNK_OVERLAP_SECONDS) if start > 0 else 0.0, end)
+        for start, end in plan_chunks(source, chunk_seconds)
+    ]
+
+
+def split_wav(source: WavSource, chunk_seconds: float) -> List[Tuple[bytes, float]]:
+    """
+    Split WAV audio into silence-aligned, overlapping chunks (see
+    chunk_ranges). Returns (chunk_wav, offset_seconds) pairs.
+    """
+    return [
+        (slice_wav(source, offset, end), offset)
+        for offset, end in chunk_ranges(source, chunk_seconds)
+    ]
+
+
+class OffsetMap:
+    """
+    Maps timestamps in trimmed audio back to the original timeline.
+
+    Stores one (trimmed_start, original_start) pair per kept span, so the
+    map stays small however many pauses were removed.
+    """
+
+    def __init__(
+        self,
+        spans: List[Tuple[float, float]],
+        original_duration: float,
+        trimmed_duration: float,
+    ):
+        self.spans = spans
+        self.original_duration = original_duration
+        self.trimmed_duration = trimmed_duration
+        self._starts = [trimmed for trimmed, _ in spans]
+
+    @property
+    def trimmed_seconds(self) -> float:
+        """Seconds of audio removed."""
+        return max(0.0, self.original_duration - self.trimmed_duration)
+
+    def to_original(self, seconds: float, is_end: bool = False) -> float:
+        """
+        Original timestamp for a timestamp in the trimmed audio.
+
+        A time exactly on a cut belongs to the span before it when is_end
+        is set (so segment ends don't jump across the removed pause).
+        """
+        find = bisect.bisect_left if is_end else bisect.bisect_right
+        index = max(0, find(self._starts, seconds) - 1)
+        trimmed, original = self.spans[index]
+        return original + seconds - trimmed
+
+    def remap_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Shift a transcription result's segments onto the original timeline."""
+        segments = [
+            {
+                **segment,
+                "start": round(self.to_original(float(segment.get("start", 0))), 3),
+                "end": round(self.to_original(float(segment.get("end", 0)), is_end=True), 3),
+            }
+            for segment in result.get("segments") or []
+        ]
+        remapped = {**result, "segments": segments}
+        if segments:
+            remapped["duration"] = segments[-1]["end"]
+        return remapped
+
+
+def trim_silence(
+    source: WavSource,
+    target: str,
+    min_silence_s: float = TRIM_MIN_SILENCE_SECONDS,
+    pad_s: float = TRIM_PAD_SECONDS,
+) -> OffsetMap:
+    """
+    Cut pauses longer than min_silence_s out of WAV audio, writing the
+    trimmed WAV to the target file.
+
+    Energy is measured per TRIM_FRAME_MS frame; frames more than
+    TRIM_RELATIVE_DB below the speech level are silence. The audio is read
+    block by block, so memory stays flat however long the lecture is.
+    Returns the OffsetMap back to the original timeline. When less than
+    TRIM_MIN_SAVED_SECONDS would be removed (or pydub is unavailable) the
+    target is not written and an identity map is returned.
+    """
+    with _open(source) as wav:
+        params = wav.getparams()
+        rate, width = wav.getframerate(), wav.getsampwidth()
+        duration = params.nframes / float(rate)
+        identity = OffsetMap([(0.0, 0.0)], duration, duration)
+        if not PYDUB_AVAILABLE or duration < min_silence_s:
+            return identity
+
+        frame_samples = int(rate * TRIM_FRAME_MS / 1000)
+        frame_bytes = frame_samples * width * params.nchannels
+        block_frames = frame_samples * max(1, COPY_BLOCK_FRAMES // frame_samples)
+        energies: List[int] = []
+        while True:
+            block = wav.readframes(block_frames)
+            if not block:
+                break
+            energies.extend(
+                audioop.rms(block[start:start + frame_bytes], width)
+                for start in range(0, len(block), frame_bytes)
+            )
+
+    speech_level = sorted(energies)[int(len(energies) * 0.9)]
+    if speech_level == 0:
+        return identity  # all digital silence: leave it to the providers
+    threshold = speech_level * 10 ** (-TRIM_RELATIVE_DB / 20)
+
+    # Ranges of the original audio to cut, in frames of the energy analysis
+    frame_s = frame_samples / float(rate)
+    min_frames = int(min_silence_s / frame_s)
+    pad_frames = int(pad_s / frame_s)
+    cuts: List[Tuple[int, int]] = []
+    run_start = None
+    for index, energy in enumerate(energies + [threshold + 1]):
+        if energy < threshold:
+            if run_start is None:
+                run_start = index
+            continue
+        if run_start is not None and index - run_start >= min_frames:
+            start = run_start + pad_frames if run_start > 0 else 0
+            end = index - pad_frames if index < len(energies) else len(energies)
+            if end > start:
+                cuts.append((start, end))
+        run_start = None
+
+    if sum(end - start for start, end in cuts) * frame_s < TRIM_MIN_SAVED_SECONDS:
+        return identity
+
+    spans: List[Tuple[float, float]] = []
+    with _open(source) as src, wave.open(target, "wb") as dst:
+        dst.setparams(params)
+        position = 0
+        for start, end in cuts + [(len(energies), len(energies))]:
+            if start > position:
+                spans.append((dst.tell() / float(rate), position * frame_s))
+                _copy_frames(src, dst, position * frame_samples, start * frame_samples)
+            position = end
+        trimmed_duration = dst.tell() / float(rate)
+    return OffsetMap(spans, duration, trimmed_duration)
+
+
+def _normalize_word(word: str) -> str:
+    return re.sub(r"[^\w]", "", word.lower())
+
+
+def _boundary_overlap(previous: List[str], current: List[str], max_words: int = 8) -> int:
+    """Number of leading words of current that repeat the tail of previous."""
+    prev = [_normalize_word(w) for w in previous[-max_words:]]
+    curr = [_normalize_word(w) for w in current[:max_words]]
+    for size in range(min(len(prev), len(curr)), 0, -1):
+        if prev[-size:] == curr[:size]:
+            return size
+    return 0
+
+
+def merge_chunk_results(results: List[Tuple[float, Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Stitch per-chunk transcription results into one transcript.
+
+    results holds (offset_seconds, provider_result) pairs in timeline order.
+    Segment timestamps are shifted by each chunk's offset, and segments
+    falling inside the overlap with the previous chunk have their repeated
+    leading words removed. A chunk transcript without segments keeps its
+    place in the timeline: its text goes between the previous and the
+    next chunk's segments.
+    """
+    segments: List[Dict[str, Any]] = []
+    texts: List[str] = []
+    providers: List[str] = []
+    language: Optional[str] = None
+
+    for offset, result in results:
+        provider = result.get("provider")
+        if provider and provider not in providers:
+            providers.append(provider)
+        language = language or result.get("language")
+
+        chunk_segments = result.get("segments") or []
+        if not chunk_segments and result.get("transcript"):
+            texts.append(result["transcript"])
+            continue
+
+        for segment in chunk_segments:
+            start = float(segment.get("start", 0)) + offset
+            end = float(segment.get("end", 0)) + offset
+            words = str(segment.get("text", "")).split()
+
+            if segments and start < segments[-1]["end"]:
+                words = words[_boundary_overlap(segments[-1]["text"].split(), words):]
+                if not words:
+                    continue
+
+            segments.append({"start": start, "end": end, "text": " ".join(words)})
+            texts.append(segments[-1]["text"])
+
+    return {
+        "transcript": " ".join(texts),
+        "segments": segments,
+        "duration": segments[-1]["end"] if segments else 0,
+        "language": language or "pt-BR",
+        "provider": "+".join(providers),
+        "chunks": len(results),
+    }
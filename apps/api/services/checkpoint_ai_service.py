@@ -4,28 +4,28 @@ Questions are based on video transcript segments.
 """
 
 import os
-import json
 import time
-from typing import List, Optional
-from google import genai
+import asyncio
+from typing import Callable, Dict, List, Optional
 from google.genai import types
+from pydantic import ValidationError
 
-from schemas.assessment import CheckpointQuestion
+from schemas.assessment import CheckpointQuestion, CheckpointQuestionContent, GeneratedCheckpoint
+from services import context_cache, llm_gateway, prompt_budget, transcript_digest
 
 # Configure Gemini API
 api_key = os.getenv("GEMINI_API_KEY")
 
-# Model fallback order (same as gemini_service)
-GEMINI_MODELS = [
-    "gemini-2.0-flash",
-    "gemini-2.5-flash-lite", 
-    "gemini-2.0-flash-lite",
-    "gemini-2.5-flash",
-]
-
 # Checkpoint percentages (25%, 50%, 75%, 100%)
 CHECKPOINT_PERCENTAGES = [0.25, 0.50, 0.75, 1.00]
 
+# "batched": one Gemini call for all segments (per-segment calls only for
+# slots that fail validation); "per_segment": one call per segment
+GENERATION_MODE = os.getenv("CHECKPOINT_GENERATION_MODE", "batched").lower()
+
+# Bump when the checkpoint prompt changes (invalidates cached responses)
+CHECKPOINT_PROMPT_VERSION = "1"
+
 # System prompt for checkpoint question generation
 CHECKPOINT_SYSTEM_PROMPT = """
 Você é um tutor pedagógico especialista. Sua tarefa é criar UMA pergunta de múltipla escolha 
@@ -49,42 +49,31 @@ FORMATO DE SAÍDA (JSON):
 IMPORTANTE: Retorne APENAS o JSON, sem texto adicional.
 """
 
+# System prompt for generating every checkpoint in one call
+CHECKPOINT_BATCH_PROMPT = """
+Você é um tutor pedagógico especialista. Sua tarefa é criar UMA pergunta de múltipla escolha
+para CADA trecho de transcrição fornecido abaixo.
 
-def _call_gemini_with_fallback(client: genai.Client, contents: list, config: types.GenerateContentConfig) -> str:
-    """
-    Try multiple Gemini models with fallback on quota/not-found errors.
-    """
-    last_error = None
-    
-    for model in GEMINI_MODELS:
-        try:
-            print(f"[Checkpoint AI] Trying model: {model}")
-            response = client.models.generate_content(
-                model=model,
-                contents=contents,
-                config=config
-            )
-            if response.text:
-                print(f"[Checkpoint AI] Success with model: {model}")
-                return response.text
-            else:
-                print(f"[Checkpoint AI] Empty response from {model}, trying next...")
-                continue
-                
-        except Exception as e:
-            error_str = str(e)
-            print(f"[Checkpoint AI] Model {model} failed: {error_str[:200]}")
-            
-            if "429" in error_str or "RESOURCE_EXHAUSTED" in error_str:
-                last_error = e
-                continue
-            elif "404" in error_str or "NOT_FOUND" in error_str:
-                last_error = e
-                continue
-            else:
-                raise e
-    
-    raise Exception(f"All Gemini models failed. Last error: {last_error}")
+REGRAS:
+1. Cada pergunta deve testar a compreensão do conteúdo do seu trecho.
+2. Crie 4 opções de resposta (A, B, C, D) por pergunta.
+3. Apenas uma resposta deve estar correta.
+4. Inclua uma breve explicação da resposta correta.
+5. As perguntas devem ser claras e objetivas.
+
+FORMATO DE SAÍDA (JSON): uma lista com uma pergunta por segmento, na ordem dos segmentos.
+[
+    {
+        "segment": 1,
+        "question": "Sua pergunta aqui?",
+        "options": ["Opção A", "Opção B", "Opção C", "Opção D"],
+        "correct_answer": 0,
+        "explanation": "Explicação breve da resposta correta."
+    }
+]
+
+IMPORTANTE: Retorne APENAS o JSON, sem texto adicional.
+"""
 
 
 def _split_transcript_into_segments(transcript: str, num_segments: int = 4) -> List[str]:
@@ -110,17 +99,145 @@ def _split_transcript_into_segments(transcript: str, num_segments: int = 4) -> L
     return segments
 
 
-def _generate_question_for_segment(client: genai.Client, segment: str, segment_index: int) -> Optional[dict]:
+def _validate_question(data: object, segment_index: int) -> Optional[dict]:
+    """Return the question as a dict if it is usable, else None."""
+    if not isinstance(data, dict):
+        return None
+    try:
+        question = GeneratedCheckpoint.model_validate({**data, "segment": segment_index + 1})
+    except ValidationError as e:
+        print(f"[Checkpoint AI] Invalid question for segment {segment_index}: {e.errors()[:1]}")
+        return None
+    return question.model_dump()
+
+
+def _segment_excerpt(
+    segment: str,
+    budget: int,
+    model: str,
+    summary: Optional[str] = None,
+    in_context: bool = False,
+) -> str:
+    """
+    Segment text for a prompt: the segment sampled into budget or, when a
+    digest summary or the whole transcript (cached context) covers it,
+    only short raw excerpts that anchor the question.
+    """
+    if not summary and not in_context:
+        return prompt_budget.fit_text(segment, budget, model)
+    excerpt_budget = min(budget, prompt_budget.SECTION_BUDGETS["checkpoint_excerpt"])
+    excerpt = prompt_budget.fit_text(segment, excerpt_budget, model)
+    if summary:
+        return f"Resumo do trecho: {summary}\n\nTrechos da transcrição: {excerpt}"
+    return f"Trechos deste segmento na transcrição completa acima: {excerpt}"
+
+
+async def _segment_summaries(transcript: str, count: int, build: bool = True) -> List[Optional[str]]:
+    """
+    Digest summary of each of count equal segments (all None without a
+    digest). With build=False only an already built digest is used.
+    """
+    if build:
+        digest = await transcript_digest.get_digest(transcript)
+    else:
+        digest = await transcript_digest.cached_digest(transcript)
+    if digest is None:
+        return [None] * count
+    return [digest.section(i / count, (i + 1) / count) for i in range(count)]
+
+
+async def _generate_questions_batched(
+    segments: List[str],
+    summaries: Optional[List[Optional[str]]] = None,
+    shared_context: Optional[str] = None,
+) -> Dict[int, dict]:
+    """
+    Generate a question for every segment in a single Gemini call.
+
+    Returns the valid questions by segment index; slots that are missing or
+    fail validation are left out for the caller to fill.
+    """
+    output_tokens = 1024 * len(segments)
+    model = llm_gateway.routed_model()
+    budget = prompt_budget.section_budget(
+        "checkpoint_segment",
+        CHECKPOINT_BATCH_PROMPT,
+        output_tokens,
+        llm_gateway.GEMINI_MODELS,
+        parts=len(segments),
+        model=model,
+    )
+    excerpts = "\n".join(
+        f'SEGMENTO {i + 1}:\n"""\n{_segment_excerpt(segment, budget, model, summary, shared_context is not None)}\n"""\n'
+        for i, (segment, summary) in enumerate(zip(segments, summaries or [None] * len(segments), strict=True))
+    )
+    prompt = f"""
+{CHECKPOINT_BATCH_PROMPT}
+
+{excerpts}
+Crie exatamente {len(segments)} perguntas, uma para cada segmento.
+"""
+
+    contents = [
+        types.Content(
+            role="user",
+            parts=[types.Part.from_text(text=prompt)]
+        )
+    ]
+
+    config = types.GenerateContentConfig(
+        temperature=0.7,
+        top_p=0.95,
+        top_k=40,
+        max_output_tokens=output_tokens,
+        response_mime_type="application/json",
+        response_schema=list[GeneratedCheckpoint],
+    )
+
+    items = await llm_gateway.generate_json(
+        contents,
+        config,
+        purpose="checkpoint_batch",
+        cache_version=CHECKPOINT_PROMPT_VERSION,
+        shared_context=shared_context,
+    )
+    if not isinstance(items, list):
+        raise ValueError("Batched checkpoint response is not a list")
+
+    questions: Dict[int, dict] = {}
+    for position, item in enumerate(items):
+        # Trust the segment number when the model gave one, else the position
+        number = item.get("segment") if isinstance(item, dict) else None
+        index = number - 1 if isinstance(number, int) else position
+        if not 0 <= index < len(segments) or index in questions:
+            continue
+        question = _validate_question(item, index)
+        if question:
+            questions[index] = question
+    return questions
+
+
+async def _generate_question_for_segment(
+    segment: str,
+    segment_index: int,
+    deadline_seconds: Optional[float] = None,
+    summary: Optional[str] = None,
+    shared_context: Optional[str] = None,
+) -> Optional[dict]:
     """
     Generate a single checkpoint question for a transcript segment.
     """
     try:
+        model = llm_gateway.routed_model()
+        budget = prompt_budget.section_budget(
+            "checkpoint_segment", CHECKPOINT_SYSTEM_PROMPT, 1024, llm_gateway.GEMINI_MODELS, model=model
+        )
         prompt = f"""
 {CHECKPOINT_SYSTEM_PROMPT}
 
 TRECHO DA TRANSCRIÇÃO (Segmento {segment_index + 1}):
 \"\"\"
-{segment[:2000]}
+{_segment_excerpt(segment, budget, model, summary, shared_context is not None)}
 \"\"\"
 
 Crie uma pergunta baseada neste trecho.
@@ -138,14 +255,19 @@ Crie uma pergunta baseada neste trecho.
             top_p=0.95,
             top_k=40,
             max_output_tokens=1024,
-            response_mime_type="application/json"
+            response_mime_type="application/json",
+            response_schema=CheckpointQuestionContent,
         )
         
-        response_text = _call_gemini_with_fallback(client, contents, config)
-        
-        # Parse JSON response
-        data = json.loads(response_text)
-        return data
+        data = await llm_gateway.generate_json(
+            contents,
+            config,
+            purpose="checkpoint",
+            deadline_seconds=deadline_seconds,
+            cache_version=CHECKPOINT_PROMPT_VERSION,
+            shared_context=shared_context,
+        )
+        return _validate_question(data, segment_index)
         
     except Exception as e:
         print(f"[Checkpoint AI] Error generating question for segment {segment_index}: {e}")
@@ -196,6 +318,33 @@ def _get_fallback_question(segment_index: int, timestamp_seconds: int) -> Checkp
     )
 
 
+def _checkpoint_timestamps(duration_seconds: int) -> List[int]:
+    """Timestamps of the checkpoints at CHECKPOINT_PERCENTAGES of the video."""
+    timestamps = [int(duration_seconds * pct) for pct in CHECKPOINT_PERCENTAGES]
+    
+    # Ensure 100% timestamp is slightly before end to trigger properly
+    if timestamps[-1] >= duration_seconds:
+        timestamps[-1] = max(duration_seconds - 5, int(duration_seconds * 0.95))
+    return timestamps
+
+
+def _build_checkpoint(
+    question_data: Optional[dict], segment_index: int, timestamp: int, video_id: str
+) -> CheckpointQuestion:
+    """Turn a validated question into a CheckpointQuestion (fallback if None)."""
+    if not question_data:
+        # Use fallback if AI failed
+        return _get_fallback_question(segment_index, timestamp)
+    return CheckpointQuestion(
+        id=f"cp-{video_id}-{segment_index}-{int(time.time() * 1000)}",
+        question=question_data["question"],
+        options=question_data["options"],
+        correct_answer=question_data["correct_answer"],
+        explanation=question_data["explanation"],
+        timestamp_seconds=timestamp
+    )
+
+
 async def generate_checkpoint_questions(
     transcript: str,
     duration_seconds: int,
@@ -216,13 +365,7 @@ async def generate_checkpoint_questions(
     
     # Split transcript into 4 segments
     segments = _split_transcript_into_segments(transcript, len(CHECKPOINT_PERCENTAGES))
-    
-    # Calculate timestamps for each checkpoint
-    timestamps = [int(duration_seconds * pct) for pct in CHECKPOINT_PERCENTAGES]
-    
-    # Ensure 100% timestamp is slightly before end to trigger properly
-    if timestamps[-1] >= duration_seconds:
-        timestamps[-1] = max(duration_seconds - 5, int(duration_seconds * 0.95))
+    timestamps = _checkpoint_timestamps(duration_seconds)
     
     if not api_key:
         print("[Checkpoint AI] GEMINI_API_KEY not set, returning fallback questions")
@@ -231,26 +374,36 @@ async def generate_checkpoint_questions(
         return checkpoints
     
     try:
-        client = genai.Client(api_key=api_key)
-        
-        for i, (segment, timestamp) in enumerate(zip(segments, timestamps)):
-            print(f"[Checkpoint AI] Generating question for segment {i+1}/4 at {timestamp}s")
-            
-            question_data = _generate_question_for_segment(client, segment, i)
-            
-            if question_data:
-                checkpoint = CheckpointQuestion(
-                    id=f"cp-{video_id}-{i}-{int(time.time() * 1000)}",
-                    question=question_data.get("question", "Pergunta não gerada"),
-                    options=question_data.get("options", ["A", "B", "C", "D"]),
-                    correct_answer=question_data.get("correct_answer", 0),
-                    explanation=question_data.get("explanation", ""),
-                    timestamp_seconds=timestamp
+        # With context caching the whole transcript is referenced, not digested
+        shared_context = transcript if context_cache.enabled_for(transcript) else None
+        if shared_context:
+            summaries: List[Optional[str]] = [None] * len(segments)
+        else:
+            summaries = await _segment_summaries(transcript, len(segments))
+        questions: Dict[int, dict] = {}
+        if GENERATION_MODE == "batched":
+            print(f"[Checkpoint AI] Generating {len(segments)} questions in one call")
+            try:
+                questions = await _generate_questions_batched(segments, summaries, shared_context)
+            except Exception as e:
+                print(f"[Checkpoint AI] Batched generation failed: {e}")
+
+        # Per-segment calls (concurrently) only for the slots still missing
+        missing = [i for i in range(len(segments)) if i not in questions]
+        if missing:
+            print(f"[Checkpoint AI] Generating questions for segments {[i + 1 for i in missing]} one by one")
+            retried = await asyncio.gather(
+                *(
+                    _generate_question_for_segment(
+                        segments[i], i, summary=summaries[i], shared_context=shared_context
+                    )
+                    for i in missing
                 )
-                checkpoints.append(checkpoint)
-            else:
-                # Use fallback if AI failed
-                checkpoints.append(_get_fallback_question(i, timestamp))
+            )
+            questions.update({i: data for i, data in zip(missing, retried, strict=True) if data})
+
+        for i, timestamp in enumerate(timestamps):
+            checkpoints.append(_build_checkpoint(questions.get(i), i, timestamp, video_id))
         
         print(f"[Checkpoint AI] Generated {len(checkpoints)} checkpoint questions")
         return checkpoints
@@ -263,6 +416,41 @@ async def generate_checkpoint_questions(
         return checkpoints
 
 
+async def generate_checkpoint_questions_progressively(
+    transcript: str,
+    duration_seconds: int,
+    video_id: str,
+    on_checkpoint: Callable[[CheckpointQuestion], None],
+) -> None:
+    """
+    Generate checkpoint questions one at a time in timestamp order, handing
+    each to on_checkpoint as soon as it is ready.
+
+    The 25% question is generated first so the student can start watching;
+    every later question may take until its own timestamp (the 100% one
+    has the whole video) before the gateway gives up on it.
+    """
+    segments = _split_transcript_into_segments(transcript, len(CHECKPOINT_PERCENTAGES))
+    timestamps = _checkpoint_timestamps(duration_seconds)
+    shared_context = transcript if context_cache.enabled_for(transcript) else None
+    # Building a digest would delay the first checkpoint: use one only if it exists
+    summaries = await _segment_summaries(transcript, len(segments), build=False)
+
+    for i, (segment, timestamp) in enumerate(zip(segments, timestamps, strict=True)):
+        question_data = None
+        if api_key:
+            print(f"[Checkpoint AI] Generating question for segment {i+1}/{len(segments)} at {timestamp}s")
+            deadline = max(llm_gateway.DEFAULT_DEADLINE_SECONDS, float(timestamp))
+            question_data = await _generate_question_for_segment(
+                segment,
+                i,
+                deadline_seconds=deadline,
+                summary=None if shared_context else summaries[i],
+                shared_context=shared_context,
+            )
+        on_checkpoint(_build_checkpoint(question_data, i, timestamp, video_id))
+
+
 # Scoring constants for checkpoint impact on final grade
 CHECKPOINT_CORRECT_BONUS = 5.0  # +5% per correct answer
 CHECKPOINT_SKIP_PENALTY = 2.0   # -2% per skipped checkpoint
@@ -0,0 +1,171 @@
+"""
+Progressive checkpoint delivery.
+
+POST /api/assessment/checkpoints/generate with "progressive": true answers
+as soon as the first (25%) checkpoint exists; the later ones keep being
+generated in the background, in timestamp order. Clients pick them up by
+video_id, polling GET /checkpoints/{video_id}/progress or following
+GET /checkpoints/{video_id}/events (Server-Sent Events).
+
+State lives in this process, like the router's generated_checkpoints_cache;
+another worker regenerates cheaply from the persistent LLM cache. Runs are
+keyed by video and transcript, so an edited transcript starts a new run.
+Finished runs are dropped FINISHED_TTL_SECONDS after they finish, and the
+least recently requested finished runs go first once more than MAX_RUNS
+are kept.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from schemas.assessment import CheckpointQuestion
+from services import metrics, single_flight
+
+GENERATING = "generating"
+COMPLETE = "complete"
+FAILED = "failed"
+
+# How long finished runs stay available to clients
+FINISHED_TTL_SECONDS = 600.0
+# Runs kept at most (only finished ones are evicted, least recently requested first)
+MAX_RUNS = 256
+
+
+class ProgressiveCheckpoints:
+    """The checkpoints of one video, as they become ready."""
+
+    def __init__(self, video_id: str, duration_seconds: int, total: int):
+        self.video_id = video_id
+        self.duration_seconds = duration_seconds
+        self.total = total
+        self.status = GENERATING
+        self.error: Optional[str] = None
+        self.checkpoints: List[CheckpointQuestion] = []
+        self.started_at = time.perf_counter()
+        self.finished_at: Optional[float] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def add(self, checkpoint: CheckpointQuestion) -> None:
+        if not self.checkpoints:
+            metrics.observe(
+                "checkpoint_time_to_first_seconds", time.perf_counter() - self.started_at
+            )
+        self.checkpoints.append(checkpoint)
+        self.checkpoints.sort(key=lambda c: c.timestamp_seconds)
+        if len(self.checkpoints) >= self.total:
+            self.status = COMPLETE
+            self.finished_at = time.monotonic()
+            metrics.observe(
+                "checkpoint_time_to_all_seconds", time.perf_counter() - self.started_at
+            )
+        self._notify()
+
+    def fail(self, error: str) -> None:
+        self.status = FAILED
+        self.error = error
+        self.finished_at = time.monotonic()
+        self._notify()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (COMPLETE, FAILED)
+
+    def view(self) -> Dict[str, Any]:
+        return {
+            "video_id": self.video_id,
+            "status": self.status,
+            "ready": len(self.checkpoints),
+            "total": self.total,
+            "checkpoints": [checkpoint.model_dump() for checkpoint in self.checkpoints],
+            "error": self.error,
+        }
+
+    async def wait_for(self, count: int) -> None:
+        """Wait until count checkpoints are ready (or generation stopped)."""
+        while len(self.checkpoints) < count and not self.finished:
+            await self._changed.wait()
+
+    async def updates(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the state now and after every change, until generation finished."""
+        while True:
+            changed = self._changed
+            yield self.view()
+            if self.finished:
+                return
+            await changed.wait()
+
+
+# (video_id, transcript hash, duration) -> run, least recently requested first
+_runs: "OrderedDict[Tuple[str, str, int], ProgressiveCheckpoints]" = OrderedDict()
+# Strong references so background generation is not garbage collected
+_tasks: Set["asyncio.Task[None]"] = set()
+
+
+def _evict(now: float) -> None:
+    for key, run in list(_runs.items()):
+        if run.finished and now - run.finished_at > FINISHED_TTL_SECONDS:
+            del _runs[key]
+    finished = [key for key, run in _runs.items() if run.finished]
+    for key in finished[:max(0, len(_runs) - MAX_RUNS)]:
+        del _runs[key]
+
+
+def get(video_id: str) -> Optional[ProgressiveCheckpoints]:
+    """The latest run for video_id."""
+    _evict(time.monotonic())
+    for (run_video_id, _, _), run in reversed(_runs.items()):
+        if run_video_id == video_id:
+            return run
+    return None
+
+
+def start(
+    video_id: str,
+    duration_seconds: int,
+    transcript: str,
+    total: int,
+    generate: Callable[[Callable[[CheckpointQuestion], None]], Awaitable[None]],
+    on_complete: Optional[Callable[[List[CheckpointQuestion]], None]] = None,
+) -> ProgressiveCheckpoints:
+    """
+    Run generate(emit) in the background, collecting what it emits.
+
+    Returns the run already in progress (or finished) for the same video,
+    transcript and duration when there is one, so concurrent requests
+    share it.
+    """
+    _evict(time.monotonic())
+    key = (video_id, single_flight.fingerprint(single_flight.normalize_text(transcript)), duration_seconds)
+    run = _runs.get(key)
+    if run is not None and run.status != FAILED:
+        _runs.move_to_end(key)
+        return run
+
+    run = ProgressiveCheckpoints(video_id, duration_seconds, total)
+    _runs[key] = run
+    _runs.move_to_end(key)
+
+    async def background() -> None:
+        try:
+            await generate(run.add)
+            if on_complete and run.status == COMPLETE:
+                on_complete(list(run.checkpoints))
+        except Exception as e:
+            print(f"[Checkpoint AI] Progressive generation failed for {video_id}: {e}")
+            run.fail(str(e))
+
+    task = asyncio.create_task(background())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return run
+
+
+def reset() -> None:
+    """Forget all runs (used by tests)."""
+    _runs.clear()
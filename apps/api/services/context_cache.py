@@ -0,0 +1,213 @@
+"""
+Context caching for transcripts reused across several prompts.
+
+One video's quiz and checkpoint questions all prompt over the same
+transcript. With a context cache backend configured, the transcript is
+stored once per model as a cached content and every follow-up call sends
+only its own instructions plus the handle (config.cached_content), so the
+transcript's input tokens are neither re-uploaded nor billed at the full
+rate again.
+
+Callers pass the transcript to llm_gateway as shared_context; the gateway
+asks reference() for a handle on the model it picked (caches are per
+model) and falls back to inlining the transcript when none can be made.
+Handles are keyed by the transcript's content hash and model, created once
+even when several calls need one at the same time, and dropped
+EXPIRY_MARGIN_SECONDS before their TTL runs out (the server deletes them
+at the TTL; close() deletes the live ones on shutdown).
+
+Backends (CONTEXT_CACHE_BACKEND):
+- "off" (default): no caching, callers keep their budgeted prompts;
+- "gemini": the Gemini caches API;
+- "local": an in-process stub with the same interface that inlines the
+  stored contents, for tests and development without network.
+"""
+
+import hashlib
+import os
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from google.genai import types
+
+from services import ai_clients, metrics, prompt_budget, single_flight
+
+BACKEND = os.getenv("CONTEXT_CACHE_BACKEND", "off").lower()
+TTL_SECONDS = float(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "900"))
+# Gemini rejects cached contents below a minimum size
+MIN_TOKENS = int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", "4096"))
+# Stop handing out a handle this long before it expires
+EXPIRY_MARGIN_SECONDS = 30.0
+# After a failed creation, inline the transcript for this long before retrying
+FAILURE_RETRY_SECONDS = 300.0
+
+CONTEXT_HEADER = "TRANSCRIÇÃO COMPLETA DA AULA:"
+
+
+class CachedContext(NamedTuple):
+    """A cached content handle for one transcript on one model."""
+    name: str
+    model: str
+    expires_at: float
+
+
+def _as_contents(contents: Any) -> List[Any]:
+    items = list(contents) if isinstance(contents, (list, tuple)) else [contents]
+    return [
+        types.Content(role="user", parts=[types.Part.from_text(text=item)])
+        if isinstance(item, str) else item
+        for item in items
+    ]
+
+
+def context_contents(text: str) -> List[types.Content]:
+    """The transcript as conversation contents."""
+    return [types.Content(role="user", parts=[types.Part.from_text(text=f"{CONTEXT_HEADER}\n{text}")])]
+
+
+class GeminiBackend:
+    """Cached contents through the Gemini caches API."""
+
+    async def create(self, model: str, contents: List[types.Content], ttl_seconds: float) -> str:
+        client = ai_clients.get_gemini_client()
+        cached = await client.aio.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                contents=contents, ttl=f"{int(ttl_seconds)}s", display_name="youedu-transcript"
+            ),
+        )
+        return cached.name
+
+    async def delete(self, name: str) -> None:
+        await ai_clients.get_gemini_client().aio.caches.delete(name=name)
+
+    def apply(
+        self, handle: CachedContext, contents: Any, config: Optional[types.GenerateContentConfig]
+    ) -> Tuple[Any, types.GenerateContentConfig]:
+        config = config or types.GenerateContentConfig()
+        return contents, config.model_copy(update={"cached_content": handle.name})
+
+
+class LocalBackend:
+    """In-process stand-in for the caches API: stores the contents and inlines them."""
+
+    def __init__(self):
+        self.contents: Dict[str, List[types.Content]] = {}
+        self._created = 0
+
+    async def create(self, _model: str, contents: List[types.Content], _ttl_seconds: float) -> str:
+        self._created += 1
+        name = f"local/cachedContents/{self._created}"
+        self.contents[name] = contents
+        return name
+
+    async def delete(self, name: str) -> None:
+        self.contents.pop(name, None)
+
+    def apply(
+        self, handle: CachedContext, contents: Any, config: Optional[types.GenerateContentConfig]
+    ) -> Tuple[Any, Optional[types.GenerateContentConfig]]:
+        return self.contents[handle.name] + _as_contents(contents), config
+
+
+_backend = None
+_handles: Dict[Tuple[str, str], CachedContext] = {}
+# (transcript hash, model) -> monotonic time until which creation is not retried
+_failures: Dict[Tuple[str, str], float] = {}
+_flights = single_flight.SingleFlight("context_cache")
+
+
+def backend():
+    global _backend
+    if _backend is None:
+        _backend = LocalBackend() if BACKEND == "local" else GeminiBackend()
+    return _backend
+
+
+def enabled_for(text: str) -> bool:
+    """Whether prompts over text should reference it as cached context."""
+    return BACKEND in ("gemini", "local") and prompt_budget.count_tokens(text) >= MIN_TOKENS
+
+
+def _key(model: str, text: str) -> Tuple[str, str]:
+    digest = hashlib.sha256(single_flight.normalize_text(text).encode("utf-8")).hexdigest()
+    return digest, model
+
+
+async def _drop_expired(now: float) -> None:
+    for key, handle in list(_handles.items()):
+        if handle.expires_at - EXPIRY_MARGIN_SECONDS <= now:
+            del _handles[key]
+            if isinstance(backend(), LocalBackend):
+                await backend().delete(handle.name)
+
+
+async def reference(model: str, text: str) -> Optional[CachedContext]:
+    """A live handle for text on model, created if needed (None if it cannot be)."""
+    now = time.monotonic()
+    await _drop_expired(now)
+    key = _key(model, text)
+    handle = _handles.get(key)
+    if handle is not None:
+        metrics.increment("context_cache_requests", outcome="hit")
+        return handle
+    if _failures.get(key, 0.0) > now:
+        return None
+
+    async def create() -> CachedContext:
+        name = await backend().create(model, context_contents(text), TTL_SECONDS)
+        created = CachedContext(name, model, time.monotonic() + TTL_SECONDS)
+        _handles[key] = created
+        metrics.increment("context_cache_requests", outcome="created")
+        print(f"[Context Cache] Cached transcript on {model} as {name}")
+        return created
+
+    try:
+        return await _flights.do(single_flight.fingerprint(*key), create)
+    except Exception as e:
+        print(f"[Context Cache] Could not cache transcript on {model}: {str(e)[:200]}")
+        metrics.increment("context_cache_requests", outcome="failed")
+        _failures[key] = now + FAILURE_RETRY_SECONDS
+        return None
+
+
+async def forget(model: str, text: str) -> None:
+    """Drop the handle for text on model and its cached content (e.g. the server no longer knows it)."""
+    handle = _handles.pop(_key(model, text), None)
+    if handle is None:
+        return
+    try:
+        await backend().delete(handle.name)
+    except Exception as e:
+        print(f"[Context Cache] Failed to delete {handle.name}: {str(e)[:200]}")
+
+
+def apply(
+    handle: Optional[CachedContext],
+    text: str,
+    contents: Any,
+    config: Optional[types.GenerateContentConfig],
+) -> Tuple[Any, Optional[types.GenerateContentConfig]]:
+    """Contents and config of a call over text: referencing handle, else with text inlined."""
+    if handle is None:
+        metrics.increment("context_cache_requests", outcome="inline")
+        return context_contents(text) + _as_contents(contents), config
+    return backend().apply(handle, contents, config)
+
+
+async def close() -> None:
+    """Delete the live cached contents (they would otherwise be kept until their TTL)."""
+    for handle in list(_handles.values()):
+        try:
+            await backend().delete(handle.name)
+        except Exception as e:
+            print(f"[Context Cache] Failed to delete {handle.name}: {e}")
+    _handles.clear()
+
+
+def reset() -> None:
+    """Forget all handles and the backend (used by tests)."""
+    global _backend
+    _backend = None
+    _handles.clear()
+    _failures.clear()
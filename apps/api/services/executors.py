@@ -0,0 +1,176 @@
+"""
+Dedicated thread pools for blocking work.
+
+The provider SDKs (Google Cloud Speech, AssemblyAI, google-genai), file
+reads and ffmpeg are synchronous. Calling them directly inside an
+``async def`` freezes the whole uvicorn worker, health checks included,
+so every blocking call goes through run_blocking() instead.
+
+Each pool is sized independently, which doubles as its concurrency limit:
+work beyond the pool size waits in the pool's queue. Queue depth, active
+workers and queue wait time are published to the metrics registry.
+
+CPU-bound Python work (local speech recognition) goes through
+run_in_process() instead, on process pools that sidestep the GIL.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from services import metrics
+
+T = TypeVar("T")
+
+POOL_SIZES: Dict[str, int] = {
+    # Long-running speech-to-text requests (mostly waiting on the network)
+    "speech": int(os.getenv("SPEECH_POOL_SIZE", "8")),
+    # Gemini / LLM requests
+    "llm": int(os.getenv("LLM_POOL_SIZE", "16")),
+    # CPU/disk bound media work (ffmpeg, WAV splitting)
+    "media": int(os.getenv("MEDIA_POOL_SIZE", str(os.cpu_count() or 2))),
+    # SQLite cache reads and writes
+    "storage": int(os.getenv("STORAGE_POOL_SIZE", "4")),
+}
+
+PROCESS_POOL_SIZES: Dict[str, int] = {
+    # Local CPU speech recognition (one model per worker process)
+    "local_asr": int(os.getenv("LOCAL_ASR_PROCESSES", str(os.cpu_count() or 2))),
+}
+
+
+class _Pool:
+    def __init__(self, name: str, size: int, executor: Optional[Executor] = None):
+        self.name = name
+        self.size = size
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=size, thread_name_prefix=f"youedu-{name}"
+        )
+        self.queued = 0
+        self.active = 0
+        self.lock = threading.Lock()
+
+    def _publish(self) -> None:
+        metrics.set_gauge("executor_queue_depth", self.queued, pool=self.name)
+        metrics.set_gauge("executor_active", self.active, pool=self.name)
+
+
+_pools: Dict[str, _Pool] = {}
+_process_pools: Dict[str, _Pool] = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(name: str) -> _Pool:
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            if name not in POOL_SIZES:
+                raise ValueError(f"Unknown executor pool: {name}")
+            pool = _Pool(name, POOL_SIZES[name])
+            _pools[name] = pool
+        return pool
+
+
+async def run_blocking(pool_name: str, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking callable on the named pool without blocking the event loop."""
+    pool = _get_pool(pool_name)
+    submitted = time.perf_counter()
+
+    with pool.lock:
+        pool.queued += 1
+        pool._publish()
+    # Leaves the queue once: when a worker picks the call up, or when the
+    # caller stops waiting first (cancelled while queued, tracked never runs)
+    dequeued = False
+
+    def leave_queue() -> None:
+        nonlocal dequeued
+        if not dequeued:
+            dequeued = True
+            pool.queued -= 1
+
+    def tracked() -> T:
+        with pool.lock:
+            leave_queue()
+            pool.active += 1
+            pool._publish()
+        metrics.observe("executor_queue_wait_seconds", time.perf_counter() - submitted, pool=pool.name)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with pool.lock:
+                pool.active -= 1
+                pool._publish()
+
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(pool.executor, tracked)
+    finally:
+        with pool.lock:
+            leave_queue()
+            pool._publish()
+
+
+def _get_process_pool(name: str) -> _Pool:
+    with _pools_lock:
+        pool = _process_pools.get(name)
+        if pool is None:
+            if name not in PROCESS_POOL_SIZES:
+                raise ValueError(f"Unknown process pool: {name}")
+            size = PROCESS_POOL_SIZES[name]
+            # spawn: forking a process that runs threads and an event loop is unsafe
+            executor = ProcessPoolExecutor(
+                max_workers=size, mp_context=multiprocessing.get_context("spawn")
+            )
+            pool = _Pool(name, size, executor)
+            _process_pools[name] = pool
+        return pool
+
+
+async def run_in_process(pool_name: str, fn: Callable[..., T], *args: Any) -> T:
+    """
+    Run a picklable, module-level callable on the named process pool.
+
+    Only the parent sees the work, so calls beyond the pool size are
+    counted as queued and the rest as active.
+    """
+    pool = _get_process_pool(pool_name)
+
+    def publish(delta: int) -> None:
+        with pool.lock:
+            in_flight = pool.queued + pool.active + delta
+            pool.active = min(in_flight, pool.size)
+            pool.queued = in_flight - pool.active
+            pool._publish()
+
+    publish(1)
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool.executor, fn, *args)
+    finally:
+        publish(-1)
+
+
+def pool_stats() -> Dict[str, Dict[str, int]]:
+    """Size, queue depth and active workers of every pool created so far."""
+    with _pools_lock:
+        pools = list(_pools.values()) + list(_process_pools.values())
+    return {
+        pool.name: {"size": pool.size, "queued": pool.queued, "active": pool.active}
+        for pool in pools
+    }
+
+
+def shutdown(wait: bool = False) -> None:
+    """Shut down all pools (called from the FastAPI lifespan on shutdown)."""
+    with _pools_lock:
+        pools = list(_pools.values()) + list(_process_pools.values())
+        _pools.clear()
+        _process_pools.clear()
+    for pool in pools:
+        pool.executor.shutdown(wait=wait, cancel_futures=True)
+
@@ -0,0 +1,153 @@
+"""
+Upload-once Gemini file handles for videos.
+
+analyze_video used to inline the whole decoded video (types.Part.from_bytes)
+in every request, so a 100 MB lecture was sent again on every fallback
+model attempt and every repeat analysis. Videos above INLINE_MAX_BYTES are
+now uploaded once through the Gemini files API and referenced by URI
+(types.Part.from_uri), which every model accepts.
+
+Handles are keyed by the SHA-256 of the video and reused until shortly
+before the file expires server-side (Gemini keeps uploads for 48 hours).
+They are kept in this process and stored in the persistent LLM cache, so
+other workers and restarts reuse them too. Concurrent requests for the same
+video share one upload. Only tiny clips are still sent inline.
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import os
+import time
+from typing import Dict, NamedTuple, Optional
+
+from google.genai import types
+
+from services import ai_clients, llm_cache, metrics, single_flight
+
+# Videos up to this size are sent inline instead of uploaded
+INLINE_MAX_BYTES = int(float(os.getenv("GEMINI_FILES_INLINE_MAX_MB", "2")) * 1024 * 1024)
+# Used when the API does not report an expiration time
+FILE_LIFETIME_SECONDS = 48 * 3600
+# Stop using a handle this long before the file expires
+EXPIRY_MARGIN_SECONDS = 3600.0
+# Uploaded videos are processed before they can be used
+ACTIVE_POLL_SECONDS = 2.0
+ACTIVE_TIMEOUT_SECONDS = float(os.getenv("GEMINI_FILES_ACTIVE_TIMEOUT_SECONDS", "300"))
+
+
+class FileProcessingError(Exception):
+    """Raised when an uploaded file does not become usable."""
+
+
+class UploadedFile(NamedTuple):
+    """A video uploaded through the files API."""
+    name: str
+    uri: str
+    mime_type: str
+    expires_at: float  # wall clock (shared with other workers)
+
+    def part(self) -> types.Part:
+        return types.Part.from_uri(file_uri=self.uri, mime_type=self.mime_type)
+
+
+_files: Dict[str, UploadedFile] = {}
+_flights = single_flight.SingleFlight("gemini_files")
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _cache_key(video_hash: str) -> str:
+    return single_flight.fingerprint("gemini-file", video_hash)
+
+
+def _usable(uploaded: Optional[UploadedFile]) -> bool:
+    return uploaded is not None and uploaded.expires_at - EXPIRY_MARGIN_SECONDS > time.time()
+
+
+async def _load(video_hash: str) -> Optional[UploadedFile]:
+    uploaded = _files.get(video_hash)
+    if uploaded is None:
+        stored = await llm_cache.get(_cache_key(video_hash), purpose="gemini_file")
+        if stored is not None:
+            try:
+                value = json.loads(stored)
+                # forget() stores null
+                uploaded = UploadedFile(**value) if value else None
+            except (TypeError, ValueError) as e:
+                print(f"[Gemini Files] Ignoring unreadable cached handle: {e}")
+    if not _usable(uploaded):
+        _files.pop(video_hash, None)
+        return None
+    _files[video_hash] = uploaded
+    return uploaded
+
+
+async def _upload(data: bytes, mime_type: str, video_hash: str) -> UploadedFile:
+    client = ai_clients.get_gemini_client()
+    started = time.perf_counter()
+    file = await client.aio.files.upload(
+        file=io.BytesIO(data),
+        config=types.UploadFileConfig(
+            mime_type=mime_type, display_name=f"youedu-{video_hash[:16]}"
+        ),
+    )
+    deadline = time.monotonic() + ACTIVE_TIMEOUT_SECONDS
+    while file.state == types.FileState.PROCESSING:
+        if time.monotonic() > deadline:
+            raise FileProcessingError(
+                f"{file.name} still processing after {ACTIVE_TIMEOUT_SECONDS:.0f}s"
+            )
+        await asyncio.sleep(ACTIVE_POLL_SECONDS)
+        file = await client.aio.files.get(name=file.name)
+    if file.state == types.FileState.FAILED:
+        raise FileProcessingError(f"Processing of {file.name} failed: {file.error}")
+
+    expires_at = (
+        file.expiration_time.timestamp() if file.expiration_time
+        else time.time() + FILE_LIFETIME_SECONDS
+    )
+    metrics.increment("gemini_file_upload_bytes", len(data))
+    metrics.observe("gemini_file_upload_seconds", time.perf_counter() - started)
+    print(f"[Gemini Files] Uploaded {len(data) / (1024 * 1024):.1f} MB as {file.name}")
+    return UploadedFile(file.name, file.uri, file.mime_type or mime_type, expires_at)
+
+
+async def get_file(data: bytes, mime_type: str, video_hash: Optional[str] = None) -> UploadedFile:
+    """The uploaded file for data, uploading it unless a live handle exists."""
+    video_hash = video_hash or content_hash(data)
+    uploaded = await _load(video_hash)
+    if uploaded is not None:
+        metrics.increment("gemini_file_requests", outcome="reused")
+        return uploaded
+
+    async def upload() -> UploadedFile:
+        uploaded = await _upload(data, mime_type, video_hash)
+        _files[video_hash] = uploaded
+        await llm_cache.put(_cache_key(video_hash), json.dumps(uploaded._asdict()), purpose="gemini_file")
+        metrics.increment("gemini_file_requests", outcome="uploaded")
+        return uploaded
+
+    return await _flights.do(video_hash, upload)
+
+
+async def video_part(data: bytes, mime_type: str, video_hash: Optional[str] = None) -> types.Part:
+    """The video as a request part: inline for tiny clips, else an uploaded file reference."""
+    if len(data) <= INLINE_MAX_BYTES:
+        metrics.increment("gemini_file_requests", outcome="inline")
+        return types.Part.from_bytes(data=data, mime_type=mime_type)
+    return (await get_file(data, mime_type, video_hash)).part()
+
+
+async def forget(video_hash: str) -> None:
+    """Drop the handle for a video (e.g. the server no longer has the file)."""
+    _files.pop(video_hash, None)
+    await llm_cache.put(_cache_key(video_hash), json.dumps(None), purpose="gemini_file")
+
+
+def reset() -> None:
+    """Forget the handles kept in this process (used by tests)."""
+    _files.clear()
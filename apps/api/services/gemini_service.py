@@ -1,25 +1,25 @@
 """
-Gemini video analysis service with model fallback.
+Gemini video analysis service (model fallback via llm_gateway).
+
+Videos are uploaded once through the files API and referenced by every
+model attempt and repeat analysis (see gemini_files); only tiny clips are
+sent inline.
 """
 
 import os
 import base64
 import time
-import json
 from typing import Any, List
-from google import genai
-from google.genai import types
+from google.genai import errors, types
+
+from schemas.challenges import Challenge, GeneratedChallenges
+from services import gemini_files, llm_gateway, llm_json
 
 # Configure Gemini API
 api_key = os.getenv("GEMINI_API_KEY")
 
-# Model fallback order
-GEMINI_MODELS = [
-    "gemini-2.0-flash",
-    "gemini-2.5-flash-lite", 
-    "gemini-2.0-flash-lite",
-    "gemini-2.5-flash",
-]
+# Bump when SYSTEM_PROMPT changes (invalidates cached responses)
+PROMPT_VERSION = "1"
 
 # Enhanced system prompt for pedagogical tutor
 SYSTEM_PROMPT = """
@@ -51,41 +51,11 @@ SAÍDA ESPERADA (JSON):
 """
 
 
-def _call_gemini_with_fallback(client: genai.Client, contents: list, config: types.GenerateContentConfig) -> str:
-    """
-    Try multiple Gemini models with fallback on quota/not-found errors.
-    """
-    last_error = None
-    
-    for model in GEMINI_MODELS:
-        try:
-            print(f"Trying model: {model}")
-            response = client.models.generate_content(
-                model=model,
-                contents=contents,
-                config=config
-            )
-            if response.text:
-                print(f"Success with model: {model}")
-                return response.text
-            else:
-                print(f"Empty response from {model}, trying next...")
-                continue
-                
-        except Exception as e:
-            error_str = str(e)
-            print(f"Model {model} failed: {error_str[:200]}")
-            
-            if "429" in error_str or "RESOURCE_EXHAUSTED" in error_str:
-                last_error = e
-                continue
-            elif "404" in error_str or "NOT_FOUND" in error_str:
-                last_error = e
-                continue
-            else:
-                raise e
-    
-    raise Exception(f"All Gemini models failed. Last error: {last_error}")
+def _file_rejected(error: Exception) -> bool:
+    """Whether Gemini refused the uploaded video's URI (404/403: deleted, expired or not visible)."""
+    if isinstance(error, llm_gateway.AllModelsFailedError):
+        error = error.last_error
+    return isinstance(error, errors.APIError) and error.code in (403, 404)
 
 
 async def analyze_video(video_base64: str, mime_type: str) -> List[dict[str, Any]]:
@@ -96,33 +66,47 @@ async def analyze_video(video_base64: str, mime_type: str) -> List[dict[str, Any
         print("GEMINI_API_KEY not set, returning fallback")
         return _get_fallback_challenges()
     
+    video_hash = None
     try:
-        client = genai.Client(api_key=api_key)
-        
         video_bytes = base64.b64decode(video_base64)
+        video_hash = gemini_files.content_hash(video_bytes)
         
-        contents = [
-            types.Content(
-                role="user",
-                parts=[
-                    types.Part.from_bytes(data=video_bytes, mime_type=mime_type),
-                    types.Part.from_text(text=SYSTEM_PROMPT)
-                ]
-            )
-        ]
+        async def contents() -> List[types.Content]:
+            # Built only on a response cache miss: a cached analysis uploads nothing
+            return [
+                types.Content(
+                    role="user",
+                    parts=[
+                        await gemini_files.video_part(video_bytes, mime_type, video_hash),
+                        types.Part.from_text(text=SYSTEM_PROMPT)
+                    ]
+                )
+            ]
         
         config = types.GenerateContentConfig(
             temperature=0.7,
             top_p=0.95,
             top_k=40,
             max_output_tokens=2048,
-            response_mime_type="application/json"
+            response_mime_type="application/json",
+            response_schema=GeneratedChallenges,
         )
         
-        response_text = _call_gemini_with_fallback(client, contents, config)
-        data = json.loads(response_text)
+        data = await llm_gateway.generate_json(
+            contents,
+            config,
+            purpose="video_analysis",
+            cache_version=PROMPT_VERSION,
+            # Same video, same response: whether it was uploaded or inlined
+            cache_contents=[video_hash, mime_type, SYSTEM_PROMPT],
+        )
         
-        challenges = data.get('challenges', [])
+        # Keep every challenge that is valid, even if others are not
+        challenges = llm_json.validate_items(
+            data.get('challenges') if isinstance(data, dict) else data, Challenge, "challenge"
+        )
+        if not challenges:
+            raise ValueError("No valid challenges in the response")
         timestamp = int(time.time() * 1000)
         
         for i, challenge in enumerate(challenges):
@@ -132,6 +116,9 @@ async def analyze_video(video_base64: str, mime_type: str) -> List[dict[str, Any
             
     except Exception as e:
         print(f"Error analyzing video: {str(e)}")
+        if video_hash and _file_rejected(e):
+            # The uploaded file may be gone server-side: upload again next time
+            await gemini_files.forget(video_hash)
         print("Falling back to mock challenges due to API error")
         return _get_fallback_challenges()
 
@@ -0,0 +1,137 @@
+"""
+Provider execution policies: sequential fallback, hedged requests and
+race-all.
+
+- sequential: try providers one after another, moving on only on failure.
+- hedged: start the first provider; if it has not finished after its hedge
+  delay (typically its recent p95 latency, counted from its launch), start
+  the next one as well.
+  The first success wins and the other attempts are cancelled.
+- race: start every provider at once and keep the first success.
+
+A failed attempt always starts the next provider immediately. Cancelling
+an attempt cancels its asyncio task; a blocking SDK call already running
+on an executor thread finishes in the background and its result is dropped.
+
+Attempts, wins, failures, cancellations and success latency are recorded
+per provider under the given metric prefix.
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from services import metrics
+
+T = TypeVar("T")
+
+POLICIES = ("sequential", "hedged", "race")
+
+ProviderCall = Tuple[str, Callable[[], Awaitable[T]]]
+
+
+class ProvidersFailedError(Exception):
+    """Raised when every provider failed; errors holds (name, exception) pairs."""
+
+    def __init__(self, errors: List[Tuple[str, BaseException]]):
+        self.errors = errors
+        summary = "; ".join(f"{name}: {str(error)[:100]}" for name, error in errors)
+        super().__init__(summary or "no providers configured")
+
+
+async def _timed_attempt(name: str, call: Callable[[], Awaitable[T]], metric_prefix: str) -> T:
+    metrics.increment(f"{metric_prefix}_attempts", provider=name)
+    started = time.perf_counter()
+    try:
+        result = await call()
+    except asyncio.CancelledError:
+        metrics.increment(f"{metric_prefix}_cancelled", provider=name)
+        raise
+    except Exception:
+        metrics.increment(f"{metric_prefix}_failures", provider=name)
+        raise
+    metrics.observe(f"{metric_prefix}_latency_seconds", time.perf_counter() - started, provider=name)
+    return result
+
+
+async def run_providers(
+    providers: Sequence[ProviderCall],
+    policy: str = "sequential",
+    hedge_delay: Callable[[str], Optional[float]] = lambda _: None,
+    metric_prefix: str = "provider",
+    on_failure: Optional[Callable[[str, BaseException], None]] = None,
+) -> Tuple[str, T]:
+    """
+    Run providers under the given policy and return (winner_name, result).
+
+    hedge_delay(name) gives the seconds to wait on a provider before
+    hedging with the next one (None disables hedging for it). Raises
+    ProvidersFailedError if no provider succeeds.
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown provider policy: {policy}")
+
+    queue = list(providers)
+    pending: Dict[asyncio.Task, str] = {}
+    errors: List[Tuple[str, BaseException]] = []
+    loop = asyncio.get_running_loop()
+    # The most recently launched provider, its hedge delay and the loop
+    # time at which the next provider is started alongside it
+    last_launched: Optional[str] = None
+    last_delay: Optional[float] = None
+    hedge_at: Optional[float] = None
+
+    def launch() -> None:
+        nonlocal last_launched, last_delay, hedge_at
+        name, call = queue.pop(0)
+        task = asyncio.ensure_future(_timed_attempt(name, call, metric_prefix))
+        pending[task] = name
+        last_launched = name
+        last_delay = hedge_delay(name) if policy == "hedged" else None
+        hedge_at = loop.time() + last_delay if last_delay is not None else None
+
+    try:
+        if queue:
+            launch()
+        while policy == "race" and queue:
+            launch()
+
+        while pending:
+            timeout = None
+            if queue and hedge_at is not None:
+                timeout = max(0.0, hedge_at - loop.time())
+
+            done, _ = await asyncio.wait(
+                pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                print(f"⏱️ {last_launched} slower than {last_delay:.1f}s, hedging with {queue[0][0]}")
+                metrics.increment(f"{metric_prefix}_hedges", provider=queue[0][0])
+                launch()
+                continue
+
+            # Every finished task is inspected, so failures that land together
+            # with the winner are still retrieved and reported
+            winner: Optional[Tuple[str, T]] = None
+            failures = 0
+            for task in done:
+                name = pending.pop(task)
+                error = task.exception()
+                if error is None:
+                    winner = winner or (name, task.result())
+                    continue
+                failures += 1
+                errors.append((name, error))
+                if on_failure:
+                    on_failure(name, error)
+
+            if winner is not None:
+                metrics.increment(f"{metric_prefix}_wins", provider=winner[0])
+                return winner
+            for _ in range(min(failures, len(queue))):
+                launch()
+    finally:
+        for task in pending:
+            task.cancel()
+
+    raise ProvidersFailedError(errors)
@@ -0,0 +1,276 @@
+"""
+Persistent LLM response cache.
+
+Generated checkpoints, quizzes and video challenges are stored in a SQLite
+database in WAL mode, so every uvicorn worker shares it and it survives
+restarts and deploys. Entries are keyed by a hash of the prompt template
+version, the model family, the generation config and the input content;
+bumping a prompt's version (or LLM_CACHE_VERSION for everything)
+invalidates the old entries, which then age out.
+
+Entries expire after TTL_SECONDS and the store is bounded by size,
+evicting least-recently-used entries first. The total size is kept up to
+date by triggers, so writes never scan the table. Reads and writes run on
+the "storage" thread pool: a busy database never blocks the event loop.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple, get_origin
+
+from google.genai import types
+from pydantic import TypeAdapter
+
+from services import executors, metrics
+
+CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH", os.path.join(tempfile.gettempdir(), "youedu-llm-cache.sqlite3")
+)
+MAX_CACHE_BYTES = int(os.getenv("LLM_CACHE_MAX_MB", "64")) * 1024 * 1024
+TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_HOURS", "168")) * 3600
+
+# Bump to invalidate every cached response at once
+CACHE_VERSION = os.getenv("LLM_CACHE_VERSION", "1")
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+_conn_path: Optional[str] = None
+
+
+def _connect() -> sqlite3.Connection:
+    global _conn, _conn_path
+    if _conn is not None and _conn_path == CACHE_PATH:
+        return _conn
+    if _conn is not None:
+        _conn.close()
+    os.makedirs(os.path.dirname(CACHE_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(CACHE_PATH, timeout=5, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            purpose TEXT NOT NULL,
+            value TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created_at)")
+    # Running total of the entries' sizes, shared by every worker
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS total_size (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)"
+        )
+        conn.execute("INSERT OR IGNORE INTO total_size SELECT 0, COALESCE(SUM(size), 0) FROM responses")
+        conn.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS responses_size_insert AFTER INSERT ON responses
+            BEGIN UPDATE total_size SET bytes = bytes + NEW.size; END
+            """
+        )
+        conn.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS responses_size_update AFTER UPDATE OF size ON responses
+            BEGIN UPDATE total_size SET bytes = bytes + NEW.size - OLD.size; END
+            """
+        )
+        conn.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS responses_size_delete AFTER DELETE ON responses
+            BEGIN UPDATE total_size SET bytes = bytes - OLD.size; END
+            """
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        conn.close()
+        raise
+    _conn, _conn_path = conn, CACHE_PATH
+    return conn
+
+
+def close() -> None:
+    """Close this process's connection (reopened on next use)."""
+    global _conn, _conn_path
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+        _conn, _conn_path = None, None
+
+
+def _digest_contents(digest: "hashlib._Hash", item: Any) -> None:
+    if isinstance(item, str):
+        digest.update(b"text\x00" + item.encode("utf-8"))
+    elif isinstance(item, (list, tuple)):
+        for part in item:
+            _digest_contents(digest, part)
+    elif isinstance(item, types.Content):
+        digest.update(f"content:{item.role}\x00".encode("utf-8"))
+        _digest_contents(digest, item.parts or [])
+    elif isinstance(item, types.Part):
+        if item.inline_data is not None:
+            digest.update(f"inline:{item.inline_data.mime_type}\x00".encode("utf-8"))
+            digest.update(item.inline_data.data or b"")
+        else:
+            digest.update(item.model_dump_json(exclude_none=True).encode("utf-8"))
+    else:
+        digest.update(repr(item).encode("utf-8"))
+
+
+def _config_fingerprint(config: types.GenerateContentConfig) -> str:
+    # Pydantic response schemas are classes: key on their JSON schema
+    fingerprint = config.model_dump_json(exclude_none=True, exclude={"response_schema"})
+    schema = config.response_schema
+    if isinstance(schema, type) or get_origin(schema) is not None:
+        schema = TypeAdapter(schema).json_schema()
+    elif schema is not None and hasattr(schema, "model_dump"):
+        schema = schema.model_dump(exclude_none=True)
+    return fingerprint + json.dumps(schema, sort_keys=True, default=str)
+
+
+def make_key(
+    purpose: str,
+    prompt_version: str,
+    model_family: str,
+    config: Optional[types.GenerateContentConfig],
+    contents: Any,
+) -> str:
+    """Hash of everything that determines a response."""
+    digest = hashlib.sha256()
+    header = [CACHE_VERSION, purpose, prompt_version, model_family]
+    header.append(_config_fingerprint(config) if config else "")
+    digest.update("\x00".join(header).encode("utf-8"))
+    _digest_contents(digest, contents)
+    return digest.hexdigest()
+
+
+def _get(key: str) -> Optional[str]:
+    now = time.time()
+    with _lock:
+        conn = _connect()
+        row = conn.execute(
+            "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None and now - row[1] > TTL_SECONDS:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            row = None
+        elif row is not None:
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+    return row[0] if row is not None else None
+
+
+async def get(key: str, purpose: str = "default") -> Optional[str]:
+    """Return the cached response for key, or None on a miss or expired entry."""
+    if not CACHE_ENABLED:
+        return None
+
+    try:
+        value = await executors.run_blocking("storage", _get, key)
+    except sqlite3.Error as e:
+        print(f"[LLM Cache] Lookup failed: {e}")
+        return None
+
+    if value is None:
+        metrics.increment("llm_cache_misses", purpose=purpose)
+        return None
+    metrics.increment("llm_cache_hits", purpose=purpose)
+    return value
+
+
+def _put(key: str, value: str, purpose: str) -> None:
+    now = time.time()
+    with _lock:
+        conn = _connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                """
+                INSERT INTO responses VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    purpose = excluded.purpose, value = excluded.value, size = excluded.size,
+                    created_at = excluded.created_at, accessed_at = excluded.accessed_at
+                """,
+                (key, purpose, value, len(value.encode("utf-8")), now, now),
+            )
+            _evict(conn, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+async def put(key: str, value: str, purpose: str = "default") -> None:
+    """Store a response and evict expired and least-recently-used entries."""
+    if not CACHE_ENABLED:
+        return
+
+    try:
+        await executors.run_blocking("storage", _put, key, value, purpose)
+    except sqlite3.Error as e:
+        print(f"[LLM Cache] Failed to store entry: {e}")
+
+
+def _evict(conn: sqlite3.Connection, now: float) -> None:
+    expired = conn.execute("DELETE FROM responses WHERE created_at < ?", (now - TTL_SECONDS,)).rowcount
+    evicted = 0
+    total = conn.execute("SELECT bytes FROM total_size").fetchone()[0]
+    while total > MAX_CACHE_BYTES:
+        key, size = conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at LIMIT 1"
+        ).fetchone()
+        conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        total -= size
+        evicted += 1
+
+    if expired + evicted:
+        metrics.increment("llm_cache_evictions", expired + evicted)
+    metrics.set_gauge("llm_cache_bytes", total)
+
+
+def _count() -> List[Tuple[str, int, int]]:
+    with _lock:
+        return _connect().execute(
+            "SELECT purpose, COUNT(*), COALESCE(SUM(size), 0) FROM responses GROUP BY purpose"
+        ).fetchall()
+
+
+async def stats() -> Dict[str, Any]:
+    """Summary of the store plus hit/miss counters per purpose; queried on the storage pool."""
+    entries, size, purposes = 0, 0, {}
+    if CACHE_ENABLED:
+        try:
+            rows = await executors.run_blocking("storage", _count)
+        except sqlite3.Error as e:
+            print(f"[LLM Cache] Stats failed: {e}")
+            rows = []
+        for purpose, count, total in rows:
+            entries += count
+            size += total
+            purposes[purpose] = {
+                "entries": count,
+                "hits": int(metrics.get_counter("llm_cache_hits", purpose=purpose)),
+                "misses": int(metrics.get_counter("llm_cache_misses", purpose=purpose)),
+            }
+
+    return {
+        "enabled": CACHE_ENABLED,
+        "path": CACHE_PATH,
+        "entries": entries,
+        "size_bytes": size,
+        "max_bytes": MAX_CACHE_BYTES,
+        "ttl_seconds": TTL_SECONDS,
+        "version": CACHE_VERSION,
+        "purposes": purposes,
+    }
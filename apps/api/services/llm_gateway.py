@@ -0,0 +1,446 @@
+"""
+Unified async gateway for Gemini generate_content calls.
+
+Video analysis, checkpoint questions, quizzes and Gemini transcription all
+go through generate(), which provides:
+
+- native async calls (client.aio) on the shared client from ai_clients;
+- one model list (GEMINI_MODELS) and fallback policy: quota errors
+  (429 / RESOURCE_EXHAUSTED), unknown models (404) and empty responses move
+  on to the next model, any other error is raised. The order comes from
+  the quota-aware routing table (model_routing), which skips models that
+  are cooling down after a 429/404 and sticks to the last working one;
+- per-model token buckets for requests/min and tokens/min sized to our
+  quota, so bursts are spread over the models instead of cascading into
+  429s: a request goes to the first model with capacity right now;
+- a per-model concurrency cap;
+- queueing with a deadline: a request waits for capacity (or a free slot)
+  until its deadline and then fails with LLMDeadlineError.
+
+Token use is estimated before the call (prompt_budget.count_tokens) and
+corrected from the response's usage metadata afterwards; llm_tokens and
+llm_latency_seconds are recorded per model and purpose, from the usage
+metadata or, when a response lacks it, from local counts. Callers that
+pass a cache_version read through the persistent response cache
+(llm_cache) first. A transcript passed as shared_context is referenced
+through a context cache handle for the chosen model (context_cache)
+instead of being sent again.
+"""
+
+import asyncio
+import os
+import threading
+import time
+import weakref
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from google.genai import types
+
+from services import ai_clients, context_cache, llm_cache, llm_json, metrics, model_routing, prompt_budget
+
+# Shared model fallback order
+GEMINI_MODELS = [
+    model.strip()
+    for model in os.getenv(
+        "LLM_MODELS", "gemini-2.0-flash,gemini-2.5-flash-lite,gemini-2.0-flash-lite,gemini-2.5-flash"
+    ).split(",")
+    if model.strip()
+]
+
+# Quota per model, and concurrent requests allowed per model
+REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000"))
+MODEL_CONCURRENCY = int(os.getenv("LLM_MODEL_CONCURRENCY", "8"))
+
+# How long a request may wait for capacity plus the call itself
+DEFAULT_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "120"))
+
+# Rough token estimates used until the response reports actual usage
+INLINE_BYTES_PER_TOKEN = 128
+DEFAULT_OUTPUT_TOKENS = 1024
+
+# Model label of responses served from llm_cache
+CACHE_MODEL = "cache"
+
+QUOTA_MARKERS = ("429", "RESOURCE_EXHAUSTED")
+NOT_FOUND_MARKERS = ("404", "NOT_FOUND")
+
+# Cooldowns of the routing table (see model_routing)
+QUOTA_COOLDOWN_SECONDS = float(os.getenv("LLM_QUOTA_COOLDOWN_SECONDS", "30"))
+NOT_FOUND_COOLDOWN_SECONDS = float(os.getenv("LLM_NOT_FOUND_COOLDOWN_SECONDS", "3600"))
+
+
+class LLMError(Exception):
+    """Base class for gateway errors."""
+
+
+class LLMDeadlineError(LLMError):
+    """Raised when no model had capacity before the request's deadline."""
+
+
+class AllModelsFailedError(LLMError):
+    """Raised when every model in the fallback order failed."""
+
+    def __init__(self, last_error: Optional[BaseException]):
+        self.last_error = last_error
+        super().__init__(f"All Gemini models failed. Last error: {last_error}")
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at rate_per_minute, holding at most
+    one minute's worth. The level may go negative when actual usage turns
+    out higher than reserved; later requests then wait for the debt.
+    """
+
+    def __init__(self, rate_per_minute: float, clock=time.monotonic):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.level = self.capacity
+        self._clock = clock
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount can be taken (0 if available now)."""
+        with self._lock:
+            self._refill()
+            amount = min(amount, self.capacity)
+            if self.level >= amount:
+                return 0.0
+            return (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        with self._lock:
+            self._refill()
+            self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount: float) -> None:
+        """Charge (positive) or refund (negative) a correction."""
+        with self._lock:
+            self._refill()
+            self.level = min(self.capacity, self.level - amount)
+
+
+class _ModelLimits:
+    def __init__(self, model: str):
+        self.model = model
+        self.requests = TokenBucket(REQUESTS_PER_MINUTE)
+        self.tokens = TokenBucket(TOKENS_PER_MINUTE)
+
+    def wait_time(self, tokens: int) -> float:
+        return max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+
+    def take(self, tokens: int) -> None:
+        self.requests.take(1)
+        self.tokens.take(tokens)
+
+
+def _new_router() -> model_routing.ModelRouter:
+    return model_routing.ModelRouter(
+        quota_cooldown_seconds=QUOTA_COOLDOWN_SECONDS,
+        not_found_cooldown_seconds=NOT_FOUND_COOLDOWN_SECONDS,
+    )
+
+
+# Shared by every call in this process
+router = _new_router()
+
+_limits: Dict[str, _ModelLimits] = {}
+_limits_lock = threading.Lock()
+_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _model_limits(model: str) -> _ModelLimits:
+    with _limits_lock:
+        if model not in _limits:
+            _limits[model] = _ModelLimits(model)
+        return _limits[model]
+
+
+def _model_slots(model: str) -> asyncio.Semaphore:
+    """The concurrency semaphore of a model for the running event loop."""
+    loop_slots = _slots.setdefault(asyncio.get_running_loop(), {})
+    if model not in loop_slots:
+        loop_slots[model] = asyncio.Semaphore(MODEL_CONCURRENCY)
+    return loop_slots[model]
+
+
+def routed_model(models: Optional[Sequence[str]] = None) -> str:
+    """The model a new call over models would try first (to size its prompt for)."""
+    candidates = list(models or GEMINI_MODELS)
+    routed = router.order(candidates)
+    return routed[0] if routed else candidates[0]
+
+
+def reset() -> None:
+    """Forget all rate-limit and routing state (used by tests)."""
+    global router
+    router = _new_router()
+    with _limits_lock:
+        _limits.clear()
+    _slots.clear()
+
+
+def _input_tokens(contents: Any) -> int:
+    """Rough token count of a request's contents."""
+    def count(item: Any) -> int:
+        if isinstance(item, str):
+            return prompt_budget.count_tokens(item)
+        if isinstance(item, (list, tuple)):
+            return sum(count(part) for part in item)
+        if isinstance(item, types.Content):
+            return count(item.parts or [])
+        if isinstance(item, types.Part):
+            if item.text:
+                return prompt_budget.count_tokens(item.text)
+            if item.inline_data and item.inline_data.data:
+                return len(item.inline_data.data) // INLINE_BYTES_PER_TOKEN
+        return 0
+
+    return count(contents)
+
+
+def estimate_tokens(contents: Any, config: Optional[types.GenerateContentConfig] = None) -> int:
+    """Rough input + output token estimate for rate limiting."""
+    output_tokens = (config.max_output_tokens if config else None) or DEFAULT_OUTPUT_TOKENS
+    return _input_tokens(contents) + output_tokens
+
+
+async def _acquire(models: Sequence[str], tokens: int, deadline: float) -> Tuple[str, asyncio.Semaphore]:
+    """
+    Wait (until deadline) for rate-limit capacity on the first model that
+    can take the request and acquire its concurrency slot. The capacity is
+    taken by the caller once the call is sure to be sent.
+    """
+    while True:
+        candidates = []
+        for index, model in enumerate(models):
+            limits = _model_limits(model)
+            candidates.append((limits.wait_time(tokens), _model_slots(model).locked(), index, model))
+        wait, _, _, model = min(candidates)
+
+        remaining = deadline - time.monotonic()
+        if wait > remaining:
+            raise LLMDeadlineError(f"No Gemini capacity within the deadline (next in {wait:.1f}s)")
+        if wait > 0:
+            await asyncio.sleep(wait)
+            continue
+
+        slots = _model_slots(model)
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=remaining)
+        except asyncio.TimeoutError:
+            raise LLMDeadlineError(f"No free {model} slot within the deadline")
+        return model, slots
+
+
+def _cacheable(text: str, config: Optional[types.GenerateContentConfig]) -> bool:
+    """Responses that should be JSON but cannot be decoded are not worth keeping."""
+    if config is None or config.response_mime_type != "application/json":
+        return True
+    try:
+        llm_json.decode(text)
+    except llm_json.LLMJSONError:
+        return False
+    return True
+
+
+async def _call_model(
+    client: Any,
+    model: str,
+    contents: Any,
+    config: Optional[types.GenerateContentConfig],
+    shared_context: Optional[str],
+) -> types.GenerateContentResponse:
+    if shared_context is not None:
+        handle = await context_cache.reference(model, shared_context)
+        contents, config = context_cache.apply(handle, shared_context, contents, config)
+    return await client.aio.models.generate_content(model=model, contents=contents, config=config)
+
+
+async def generate(contents: Any, config: Optional[types.GenerateContentConfig] = None, **options: Any) -> str:
+    """
+    Run generate_content with the shared fallback policy and return the text.
+
+    purpose labels the metrics (e.g. "quiz", "checkpoint"). Raises
+    LLMDeadlineError when capacity (or a model out of cooldown) did not
+    free up in time and AllModelsFailedError when every model failed with
+    a quota or not-found error.
+
+    Other options: models (instead of GEMINI_MODELS) and deadline_seconds.
+    cache_version is the prompt template's version; passing it reads
+    through the persistent response cache (llm_cache), so bump it when the
+    template changes. cache_contents is what to key that cache on instead
+    of contents (e.g. a video's hash when contents reference an uploaded
+    file); with it, contents may also be an async function building them,
+    only called on a cache miss (e.g. to upload that video).
+    shared_context is a transcript the prompt is about, sent as a context
+    cache handle when possible (context_cache), else inlined before
+    contents.
+    """
+    text, _ = await _generate(contents, config, **options)
+    return text
+
+
+async def generate_json(
+    contents: Any, config: Optional[types.GenerateContentConfig] = None, **options: Any
+) -> Any:
+    """
+    generate() for JSON output, decoded with the tolerant decoder (llm_json).
+
+    Truncated or slightly malformed output is repaired rather than thrown
+    away. Parse outcomes are counted per model in
+    llm_parse_results{model,outcome=ok|repaired|failed} and the routing
+    table. Raises llm_json.LLMJSONError when nothing could be recovered.
+    """
+    text, model = await _generate(contents, config, **options)
+    purpose = options.get("purpose", "default")
+    try:
+        value, repaired = llm_json.decode(text)
+    except llm_json.LLMJSONError:
+        outcome = "failed"
+        raise
+    else:
+        outcome = "repaired" if repaired else "ok"
+        return value
+    finally:
+        metrics.increment("llm_parse_results", model=model, purpose=purpose, outcome=outcome)
+        if model != CACHE_MODEL:
+            router.record_parse(model, outcome)
+
+
+async def _generate(
+    contents: Any,
+    config: Optional[types.GenerateContentConfig] = None,
+    *,
+    models: Optional[Sequence[str]] = None,
+    deadline_seconds: Optional[float] = None,
+    purpose: str = "default",
+    cache_version: Optional[str] = None,
+    shared_context: Optional[str] = None,
+    cache_contents: Any = None,
+) -> Tuple[str, str]:
+    """The response text and the model that produced it (CACHE_MODEL on a cache hit)."""
+    candidates: List[str] = list(models or GEMINI_MODELS)
+    if callable(contents) and cache_contents is None:
+        raise ValueError("Contents built on a cache miss need cache_contents to key the cache")
+    cache_key = None
+    if cache_version is not None:
+        key_contents = contents if cache_contents is None else cache_contents
+        if shared_context is not None:
+            key_contents = [shared_context, key_contents]
+        cache_key = llm_cache.make_key(purpose, cache_version, ",".join(candidates), config, key_contents)
+        cached = await llm_cache.get(cache_key, purpose)
+        if cached is not None:
+            return cached, CACHE_MODEL
+    if callable(contents):
+        contents = await contents()
+
+    client = ai_clients.get_gemini_client()
+    deadline = time.monotonic() + (deadline_seconds or DEFAULT_DEADLINE_SECONDS)
+    estimated = estimate_tokens(contents, config) + prompt_budget.count_tokens(shared_context or "")
+    tried: Set[str] = set()
+    last_error: Optional[BaseException] = None
+    context_retried = False
+
+    while True:
+        untried = [model for model in candidates if model not in tried]
+        if not untried:
+            raise AllModelsFailedError(last_error)
+        routed = router.order(untried)
+        if not routed:
+            # Every remaining model is cooling down or being probed by another
+            # call: wait for the first one
+            wait = router.next_available_in(untried)
+            if wait > deadline - time.monotonic():
+                raise LLMDeadlineError(f"All Gemini models are cooling down (next in {wait:.1f}s)")
+            await asyncio.sleep(wait)
+            continue
+
+        queued = time.perf_counter()
+        model, slots = await _acquire(routed, estimated, deadline)
+        limits = _model_limits(model)
+        if limits.wait_time(estimated) > 0 or not router.allow(model):
+            # Calls that got a slot first used up the capacity, or claimed
+            # the model's probe, while this one queued
+            slots.release()
+            continue
+        limits.take(estimated)
+        tried.add(model)
+        metrics.observe("llm_queue_wait_seconds", time.perf_counter() - queued, model=model)
+
+        started = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(
+                _call_model(client, model, contents, config, shared_context),
+                timeout=max(0.0, deadline - time.monotonic()),
+            )
+        except asyncio.CancelledError:
+            router.record_cancelled(model)
+            raise
+        except asyncio.TimeoutError:
+            router.record_failure(model)
+            metrics.increment("llm_requests", model=model, purpose=purpose, outcome="deadline")
+            raise LLMDeadlineError(f"{model} did not answer within the deadline")
+        except Exception as e:
+            print(f"[LLM] {model} failed: {str(e)[:200]}")
+            text = str(e)
+            if shared_context is not None and "cachedcontent" in text.lower() and not context_retried:
+                # The cached transcript expired or was deleted server-side: recreate it
+                router.record_cancelled(model)  # says nothing about the model
+                await context_cache.forget(model, shared_context)
+                context_retried = True
+                tried.discard(model)
+                metrics.increment("llm_requests", model=model, purpose=purpose, outcome="context_expired")
+                continue
+            if any(marker in text for marker in QUOTA_MARKERS):
+                router.record_quota_error(model, model_routing.retry_after_seconds(e))
+                outcome = "quota"
+            elif any(marker in text for marker in NOT_FOUND_MARKERS):
+                router.record_not_found(model)
+                outcome = "not_found"
+            else:
+                router.record_failure(model)
+                metrics.increment("llm_requests", model=model, purpose=purpose, outcome="error")
+                raise
+            metrics.increment("llm_requests", model=model, purpose=purpose, outcome=outcome)
+            last_error = e
+            continue
+        finally:
+            slots.release()
+
+        latency = time.perf_counter() - started
+        metrics.observe("llm_latency_seconds", latency, model=model, purpose=purpose)
+        usage = getattr(response, "usage_metadata", None)
+        if usage and usage.total_token_count:
+            _model_limits(model).tokens.adjust(usage.total_token_count - estimated)
+            tokens_in = usage.prompt_token_count or 0
+            tokens_out = usage.candidates_token_count or 0
+            if usage.cached_content_token_count:
+                metrics.increment(
+                    "llm_tokens", usage.cached_content_token_count,
+                    model=model, purpose=purpose, direction="cached",
+                )
+        else:
+            tokens_in = _input_tokens(contents) + prompt_budget.count_tokens(shared_context or "")
+            tokens_out = prompt_budget.count_tokens(response.text or "")
+        metrics.increment("llm_tokens", tokens_in, model=model, purpose=purpose, direction="in")
+        metrics.increment("llm_tokens", tokens_out, model=model, purpose=purpose, direction="out")
+
+        if response.text:
+            router.record_success(model, latency)
+            metrics.increment("llm_requests", model=model, purpose=purpose, outcome="success")
+            if cache_key and _cacheable(response.text, config):
+                await llm_cache.put(cache_key, response.text, purpose)
+            return response.text, model
+        print(f"[LLM] Empty response from {model}, trying next...")
+        router.record_failure(model)
+        metrics.increment("llm_requests", model=model, purpose=purpose, outcome="empty")
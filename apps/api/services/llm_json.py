@@ -0,0 +1,110 @@
+"""
+Tolerant JSON decoding for model output.
+
+Even with a response schema, Gemini output can be wrapped in a Markdown
+fence, carry a trailing comma or be cut off by max_output_tokens. Instead
+of throwing the whole (already paid for) answer away, decode() repairs
+what it can:
+
+- strips code fences and text around the JSON value;
+- if the text still does not parse, scans it once, remembering every
+  point where an array element or object member was complete, and
+  closes the open brackets at the latest such point that parses. A
+  truncated array keeps all of its complete elements.
+
+validate_items() then keeps the elements that match a Pydantic model (or
+union of models), so one bad element does not cost the others.
+"""
+
+import json
+from typing import Any, List, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+
+CLOSERS = {"{": "}", "[": "]"}
+# Give up after this many candidate cut points (from the end)
+MAX_REPAIR_ATTEMPTS = 64
+
+
+class LLMJSONError(ValueError):
+    """Raised when no JSON value can be recovered from model output."""
+
+
+def _strip(text: str) -> str:
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    return text[min(starts):].strip() if starts else text.strip()
+
+
+def _cut_points(text: str) -> List[Tuple[int, str]]:
+    """
+    (end index, closing brackets) pairs where the text can be cut and
+    closed into valid JSON: right after a closed container and right
+    before a comma separating complete elements.
+    """
+    points: List[Tuple[int, str]] = []
+    stack: List[str] = []
+    in_string = escaped = False
+
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in CLOSERS:
+            stack.append(CLOSERS[char])
+        elif char in "]}":
+            if not stack:
+                break
+            stack.pop()
+            points.append((i + 1, "".join(reversed(stack))))
+            if not stack:
+                break
+        elif char == "," and stack:
+            points.append((i, "".join(reversed(stack))))
+    return points
+
+
+def decode(text: str) -> Tuple[Any, bool]:
+    """
+    Decode model output, repairing it if needed.
+
+    Returns (value, repaired). Raises LLMJSONError when nothing usable
+    could be recovered.
+    """
+    text = _strip(text or "")
+    try:
+        return json.loads(text), False
+    except ValueError:
+        pass
+
+    for end, closers in reversed(_cut_points(text)[-MAX_REPAIR_ATTEMPTS:]):
+        try:
+            return json.loads(text[:end] + closers), True
+        except ValueError:
+            continue
+    raise LLMJSONError(f"Unrecoverable JSON in model output: {text[:80]!r}")
+
+
+def validate_items(items: Any, item_type: Any, label: str = "item") -> List[dict]:
+    """Keep the elements of items that validate against item_type (a model or union), as dicts."""
+    if not isinstance(items, list):
+        return []
+    adapter = TypeAdapter(item_type)
+    valid = []
+    for index, item in enumerate(items):
+        try:
+            valid.append(adapter.dump_python(adapter.validate_python(item)))
+        except ValidationError as e:
+            print(f"[LLM] Dropping invalid {label} {index}: {e.errors()[:1]}")
+    return valid
@@ -0,0 +1,111 @@
+"""
+Local CPU speech recognition: the offline tier of the transcription chain.
+
+Runs a Vosk (Kaldi) model in a process pool, so recognition uses every
+core without holding the API worker's GIL and needs no network at all.
+Audio is split at pauses (audio_segmentation.chunk_ranges) and the chunks
+are recognized in parallel, one chunk per worker process; each worker
+reads its own range of the WAV file.
+
+Needs the optional ``vosk`` package and a downloaded model directory
+(TRANSCRIPTION_LOCAL_MODEL_PATH, e.g. vosk-model-small-pt-0.3).
+TRANSCRIPTION_LOCAL_ASR places it in the provider chain: primary,
+fallback or disabled (the default).
+"""
+
+import asyncio
+import io
+import json
+import os
+import wave
+from typing import Any, Dict, List
+
+from services import audio_segmentation, executors
+
+try:
+    import vosk
+    VOSK_AVAILABLE = True
+except ImportError:
+    VOSK_AVAILABLE = False
+
+MODES = ("primary", "fallback", "disabled")
+MODE = os.getenv("TRANSCRIPTION_LOCAL_ASR", "disabled").lower()
+MODEL_PATH = os.getenv("TRANSCRIPTION_LOCAL_MODEL_PATH", "")
+# Audio per chunk handed to a worker process
+CHUNK_SECONDS = float(os.getenv("TRANSCRIPTION_LOCAL_CHUNK_SECONDS", "60"))
+
+# Frames fed to the recognizer per call
+READ_FRAMES = 4000
+
+# Model loaded once per worker process
+_model = None
+
+
+def is_available() -> bool:
+    """Whether the local tier is enabled and its model can be loaded."""
+    return MODE in ("primary", "fallback") and VOSK_AVAILABLE and os.path.isdir(MODEL_PATH)
+
+
+def _load_model(model_path: str):
+    global _model
+    if _model is None:
+        vosk.SetLogLevel(-1)
+        _model = vosk.Model(model_path)
+    return _model
+
+
+def recognize_wav(wav_bytes: bytes, model_path: str) -> Dict[str, Any]:
+    """Recognize one WAV chunk; runs inside a local_asr worker process."""
+    model = _load_model(model_path)
+    segments: List[Dict[str, Any]] = []
+
+    def collect(raw: str) -> None:
+        result = json.loads(raw)
+        words = result.get("result") or []
+        if words:
+            segments.append({
+                "start": words[0]["start"],
+                "end": words[-1]["end"],
+                "text": result.get("text", ""),
+            })
+
+    with wave.open(io.BytesIO(wav_bytes), "rb") as wav:
+        recognizer = vosk.KaldiRecognizer(model, wav.getframerate())
+        recognizer.SetWords(True)
+        while True:
+            data = wav.readframes(READ_FRAMES)
+            if not data:
+                break
+            if recognizer.AcceptWaveform(data):
+                collect(recognizer.Result())
+        collect(recognizer.FinalResult())
+
+    return {
+        "transcript": " ".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "language": "pt-BR",
+        "provider": "local",
+    }
+
+
+def recognize_range(
+    source: audio_segmentation.WavSource, start_s: float, end_s: float, model_path: str
+) -> Dict[str, Any]:
+    """Recognize the [start_s, end_s) range of WAV audio; runs inside a worker process."""
+    return recognize_wav(audio_segmentation.slice_wav(source, start_s, end_s), model_path)
+
+
+async def transcribe(source: audio_segmentation.WavSource) -> Dict[str, Any]:
+    """Recognize WAV audio (preferably a file path) with its chunks spread across the process pool."""
+    chunks = await executors.run_blocking(
+        "media", audio_segmentation.chunk_ranges, source, CHUNK_SECONDS
+    )
+    results = await asyncio.gather(*(
+        executors.run_in_process("local_asr", recognize_range, source, offset, end, MODEL_PATH)
+        for offset, end in chunks
+    ))
+    merged = audio_segmentation.merge_chunk_results(
+        [(offset, result) for (offset, _), result in zip(chunks, results, strict=True)]
+    )
+    merged.pop("chunks", None)
+    return merged
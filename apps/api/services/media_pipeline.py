@@ -0,0 +1,330 @@
+"""
+Async ffmpeg media pipeline.
+
+ffmpeg runs through asyncio.create_subprocess_exec and decodes the uploaded
+video once: every requested audio encoding is written by the same process
+straight into the audio's working directory, so a 90-minute lecture never
+passes through the API's memory. Providers read the one encoding they need
+only for the duration of their request. stream_pcm() pipes raw PCM to
+consumers that process audio as it is decoded.
+A process-wide semaphore caps concurrent ffmpeg processes to the CPU count.
+"""
+
+import asyncio
+import io
+import os
+import shutil
+import tempfile
+import wave
+import weakref
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+
+from services import audio_segmentation, executors
+from services.audio_segmentation import OffsetMap
+
+SAMPLE_RATE = 16000
+CHANNELS = 1
+SAMPLE_WIDTH = 2  # 16-bit PCM
+
+MAX_CONCURRENT_FFMPEG = int(os.getenv("FFMPEG_MAX_PROCESSES", str(os.cpu_count() or 2)))
+
+# Bytes read from ffmpeg's stdout per iteration when streaming PCM
+PCM_READ_SIZE = 64 * 1024
+
+# Encoder arguments per output format
+FORMAT_ARGS: Dict[str, List[str]] = {
+    "wav": ["-acodec", "pcm_s16le", "-bitexact", "-f", "wav"],
+    "flac": ["-acodec", "flac", "-compression_level", "5", "-f", "flac"],
+    "mp3": ["-acodec", "libmp3lame", "-q:a", "4", "-f", "mp3"],
+    "opus": ["-acodec", "libopus", "-b:a", "32k", "-application", "voip", "-f", "ogg"],
+}
+# Headerless PCM for stream_pcm (a WAV header cannot be finished on a pipe)
+PCM_ARGS = ["-acodec", "pcm_s16le", "-f", "s16le"]
+
+MIME_TYPES: Dict[str, str] = {
+    "wav": "audio/wav",
+    "flac": "audio/flac",
+    "mp3": "audio/mp3",
+    "opus": "audio/ogg",
+}
+
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+class FFmpegError(Exception):
+    """Raised when ffmpeg exits with an error."""
+
+    def __init__(self, message: str, stderr: str = ""):
+        self.stderr = stderr
+        super().__init__(message)
+
+
+class NoAudioStreamError(FFmpegError):
+    """Raised when the input has no audio track."""
+
+
+def _ffmpeg_slots() -> asyncio.Semaphore:
+    """The ffmpeg semaphore for the running event loop."""
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_FFMPEG)
+        _semaphores[loop] = semaphore
+    return semaphore
+
+
+def pcm_to_wav(pcm: bytes, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """Wrap raw 16-bit mono PCM in a WAV container."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(CHANNELS)
+        wav.setsampwidth(SAMPLE_WIDTH)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def _output_args(fmt: str, target: str, sample_rate: int = SAMPLE_RATE) -> List[str]:
+    if fmt not in FORMAT_ARGS:
+        raise ValueError(f"Unsupported audio format: {fmt}")
+    return _map_args(sample_rate) + FORMAT_ARGS[fmt] + [target]
+
+
+def _map_args(sample_rate: int) -> List[str]:
+    return ["-map", "0:a:0", "-vn", "-ac", str(CHANNELS), "-ar", str(sample_rate)]
+
+
+def _raise_for_stderr(returncode: int, stderr: bytes) -> None:
+    message = stderr.decode(errors="replace")
+    if "Output file does not contain any stream" in message or "matches no streams" in message:
+        raise NoAudioStreamError("No audio track found in video", message)
+    raise FFmpegError(f"ffmpeg exited with code {returncode}: {message[-500:]}", message)
+
+
+def encoding_path(directory: str, fmt: str) -> str:
+    """Where the fmt encoding of an audio's working directory lives."""
+    return os.path.join(directory, f"audio.{fmt}")
+
+
+async def _encode(
+    input_args: List[str], formats: Sequence[str], sample_rate: int, directory: str
+) -> Dict[str, str]:
+    """
+    Run one ffmpeg process over the input, writing it into directory in
+    every format. Returns the path of each encoding.
+
+    Outputs go to partial files that are renamed once ffmpeg succeeds, so
+    an encoding's path only exists when it is complete (leftovers of a
+    failed run go away with the directory).
+    """
+    paths = {fmt: encoding_path(directory, fmt) for fmt in dict.fromkeys(formats)}
+    cmd = ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-y"] + input_args
+    for fmt, path in paths.items():
+        cmd += _output_args(fmt, f"{path}.part", sample_rate)
+
+    async with _ffmpeg_slots():
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            _, stderr = await process.communicate()
+        except BaseException:
+            if process.returncode is None:
+                process.kill()
+            raise
+
+    if process.returncode != 0:
+        _raise_for_stderr(process.returncode, stderr)
+    for path in paths.values():
+        os.replace(f"{path}.part", path)
+    return paths
+
+
+async def extract_audio(
+    video_path: str,
+    directory: str,
+    formats: Sequence[str] = ("wav",),
+    sample_rate: int = SAMPLE_RATE,
+) -> Dict[str, str]:
+    """
+    Decode the audio track once and write it into directory in every
+    requested format, all from a single ffmpeg process. Raises
+    NoAudioStreamError if the video has no audio.
+    """
+    return await _encode(["-i", video_path], formats, sample_rate, directory)
+
+
+def wav_sample_rate(wav_path: str) -> int:
+    with wave.open(wav_path, "rb") as reader:
+        return reader.getframerate()
+
+
+async def encode_wav(wav_path: str, formats: Sequence[str], directory: str) -> Dict[str, str]:
+    """Re-encode a WAV file into every format in one pass (keeping its sample rate)."""
+    return await _encode(["-i", wav_path], formats, wav_sample_rate(wav_path), directory)
+
+
+async def transcode(wav_path: str, fmt: str, directory: str) -> str:
+    """Re-encode a WAV file into one format."""
+    return (await encode_wav(wav_path, [fmt], directory))[fmt]
+
+
+async def stream_pcm(video_path: str, read_size: int = PCM_READ_SIZE) -> AsyncIterator[bytes]:
+    """
+    Yield raw 16 kHz mono PCM from the video as ffmpeg decodes it.
+
+    The ffmpeg slot is held until the consumer finishes (or abandons) the
+    iteration, at which point the process is reaped.
+    """
+    cmd = ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-i", video_path]
+    cmd += _map_args(SAMPLE_RATE) + PCM_ARGS + ["pipe:1"]
+
+    async with _ffmpeg_slots():
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        stderr_task = asyncio.ensure_future(process.stderr.read())
+        try:
+            while True:
+                block = await process.stdout.read(read_size)
+                if not block:
+                    break
+                yield block
+            await process.wait()
+            if process.returncode != 0:
+                _raise_for_stderr(process.returncode, await stderr_task)
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            stderr_task.cancel()
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _write_file(path: str, data: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _new_directory() -> str:
+    return tempfile.mkdtemp(prefix="youedu-audio-")
+
+
+class ExtractedAudio:
+    """
+    Audio decoded from one upload, kept on disk in a private working
+    directory with one file per encoding produced so far. Providers ask
+    for the encoding they want through get(), which reads it only for the
+    caller's request; missing encodings are transcoded from the WAV once
+    and reused by any later fallback. close() deletes the directory.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        if not self.has("wav"):
+            raise ValueError("ExtractedAudio requires the WAV encoding")
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._read_header()
+
+    @classmethod
+    def from_bytes(cls, encodings: Dict[str, bytes]) -> "ExtractedAudio":
+        """Audio whose encodings are already in memory (tests, small clips)."""
+        directory = _new_directory()
+        for fmt, data in encodings.items():
+            _write_file(encoding_path(directory, fmt), data)
+        return cls(directory)
+
+    def _read_header(self) -> None:
+        with wave.open(self.path("wav"), "rb") as wav:
+            self.sample_rate = wav.getframerate()
+            self.duration = wav.getnframes() / float(self.sample_rate)
+
+    def path(self, fmt: str) -> str:
+        return encoding_path(self.directory, fmt)
+
+    def has(self, fmt: str) -> bool:
+        return os.path.exists(self.path(fmt))
+
+    def size(self, fmt: str) -> int:
+        return os.path.getsize(self.path(fmt))
+
+    async def encode(self, formats: Sequence[str]) -> None:
+        """Produce every missing format in formats from the WAV, in one ffmpeg pass."""
+        missing = [fmt for fmt in dict.fromkeys(formats) if not self.has(fmt)]
+        if missing:
+            await encode_wav(self.path("wav"), missing, self.directory)
+
+    async def get(self, fmt: str) -> bytes:
+        """Return the audio in fmt, transcoding (once) if needed."""
+        if not self.has(fmt):
+            # Concurrent callers share one transcode instead of starting their own
+            if fmt not in self._pending:
+                self._pending[fmt] = asyncio.ensure_future(
+                    transcode(self.path("wav"), fmt, self.directory)
+                )
+            try:
+                await asyncio.shield(self._pending[fmt])
+            finally:
+                self._pending.pop(fmt, None)
+        return await executors.run_blocking("storage", _read_file, self.path(fmt))
+
+    async def excerpt(self, start_s: float, end_s: float) -> "ExtractedAudio":
+        """A new audio holding the [start_s, end_s) range of this one's WAV."""
+        directory = _new_directory()
+        try:
+            await executors.run_blocking(
+                "media", audio_segmentation.write_slice,
+                self.path("wav"), start_s, end_s, encoding_path(directory, "wav"),
+            )
+        except BaseException:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        return ExtractedAudio(directory)
+
+    async def trim_silence(self) -> OffsetMap:
+        """
+        Cut long pauses out of the WAV in place (see
+        audio_segmentation.trim_silence). Encodings made from the untrimmed
+        WAV are dropped. Returns the map back to the original timeline.
+        """
+        trimmed_path = self.path("trimmed.wav")
+        offset_map = await executors.run_blocking(
+            "media", audio_segmentation.trim_silence, self.path("wav"), trimmed_path
+        )
+        if offset_map.trimmed_seconds > 0:
+            for name in os.listdir(self.directory):
+                if name != os.path.basename(trimmed_path):
+                    os.unlink(os.path.join(self.directory, name))
+            os.replace(trimmed_path, self.path("wav"))
+            self._read_header()
+        return offset_map
+
+    def close(self) -> None:
+        """Delete the working directory and every encoding in it."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+async def extract_for_transcription(
+    video_path: str, extra_formats: Sequence[str] = (), sample_rate: int = SAMPLE_RATE
+) -> Optional[ExtractedAudio]:
+    """
+    Extract the speech-recognition WAV (plus any extra formats in the same
+    ffmpeg pass) into a new working directory; the caller closes the
+    returned audio. Returns None if the video has no audio track.
+    """
+    directory = _new_directory()
+    try:
+        await extract_audio(video_path, directory, ["wav", *extra_formats], sample_rate)
+    except NoAudioStreamError:
+        shutil.rmtree(directory, ignore_errors=True)
+        return None
+    except BaseException:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    return ExtractedAudio(directory)
@@ -0,0 +1,108 @@
+"""
+In-process metrics registry.
+
+Services record counters, gauges and latency samples here; the whole
+registry is exposed as JSON at GET /api/metrics so it can be scraped.
+Metric names follow the Prometheus convention and labels are rendered
+into the key, e.g. ``transcription_provider_latency{provider=gemini}``.
+"""
+
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+# Number of recent samples kept per latency metric for percentiles
+LATENCY_WINDOW = 512
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, float] = {}
+_latencies: Dict[str, Deque[float]] = {}
+_latency_totals: Dict[str, Dict[str, float]] = {}
+
+
+def _key(name: str, labels: Dict[str, Any]) -> str:
+    if not labels:
+        return name
+    rendered = ",".join(f"{k}={labels[k]}" for k in sorted(labels))
+    return f"{name}{{{rendered}}}"
+
+
+def increment(name: str, value: float = 1, **labels: Any) -> None:
+    """Add value to a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels: Any) -> None:
+    """Set a gauge to its current value."""
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = value
+
+
+def observe(name: str, seconds: float, **labels: Any) -> None:
+    """Record a latency sample (in seconds)."""
+    key = _key(name, labels)
+    with _lock:
+        samples = _latencies.setdefault(key, deque(maxlen=LATENCY_WINDOW))
+        samples.append(seconds)
+        totals = _latency_totals.setdefault(key, {"count": 0, "sum": 0.0})
+        totals["count"] += 1
+        totals["sum"] += seconds
+
+
+def get_counter(name: str, **labels: Any) -> float:
+    """Current value of a counter (0 if never incremented)."""
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+
+def percentile(name: str, q: float, **labels: Any) -> Optional[float]:
+    """
+    Percentile (0-100) over the recent samples of a latency metric.
+
+    Returns None when no samples were recorded yet.
+    """
+    with _lock:
+        samples = list(_latencies.get(_key(name, labels), ()))
+    return _percentile(sorted(samples), q)
+
+
+def _percentile(ordered: list, q: float) -> Optional[float]:
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def snapshot() -> Dict[str, Any]:
+    """Return every metric as a JSON-serializable dict."""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        windows = {key: sorted(samples) for key, samples in _latencies.items()}
+        totals = {key: dict(value) for key, value in _latency_totals.items()}
+
+    latencies = {}
+    for key, ordered in windows.items():
+        latencies[key] = {
+            "count": int(totals[key]["count"]),
+            "sum": round(totals[key]["sum"], 6),
+            "p50": _percentile(ordered, 50),
+            "p95": _percentile(ordered, 95),
+            "p99": _percentile(ordered, 99),
+            "max": ordered[-1] if ordered else None,
+        }
+
+    return {"counters": counters, "gauges": gauges, "latencies": latencies}
+
+
+def reset() -> None:
+    """Clear all metrics (used by tests)."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _latencies.clear()
+        _latency_totals.clear()
@@ -0,0 +1,230 @@
+"""
+Quota-aware routing table for Gemini models.
+
+Remembers what each model last told us so new calls skip models that are
+known to fail:
+
+- 429 / RESOURCE_EXHAUSTED cools the model down for the Retry-After the
+  API sent, else for a cooldown that doubles on every repeat.
+- 404 / NOT_FOUND cools it down for a long time (the model is not
+  available to this API key).
+- successes record an EWMA of latency, and JSON responses their parse
+  outcome (parse-failure rate per model).
+
+order() returns the models to try, best first. The model that last
+succeeded is sticky and stays first, so calls stop paying a failing round
+trip at the top of the list. When a cooldown expires the model is probed:
+one call at a time is let through (ahead of the sticky model if it is
+preferred over it). Success makes it the sticky model again; a probe that
+fails in any way cools it down again. Models without history keep their configured
+priority; other fallbacks are ordered fastest first.
+
+Used from the event loop only; needs no locking.
+"""
+
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+AVAILABLE = "available"
+COOLING = "cooling"
+PROBING = "probing"
+
+RETRY_DELAY_PATTERN = re.compile(r"retryDelay['\"]?\s*:\s*['\"]?(\d+(?:\.\d+)?)s")
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Retry-After of a quota error: the HTTP header, else the RetryInfo detail."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        value = headers.get("retry-after")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    match = RETRY_DELAY_PATTERN.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+class ModelRoute:
+    """Routing state of a single model."""
+
+    def __init__(self, name: str, priority: int):
+        self.name = name
+        self.priority = priority
+        self.state = AVAILABLE
+        self.latency_ewma: Optional[float] = None
+        self.successes = 0
+        self.quota_errors = 0
+        self.not_found_errors = 0
+        self.parses = 0
+        self.parse_repairs = 0
+        self.parse_failures = 0
+        self.consecutive_quota_errors = 0
+        self.cooldown_until = 0.0
+        self.probe_in_flight = False
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "latency_ewma_seconds": round(self.latency_ewma, 4) if self.latency_ewma is not None else None,
+            "successes": self.successes,
+            "quota_errors": self.quota_errors,
+            "not_found_errors": self.not_found_errors,
+            "parse_repairs": self.parse_repairs,
+            "parse_failure_rate": round(self.parse_failures / self.parses, 4) if self.parses else 0.0,
+            "retry_in_seconds": round(max(0.0, self.cooldown_until - now), 1)
+            if self.state == COOLING else None,
+        }
+
+
+class ModelRouter:
+    """Cooldowns, latency and sticky preference for a list of models."""
+
+    def __init__(
+        self,
+        alpha: float = 0.3,
+        quota_cooldown_seconds: float = 30.0,
+        max_quota_cooldown_seconds: float = 600.0,
+        not_found_cooldown_seconds: float = 3600.0,
+        probe_poll_seconds: float = 0.25,
+        clock=time.monotonic,
+    ):
+        self.alpha = alpha
+        self.quota_cooldown_seconds = quota_cooldown_seconds
+        self.max_quota_cooldown_seconds = max_quota_cooldown_seconds
+        self.not_found_cooldown_seconds = not_found_cooldown_seconds
+        self.probe_poll_seconds = probe_poll_seconds
+        self._clock = clock
+        self._routes: Dict[str, ModelRoute] = {}
+        self.sticky: Optional[str] = None
+
+    def get(self, name: str, priority: int = 0) -> ModelRoute:
+        if name not in self._routes:
+            self._routes[name] = ModelRoute(name, priority)
+        return self._routes[name]
+
+    def _cool_down(self, route: ModelRoute, seconds: float) -> None:
+        route.state = COOLING
+        route.cooldown_until = self._clock() + seconds
+        route.probe_in_flight = False
+        if self.sticky == route.name:
+            self.sticky = None
+        print(f"[LLM] {route.name} cooling down for {seconds:.0f}s")
+
+    def record_success(self, name: str, latency_seconds: float) -> None:
+        route = self.get(name)
+        route.successes += 1
+        route.latency_ewma = (
+            latency_seconds if route.latency_ewma is None
+            else self.alpha * latency_seconds + (1 - self.alpha) * route.latency_ewma
+        )
+        route.consecutive_quota_errors = 0
+        route.probe_in_flight = False
+        route.state = AVAILABLE
+        self.sticky = name
+
+    def record_quota_error(self, name: str, retry_after: Optional[float] = None) -> None:
+        route = self.get(name)
+        route.quota_errors += 1
+        route.consecutive_quota_errors += 1
+        if retry_after is None:
+            retry_after = min(
+                self.max_quota_cooldown_seconds,
+                self.quota_cooldown_seconds * 2 ** (route.consecutive_quota_errors - 1),
+            )
+        self._cool_down(route, retry_after)
+
+    def record_not_found(self, name: str) -> None:
+        route = self.get(name)
+        route.not_found_errors += 1
+        self._cool_down(route, self.not_found_cooldown_seconds)
+
+    def record_failure(self, name: str) -> None:
+        """Any other failed call: a failed probe sends the model back to cooldown."""
+        route = self.get(name)
+        if route.state == PROBING:
+            self._cool_down(route, self.quota_cooldown_seconds)
+
+    def record_parse(self, name: str, outcome: str) -> None:
+        """Outcome of decoding a JSON response: "ok", "repaired" or "failed"."""
+        route = self.get(name)
+        route.parses += 1
+        if outcome == "repaired":
+            route.parse_repairs += 1
+        elif outcome == "failed":
+            route.parse_failures += 1
+
+    def record_cancelled(self, name: str) -> None:
+        """An attempt ended without an outcome: release a pending probe."""
+        self.get(name).probe_in_flight = False
+
+    def _available(self, route: ModelRoute) -> bool:
+        if route.state == COOLING:
+            if self._clock() < route.cooldown_until:
+                return False
+            route.state = PROBING
+        return not (route.state == PROBING and route.probe_in_flight)
+
+    def allow(self, name: str) -> bool:
+        """Whether a call may be sent now; claims the probe slot when probing."""
+        route = self.get(name)
+        if not self._available(route):
+            return False
+        if route.state == PROBING:
+            route.probe_in_flight = True
+        return True
+
+    def order(self, names: List[str]) -> List[str]:
+        """
+        Models to try for a new call (names in configured priority order).
+
+        Probes of models preferred over the sticky one come first, then the
+        sticky model, then the others fastest first (no history: by
+        priority), then the remaining probes. Cooling models are left out.
+        """
+        for index, name in enumerate(names):
+            self.get(name, index).priority = index
+        sticky = self.sticky if self.sticky in names else None
+        sticky_priority = self.get(sticky).priority if sticky else len(names)
+
+        early_probes, late_probes, rest = [], [], []
+        for name in names:
+            route = self.get(name)
+            if name == sticky or not self._available(route):
+                continue
+            if route.state == PROBING:
+                (early_probes if route.priority < sticky_priority else late_probes).append(name)
+                continue
+            rest.append((route.latency_ewma is None, route.latency_ewma or 0.0, route.priority, name))
+
+        head = [sticky] if sticky and self._available(self.get(sticky)) else []
+        return early_probes + head + [name for *_, name in sorted(rest)] + late_probes
+
+    def next_available_in(self, names: List[str]) -> float:
+        """
+        Seconds until the first of names may be tried (0 if one is usable):
+        the end of its cooldown, or probe_poll_seconds while it waits for
+        its probe in flight to finish.
+        """
+        now = self._clock()
+        waits = []
+        for route in (self.get(name) for name in names):
+            if route.state == COOLING:
+                waits.append(max(0.0, route.cooldown_until - now))
+            elif route.state == PROBING and route.probe_in_flight:
+                waits.append(self.probe_poll_seconds)
+            else:
+                waits.append(0.0)
+        return min(waits) if waits else 0.0
+
+    def snapshot(self, names: Optional[List[str]] = None) -> Dict[str, Any]:
+        now = self._clock()
+        names = names if names is not None else list(self._routes)
+        return {
+            "sticky": self.sticky,
+            "order": self.order(names),
+            "models": {name: self.get(name).to_dict(now) for name in names},
+        }
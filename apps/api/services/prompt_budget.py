@@ -0,0 +1,183 @@
+"""
+Token-aware prompt budgeting.
+
+Prompts used to slice text by characters (segment[:2000],
+transcript_text[:10000]), which wasted context, ignored the prompt's fixed
+overhead and silently dropped the end of long lectures. Instead:
+
+- count_tokens() counts tokens locally for the target model, with the
+  SDK's local tokenizer when the optional ``sentencepiece`` package is
+  installed, else a conservative characters-per-token estimate. Loading a
+  tokenizer downloads its vocabulary, so preload() loads them off the event
+  loop at startup and the estimate is used until then;
+- section_budget() gives the tokens left for a prompt section once the
+  template and the expected output are paid for, capped by the section's
+  configured budget and the smallest context of the models that may serve
+  the call;
+- fit_text() fills a budget with the most informative spans of a
+  transcript, sampled evenly along it (text position stands in for the
+  timestamp), so every part of the lecture is represented.
+"""
+
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+from services import executors
+
+try:
+    from google.genai.local_tokenizer import LocalTokenizer
+    LOCAL_TOKENIZER_AVAILABLE = True
+except ImportError:
+    LOCAL_TOKENIZER_AVAILABLE = False
+
+# Conservative for Portuguese (Gemini averages ~4 characters per token)
+CHARS_PER_TOKEN = 3.5
+
+# Input context per model; unknown models get the smallest known window
+MODEL_CONTEXT_TOKENS: Dict[str, int] = {
+    "gemini-2.0-flash": 1_048_576,
+    "gemini-2.0-flash-lite": 1_048_576,
+    "gemini-2.5-flash": 1_048_576,
+    "gemini-2.5-flash-lite": 1_048_576,
+}
+DEFAULT_CONTEXT_TOKENS = int(os.getenv("PROMPT_DEFAULT_CONTEXT_TOKENS", "32768"))
+
+# Budget per prompt section (tokens)
+SECTION_BUDGETS: Dict[str, int] = {
+    "checkpoint_segment": int(os.getenv("PROMPT_CHECKPOINT_SEGMENT_TOKENS", "1200")),
+    "quiz_transcript": int(os.getenv("PROMPT_QUIZ_TRANSCRIPT_TOKENS", "6000")),
+    # Raw excerpts sent next to a transcript digest (see transcript_digest)
+    "checkpoint_excerpt": int(os.getenv("PROMPT_CHECKPOINT_EXCERPT_TOKENS", "300")),
+    "quiz_excerpts": int(os.getenv("PROMPT_QUIZ_EXCERPT_TOKENS", "1500")),
+}
+
+# Words per candidate span when a transcript has to be sampled
+SPAN_WORDS = 40
+GAP_MARKER = " [...] "
+
+WORD_PATTERN = re.compile(r"\w{4,}", re.UNICODE)
+
+_tokenizers: Dict[str, object] = {}
+_tokenizers_lock = threading.Lock()
+
+
+def _load_tokenizer(model: str) -> None:
+    with _tokenizers_lock:
+        if model not in _tokenizers:
+            try:
+                _tokenizers[model] = LocalTokenizer(model_name=model)
+            except Exception as e:
+                print(f"[Prompt Budget] No local tokenizer for {model}: {e}")
+                _tokenizers[model] = None
+
+
+async def preload(models: Sequence[str]) -> None:
+    """Load the local tokenizers of models on the "llm" pool (they download their vocabulary)."""
+    if not LOCAL_TOKENIZER_AVAILABLE:
+        return
+    for model in dict.fromkeys(models):
+        await executors.run_blocking("llm", _load_tokenizer, model)
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Tokens in text for model (local tokenizer if available, else an estimate)."""
+    if not text:
+        return 0
+    if LOCAL_TOKENIZER_AVAILABLE and model:
+        # Only tokenizers preload() already loaded: loading one here would block
+        tokenizer = _tokenizers.get(model)
+        if tokenizer is not None:
+            try:
+                return tokenizer.count_tokens(text).total_tokens
+            except Exception as e:
+                print(f"[Prompt Budget] Local token count failed: {e}")
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def section_budget(
+    section: str,
+    template: str,
+    output_tokens: int,
+    models: Sequence[str],
+    parts: int = 1,
+    model: Optional[str] = None,
+) -> int:
+    """
+    Tokens available to each of parts copies of a prompt section.
+
+    The template (fixed instructions) and output_tokens are taken off the
+    smallest context window among models first. The template is counted
+    for model (default: the first of models).
+    """
+    model = model or (models[0] if models else None)
+    context = min(
+        (MODEL_CONTEXT_TOKENS.get(m, DEFAULT_CONTEXT_TOKENS) for m in models),
+        default=DEFAULT_CONTEXT_TOKENS,
+    )
+    available = context - count_tokens(template, model) - output_tokens
+    return max(0, min(SECTION_BUDGETS[section], available // max(1, parts)))
+
+
+def _spans(text: str) -> List[str]:
+    words = text.split()
+    return [" ".join(words[i:i + SPAN_WORDS]) for i in range(0, len(words), SPAN_WORDS)]
+
+
+def fit_text(text: str, budget_tokens: int, model: Optional[str] = None) -> str:
+    """
+    text if it fits budget_tokens, else its most informative spans.
+
+    The text is cut into SPAN_WORDS-word spans grouped into as many equal
+    stretches as fit in the budget. Each stretch contributes its span with
+    the highest information density (rare content words per token); more
+    spans are then added round-robin while budget remains. The result keeps
+    the original order, with GAP_MARKER where text was left out.
+    """
+    text = " ".join(text.split())
+    if count_tokens(text, model) <= budget_tokens:
+        return text
+    spans = _spans(text)
+    if not spans or budget_tokens <= 0:
+        return ""
+
+    costs = [count_tokens(span, model) + count_tokens(GAP_MARKER, model) for span in spans]
+    terms = [{w.lower() for w in WORD_PATTERN.findall(span)} for span in spans]
+    document_frequency = Counter(term for span_terms in terms for term in span_terms)
+    scores = [
+        sum(math.log(len(spans) / document_frequency[t]) for t in span_terms) / costs[i]
+        for i, span_terms in enumerate(terms)
+    ]
+
+    # One stretch per span that fits, spread evenly along the text
+    average_cost = sum(costs) / len(costs)
+    stretches = max(1, min(len(spans), int(budget_tokens // average_cost)))
+    bounds = [round(i * len(spans) / stretches) for i in range(stretches + 1)]
+    queues = [
+        sorted(range(bounds[i], bounds[i + 1]), key=lambda j: scores[j], reverse=True)
+        for i in range(stretches)
+    ]
+
+    chosen, used = set(), 0
+    while any(queues):
+        for queue in queues:
+            while queue:
+                index = queue.pop(0)
+                if used + costs[index] <= budget_tokens:
+                    chosen.add(index)
+                    used += costs[index]
+                    break
+        if used + min(costs) > budget_tokens:
+            break
+
+    pieces, previous = [], -1
+    for index in sorted(chosen):
+        if pieces and index != previous + 1:
+            pieces.append(GAP_MARKER.strip())
+        pieces.append(spans[index])
+        previous = index
+    prefix = GAP_MARKER.strip() + " " if chosen and min(chosen) > 0 else ""
+    return prefix + " ".join(pieces)
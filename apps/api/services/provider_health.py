@@ -0,0 +1,215 @@
+"""
+Provider health registry with per-provider circuit breakers.
+
+Tracks, for each provider, an EWMA of latency (and of the real-time factor
+when the audio duration is known), an EWMA error rate and a breaker state:
+
+- closed: the provider is used normally.
+- open: the provider failed repeatedly and is skipped until its cooldown
+  expires. Each reopen doubles the cooldown, up to a maximum.
+- half_open: the cooldown expired; a single probe request is let through.
+  Success closes the breaker, failure opens it again.
+
+Only failures that say the provider is unhealthy count: transport errors,
+timeouts, 5xx and 429 responses (see is_provider_fault). A request the
+provider rejected because of its input (a corrupt upload, a 400) leaves
+the breaker alone.
+
+order() turns the configured providers into an attempt order: healthy
+providers first, fastest first, then half-open probes. Callers claim the
+right to send each request with allow() right before sending it. The
+registry is used from the event loop only and needs no locking.
+"""
+
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Error texts of SDKs that raise plain exceptions for server-side trouble
+FAULT_MARKERS = (
+    "429", "RESOURCE_EXHAUSTED", "500", "502", "503", "504",
+    "INTERNAL", "UNAVAILABLE", "DEADLINE_EXCEEDED", "timed out",
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised when a request is refused because the provider's breaker is open."""
+
+    def __init__(self, name: str):
+        self.name = name
+        super().__init__(f"circuit open for {name}")
+
+
+class ProviderHealth:
+    """Health state of a single provider."""
+
+    def __init__(self, name: str, cooldown_seconds: float):
+        self.name = name
+        self.state = CLOSED
+        self.latency_ewma: Optional[float] = None
+        self.rtf_ewma: Optional[float] = None
+        self.error_rate = 0.0
+        self.samples = 0
+        self.consecutive_failures = 0
+        self.cooldown_seconds = cooldown_seconds
+        self.opened_at: Optional[float] = None
+        self.probe_in_flight = False
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        retry_in = None
+        if self.state == OPEN and self.opened_at is not None:
+            retry_in = max(0.0, round(self.opened_at + self.cooldown_seconds - now, 1))
+        return {
+            "state": self.state,
+            "latency_ewma_seconds": _round(self.latency_ewma),
+            "rtf_ewma": _round(self.rtf_ewma),
+            "error_rate": round(self.error_rate, 4),
+            "samples": self.samples,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_seconds": retry_in,
+        }
+
+
+def is_provider_fault(error: BaseException) -> bool:
+    """Whether error means the provider is unhealthy rather than the request bad."""
+    if isinstance(error, (TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    for attribute in ("code", "status_code"):
+        status = getattr(error, attribute, None)
+        if isinstance(status, int) and (status == 429 or status >= 500):
+            return True
+    return any(marker in str(error) for marker in FAULT_MARKERS)
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 4) if value is not None else None
+
+
+def _ewma(current: Optional[float], sample: float, alpha: float) -> float:
+    return sample if current is None else alpha * sample + (1 - alpha) * current
+
+
+class ProviderHealthRegistry:
+    """Circuit breakers and latency/error tracking for a set of providers."""
+
+    def __init__(
+        self,
+        alpha: float = 0.3,
+        failure_threshold: int = 3,
+        error_rate_threshold: float = 0.5,
+        min_samples: int = 5,
+        cooldown_seconds: float = 60.0,
+        max_cooldown_seconds: float = 900.0,
+        clock=time.monotonic,
+    ):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.min_samples = min_samples
+        self.cooldown_seconds = cooldown_seconds
+        self.max_cooldown_seconds = max_cooldown_seconds
+        self._clock = clock
+        self._providers: Dict[str, ProviderHealth] = {}
+
+    def get(self, name: str) -> ProviderHealth:
+        if name not in self._providers:
+            self._providers[name] = ProviderHealth(name, self.cooldown_seconds)
+        return self._providers[name]
+
+    def _open(self, health: ProviderHealth, reopen: bool) -> None:
+        if reopen:
+            health.cooldown_seconds = min(self.max_cooldown_seconds, health.cooldown_seconds * 2)
+        health.state = OPEN
+        health.opened_at = self._clock()
+        health.probe_in_flight = False
+        print(f"🔌 Circuit opened for {health.name} ({health.cooldown_seconds:.0f}s cooldown)")
+
+    def record_success(
+        self, name: str, latency_seconds: float, audio_seconds: Optional[float] = None
+    ) -> None:
+        health = self.get(name)
+        health.samples += 1
+        health.latency_ewma = _ewma(health.latency_ewma, latency_seconds, self.alpha)
+        if audio_seconds:
+            health.rtf_ewma = _ewma(health.rtf_ewma, latency_seconds / audio_seconds, self.alpha)
+        health.error_rate = _ewma(health.error_rate, 0.0, self.alpha)
+        health.consecutive_failures = 0
+        health.probe_in_flight = False
+        if health.state != CLOSED:
+            print(f"🔌 Circuit closed for {name}")
+        health.state = CLOSED
+        health.cooldown_seconds = self.cooldown_seconds
+
+    def record_failure(self, name: str, error: Optional[BaseException] = None) -> None:
+        """
+        A failed request. When error is given and is not a provider fault
+        (is_provider_fault) it is not counted, and a pending probe is
+        released for the next request.
+        """
+        if error is not None and not is_provider_fault(error):
+            self.record_cancelled(name)
+            return
+        health = self.get(name)
+        health.samples += 1
+        health.error_rate = _ewma(health.error_rate, 1.0, self.alpha)
+        health.consecutive_failures += 1
+
+        if health.state == HALF_OPEN:
+            self._open(health, reopen=True)
+        elif health.state == CLOSED and (
+            health.consecutive_failures >= self.failure_threshold
+            or (health.samples >= self.min_samples and health.error_rate >= self.error_rate_threshold)
+        ):
+            self._open(health, reopen=False)
+
+    def record_cancelled(self, name: str) -> None:
+        """An attempt was abandoned (e.g. lost a hedge): release a pending probe."""
+        self.get(name).probe_in_flight = False
+
+    def _available(self, health: ProviderHealth) -> bool:
+        if health.state == OPEN:
+            if self._clock() - health.opened_at < health.cooldown_seconds:
+                return False
+            health.state = HALF_OPEN
+        return not (health.state == HALF_OPEN and health.probe_in_flight)
+
+    def allow(self, name: str) -> bool:
+        """Whether a request may be sent now; claims the probe slot when half-open."""
+        health = self.get(name)
+        if not self._available(health):
+            return False
+        if health.state == HALF_OPEN:
+            health.probe_in_flight = True
+        return True
+
+    def order(self, names: List[str]) -> List[str]:
+        """
+        Attempt order for the given providers (listed in priority order).
+
+        Open breakers are skipped. Closed providers come first, fastest
+        (lowest real-time factor, else latency) first; providers without
+        history keep their priority after those with it. Half-open probes
+        go last.
+        """
+        closed, probes = [], []
+        for index, name in enumerate(names):
+            health = self.get(name)
+            if not self._available(health):
+                continue
+            if health.state == HALF_OPEN:
+                probes.append(name)
+                continue
+            speed = health.rtf_ewma if health.rtf_ewma is not None else health.latency_ewma
+            closed.append((speed is None, speed or 0.0, index, name))
+
+        return [name for *_, name in sorted(closed)] + probes
+
+    def snapshot(self, names: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        now = self._clock()
+        names = names if names is not None else list(self._providers)
+        return {name: self.get(name).to_dict(now) for name in names}
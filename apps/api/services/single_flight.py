@@ -0,0 +1,66 @@
+"""
+Single-flight coalescing of identical in-flight requests.
+
+When a whole class opens the same video at once, the AI endpoints receive
+the same request dozens of times before the first one finishes and fills
+any cache. SingleFlight.do() runs the first call for a fingerprint and
+lets every identical call that arrives while it is in flight await the
+same result (or exception) instead of starting its own generation.
+
+The underlying call runs as its own task, so a client disconnecting
+(cancelling its request) does not cancel the work the others wait on.
+Coalesced calls are counted in single_flight_requests{kind,role}.
+"""
+
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+from services import metrics
+
+T = TypeVar("T")
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different payloads share a fingerprint."""
+    return " ".join(text.split())
+
+
+def fingerprint(*parts: Any) -> str:
+    """SHA-256 over the request parts (hashed one by one, so large payloads are cheap)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """In-flight calls of one kind (e.g. "checkpoints"), keyed by fingerprint."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._calls: Dict[str, "asyncio.Task[Any]"] = {}
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run fn() once per key at a time; concurrent callers share its outcome."""
+        task = self._calls.get(key)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            metrics.increment("single_flight_requests", kind=self.kind, role="coalesced")
+            return await asyncio.shield(task)
+
+        metrics.increment("single_flight_requests", kind=self.kind, role="leader")
+        task = asyncio.ensure_future(fn())
+        self._calls[key] = task
+
+        def forget(done: "asyncio.Task[Any]") -> None:
+            if self._calls.get(key) is done:
+                del self._calls[key]
+            if not done.cancelled():
+                done.exception()  # mark retrieved when every caller went away
+
+        task.add_done_callback(forget)
+        return await asyncio.shield(task)
@@ -0,0 +1,224 @@
+"""
+Streaming transcription: recognize speech while ffmpeg is still decoding.
+
+PCM from media_pipeline.stream_pcm() is pushed into Google Cloud Speech
+streaming_recognize in 100 ms frames as soon as it is decoded, and every
+final result is handed to the caller as a segment right away, so the first
+segments of a long video arrive within seconds.
+
+A single gRPC stream accepts about five minutes of audio, so the audio is
+sent as consecutive streams of up to STREAM_SECONDS each. A stream is
+ended at a quiet frame near its limit (to avoid cutting a word) and the
+segment times of each stream are offset by the audio sent before it.
+
+The blocking gRPC call runs on the speech executor pool; frames reach it
+through a thread-safe queue and results come back to the event loop with
+call_soon_threadsafe.
+"""
+
+import asyncio
+import os
+import queue
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from services import ai_clients, executors, media_pipeline, metrics, transcription_service
+
+try:
+    from google.cloud import speech
+    GOOGLE_CLOUD_AVAILABLE = True
+except ImportError:
+    GOOGLE_CLOUD_AVAILABLE = False
+
+try:
+    from pydub.utils import audioop
+    PYDUB_AVAILABLE = True
+except ImportError:
+    PYDUB_AVAILABLE = False
+
+BYTES_PER_SECOND = media_pipeline.SAMPLE_RATE * media_pipeline.SAMPLE_WIDTH
+# 100 ms per request, as recommended for streaming recognition
+FRAME_BYTES = BYTES_PER_SECOND // 10
+
+# Audio per gRPC stream (Google closes streams after ~305 s)
+STREAM_SECONDS = float(os.getenv("TRANSCRIPTION_STREAM_SECONDS", "280"))
+# How long before STREAM_SECONDS to start looking for a quiet frame to cut at
+STREAM_CUT_SEARCH_SECONDS = 10.0
+# A frame this many dB below the stream's loudest frame counts as quiet
+QUIET_RELATIVE_DB = 30
+
+_STREAM_DONE = object()
+
+SegmentCallback = Callable[[Dict[str, Any]], None]
+
+
+def is_available() -> bool:
+    """Whether streaming recognition can run (credentials or a local emulator)."""
+    return GOOGLE_CLOUD_AVAILABLE and bool(
+        transcription_service.GOOGLE_APPLICATION_CREDENTIALS or ai_clients.SPEECH_EMULATOR_HOST
+    )
+
+
+def _requests(frames: "queue.Queue[Optional[bytes]]") -> Iterator[Any]:
+    while True:
+        frame = frames.get()
+        if frame is None:
+            return
+        yield speech.StreamingRecognizeRequest(audio_content=frame)
+
+
+def _recognize_stream(frames: "queue.Queue[Optional[bytes]]", emit: SegmentCallback) -> None:
+    """
+    Blocking streaming_recognize call for one stream; runs on the speech
+    pool and emits each final result as a segment (times relative to the
+    start of this stream).
+    """
+    client = ai_clients.get_speech_client()
+    config = speech.StreamingRecognitionConfig(
+        config=transcription_service.google_recognition_config("wav"),
+        interim_results=False,
+    )
+    last_end = 0.0
+    for response in client.streaming_recognize(config=config, requests=_requests(frames)):
+        for result in response.results:
+            if not result.is_final or not result.alternatives:
+                continue
+            alt = result.alternatives[0]
+            if alt.words:
+                start = alt.words[0].start_time.total_seconds()
+                end = alt.words[-1].end_time.total_seconds()
+            else:
+                start, end = last_end, result.result_end_time.total_seconds()
+            last_end = end
+            emit({"start": start, "end": end, "text": alt.transcript.strip()})
+
+
+async def _frames(video_path: str) -> AsyncIterator[bytes]:
+    """Decoded PCM regrouped into FRAME_BYTES frames."""
+    buffer = bytearray()
+    async for block in media_pipeline.stream_pcm(video_path):
+        buffer += block
+        while len(buffer) >= FRAME_BYTES:
+            yield bytes(buffer[:FRAME_BYTES])
+            del buffer[:FRAME_BYTES]
+    if buffer:
+        yield bytes(buffer)
+
+
+async def iter_segments(video_path: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield transcript segments (on the video timeline) while the video is
+    still being decoded.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    first_segment = True
+    frames = _frames(video_path)
+    window_bytes = int(STREAM_SECONDS * BYTES_PER_SECOND)
+    search_bytes = window_bytes - int(STREAM_CUT_SEARCH_SECONDS * BYTES_PER_SECOND)
+    offset = 0.0
+    feeder: Optional[asyncio.Task] = None
+    audio_queue: "queue.Queue[Optional[bytes]]" = queue.Queue()
+
+    async def feed(first_frame: bytes) -> Tuple[int, bool]:
+        """Send one stream's worth of frames; returns (bytes_sent, input_exhausted)."""
+        sent, peak = 0, 0
+        frame = first_frame
+        try:
+            while True:
+                audio_queue.put(frame)
+                sent += len(frame)
+                if sent >= search_bytes:
+                    if sent >= window_bytes or not PYDUB_AVAILABLE:
+                        return sent, False
+                    energy = audioop.rms(frame, media_pipeline.SAMPLE_WIDTH)
+                    if energy < peak * 10 ** (-QUIET_RELATIVE_DB / 20):
+                        return sent, False
+                elif PYDUB_AVAILABLE:
+                    peak = max(peak, audioop.rms(frame, media_pipeline.SAMPLE_WIDTH))
+                try:
+                    frame = await frames.__anext__()
+                except StopAsyncIteration:
+                    return sent, True
+        finally:
+            audio_queue.put(None)
+
+    try:
+        while True:
+            try:
+                first_frame = await frames.__anext__()
+            except StopAsyncIteration:
+                return
+
+            audio_queue = queue.Queue()
+            results: asyncio.Queue = asyncio.Queue()
+
+            def emit(segment: Dict[str, Any], results: asyncio.Queue = results) -> None:
+                loop.call_soon_threadsafe(results.put_nowait, segment)
+
+            recognizer = asyncio.ensure_future(
+                executors.run_blocking("speech", _recognize_stream, audio_queue, emit)
+            )
+            recognizer.add_done_callback(
+                lambda _, results=results: results.put_nowait(_STREAM_DONE)
+            )
+            feeder = asyncio.ensure_future(feed(first_frame))
+
+            while True:
+                segment = await results.get()
+                if segment is _STREAM_DONE:
+                    break
+                if first_segment:
+                    first_segment = False
+                    metrics.observe(
+                        "transcription_stream_first_segment_seconds", time.perf_counter() - started
+                    )
+                yield {
+                    **segment,
+                    "start": round(segment["start"] + offset, 3),
+                    "end": round(segment["end"] + offset, 3),
+                }
+
+            await recognizer
+            sent, exhausted = await feeder
+            offset += sent / BYTES_PER_SECOND
+            if exhausted:
+                return
+    finally:
+        if feeder is not None and not feeder.done():
+            feeder.cancel()
+            await asyncio.gather(feeder, return_exceptions=True)
+        audio_queue.put(None)
+        await frames.aclose()
+
+
+def result_from_segments(segments: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Full transcription result (same shape as transcribe_video) from streamed segments."""
+    return {
+        "transcript": " ".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "duration": segments[-1]["end"] if segments else 0,
+        "language": "pt-BR",
+        "provider": "google_cloud_streaming",
+    }
+
+
+async def transcribe_video_streaming(
+    video_path: str, on_segment: Optional[SegmentCallback] = None
+) -> Dict[str, Any]:
+    """
+    Transcribe a video with streaming recognition, calling on_segment with
+    each segment as it is recognized, and return the full result.
+    """
+    if not is_available():
+        raise Exception("Streaming transcription requires Google Cloud Speech-to-Text")
+
+    print("📡 Streaming transcription with Google Cloud Speech-to-Text...")
+    started = time.perf_counter()
+    segments: List[Dict[str, Any]] = []
+    async for segment in iter_segments(video_path):
+        segments.append(segment)
+        if on_segment:
+            on_segment(segment)
+    metrics.observe("transcription_stream_total_seconds", time.perf_counter() - started)
+    return result_from_segments(segments)
@@ -0,0 +1,173 @@
+"""
+Content-addressed transcript cache.
+
+Transcripts are stored on disk as JSON, keyed by the SHA-256 of the
+uploaded media plus the transcription settings that produced them, so the
+same lecture uploaded again is served without re-running ffmpeg or any
+provider. The store is bounded by size and evicts least-recently-used
+entries (tracked through file mtimes, refreshed on every hit).
+
+File reads and writes run on the "storage" thread pool. The store's size
+is kept as a running total, so writes don't list the directory; it is
+recounted when entries must be evicted and every RESCAN_SECONDS, which
+picks up the entries written by other workers.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from services import executors, metrics
+
+CACHE_ENABLED = os.getenv("TRANSCRIPT_CACHE_ENABLED", "true").lower() == "true"
+CACHE_DIR = Path(
+    os.getenv("TRANSCRIPT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "youedu-transcripts"))
+)
+MAX_CACHE_BYTES = int(os.getenv("TRANSCRIPT_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+# Bump when the stored transcript format changes to invalidate old entries
+CACHE_FORMAT_VERSION = 1
+
+# Recount the store at least this often (other workers share the directory)
+RESCAN_SECONDS = 300.0
+
+_lock = threading.Lock()
+# Running size of the store in _total_dir, as of the last recount plus this process's writes
+_total_bytes = 0
+_total_dir: Optional[Path] = None
+_counted_at = 0.0
+
+
+def make_key(content_hash: str, settings: Dict[str, Any]) -> str:
+    """Combine the media hash and the transcription settings into a cache key."""
+    fingerprint = json.dumps(
+        {"media": content_hash, "settings": settings, "version": CACHE_FORMAT_VERSION},
+        sort_keys=True,
+    )
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
+
+
+def _entry_path(key: str) -> Path:
+    return CACHE_DIR / f"{key}.json"
+
+
+def _read(path: Path) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        result = json.load(f)
+    os.utime(path)  # mark as recently used
+    return result
+
+
+async def get(key: str, media_bytes: int = 0) -> Optional[Dict[str, Any]]:
+    """
+    Return the cached transcript for key, or None on a miss.
+
+    media_bytes is the size of the upload being served, counted as
+    bytes saved when the entry is found.
+    """
+    if not CACHE_ENABLED:
+        return None
+
+    try:
+        result = await executors.run_blocking("storage", _read, _entry_path(key))
+    except (OSError, ValueError):
+        metrics.increment("transcript_cache_misses")
+        return None
+
+    metrics.increment("transcript_cache_hits")
+    metrics.increment("transcript_cache_bytes_saved", media_bytes)
+    return result
+
+
+def _write(key: str, result: Dict[str, Any]) -> None:
+    path = _entry_path(key)
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        "w", dir=CACHE_DIR, suffix=".tmp", delete=False, encoding="utf-8"
+    ) as tmp:
+        json.dump(result, tmp, ensure_ascii=False)
+    size = os.path.getsize(tmp.name)
+    with _lock:
+        try:
+            replaced = path.stat().st_size
+        except OSError:
+            replaced = 0
+        os.replace(tmp.name, path)  # atomic, safe across workers
+        _account(size - replaced)
+
+
+def _account(delta: int) -> None:
+    """Add delta to the running total and evict if the store grew too large."""
+    global _total_bytes
+    if _total_dir != CACHE_DIR or time.monotonic() - _counted_at > RESCAN_SECONDS:
+        _evict()
+        return
+    _total_bytes += delta
+    if _total_bytes > MAX_CACHE_BYTES:
+        _evict()
+    else:
+        metrics.set_gauge("transcript_cache_bytes", _total_bytes)
+
+
+async def put(key: str, result: Dict[str, Any]) -> None:
+    """Store a transcript and evict old entries if the store grew too large."""
+    if not CACHE_ENABLED:
+        return
+
+    try:
+        await executors.run_blocking("storage", _write, key, result)
+    except OSError as e:
+        print(f"[Transcript Cache] Failed to store entry: {e}")
+
+
+def _entries() -> List[Tuple[float, int, Path]]:
+    entries = []
+    for path in CACHE_DIR.glob("*.json"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+
+def _evict() -> None:
+    """Recount the store and delete least-recently-used entries until it fits MAX_CACHE_BYTES."""
+    global _total_bytes, _total_dir, _counted_at
+    entries = _entries()
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= MAX_CACHE_BYTES:
+            break
+        try:
+            path.unlink()
+            total -= size
+            metrics.increment("transcript_cache_evictions")
+        except OSError:
+            continue
+
+    _total_bytes, _total_dir, _counted_at = total, CACHE_DIR, time.monotonic()
+    metrics.set_gauge("transcript_cache_bytes", total)
+
+
+async def stats() -> Dict[str, Any]:
+    """Summary of the store plus hit/miss counters; the directory is listed on the storage pool."""
+    entries = await executors.run_blocking("storage", _entries)
+
+    hits = metrics.get_counter("transcript_cache_hits")
+    misses = metrics.get_counter("transcript_cache_misses")
+    return {
+        "enabled": CACHE_ENABLED,
+        "entries": len(entries),
+        "size_bytes": sum(size for _, size, _ in entries),
+        "max_bytes": MAX_CACHE_BYTES,
+        "hits": int(hits),
+        "misses": int(misses),
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        "bytes_saved": int(metrics.get_counter("transcript_cache_bytes_saved")),
+    }
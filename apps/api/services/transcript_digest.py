@@ -0,0 +1,236 @@
+"""
+Hierarchical transcript digests.
+
+Quizzes and checkpoints used to send the raw lecture transcript to Gemini
+separately, each cut down to its own budget (so long lectures lost their
+end). A digest is built once per transcript instead, map-reduce style:
+
+- map: the transcript is cut into CHUNK_TOKENS chunks, summarized in
+  parallel (one call per chunk);
+- reduce: the chunk summaries are summarized REDUCE_FAN_IN at a time,
+  level by level, into one top-level overview with its key points.
+
+Generators then prompt from the digest (the whole lecture, in a few hundred
+tokens) plus short raw excerpts sampled with prompt_budget.fit_text.
+
+Digests are keyed by the SHA-256 of the normalized transcript: kept in
+this process, stored in the persistent LLM cache for the other workers,
+and built once when several generators ask for the same transcript at the
+same time. The per-chunk summary calls also read through the LLM cache.
+Transcripts shorter than MIN_TOKENS are not worth digesting; get_digest()
+returns None for them (and on failure), and callers use the raw text.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Sequence
+
+from google.genai import types
+
+from schemas.digest import TranscriptSummary
+from services import llm_cache, llm_gateway, prompt_budget, single_flight
+
+DIGEST_ENABLED = os.getenv("TRANSCRIPT_DIGEST_ENABLED", "true").lower() == "true"
+# Transcripts below this size are used raw
+MIN_TOKENS = int(os.getenv("TRANSCRIPT_DIGEST_MIN_TOKENS", "3000"))
+CHUNK_TOKENS = int(os.getenv("TRANSCRIPT_DIGEST_CHUNK_TOKENS", "4000"))
+# Summaries combined per reduce call
+REDUCE_FAN_IN = 8
+SUMMARY_OUTPUT_TOKENS = 768
+
+# Bump when the digest prompts change (invalidates cached digests)
+DIGEST_PROMPT_VERSION = "1"
+
+# Digests kept in this process
+MAX_DIGESTS = 64
+
+CHUNK_PROMPT = """
+Você está resumindo a parte {part} de {parts} da transcrição de uma aula.
+
+Escreva um resumo fiel e denso desta parte, em português, com os conceitos,
+definições, exemplos e trechos de código mencionados (sem inventar nada).
+Liste também os pontos-chave, um por item.
+
+Retorne JSON com "summary" e "key_points".
+"""
+
+REDUCE_PROMPT = """
+Abaixo estão resumos consecutivos de partes de uma aula, em ordem.
+
+Combine-os em um único resumo fiel que cubra a aula inteira, do início ao
+fim, preservando a ordem dos assuntos. Liste os pontos-chave da aula, um
+por item.
+
+Retorne JSON com "summary" e "key_points".
+"""
+
+
+class TranscriptDigest(NamedTuple):
+    """Map-reduce digest of one transcript."""
+    content_hash: str
+    overview: str
+    key_points: List[str]
+    # Summary of each chunk, in order, and where each chunk ends (fraction of the words)
+    chunk_summaries: List[str]
+    chunk_ends: List[float]
+
+    def text(self) -> str:
+        """The overview and key points, ready for a prompt."""
+        points = "\n".join(f"- {point}" for point in self.key_points)
+        return f"{self.overview}\n\nPontos-chave:\n{points}" if points else self.overview
+
+    def section(self, start: float, end: float) -> str:
+        """Summaries of the chunks overlapping [start, end) of the transcript."""
+        starts = [0.0, *self.chunk_ends][:len(self.chunk_ends)]
+        chunks = zip(self.chunk_summaries, starts, self.chunk_ends, strict=True)
+        return "\n\n".join(
+            summary for summary, chunk_start, chunk_end in chunks
+            if chunk_start < end and chunk_end > start
+        )
+
+
+_digests: "OrderedDict[str, TranscriptDigest]" = OrderedDict()
+_flights = single_flight.SingleFlight("digest")
+
+
+def content_hash(transcript: str) -> str:
+    return hashlib.sha256(single_flight.normalize_text(transcript).encode("utf-8")).hexdigest()
+
+
+def _cache_key(transcript_hash: str) -> str:
+    return single_flight.fingerprint("transcript-digest", DIGEST_PROMPT_VERSION, transcript_hash)
+
+
+def split_into_chunks(transcript: str) -> List[str]:
+    """Cut the transcript into word-aligned chunks of about CHUNK_TOKENS."""
+    words = transcript.split()
+    count = max(1, math.ceil(prompt_budget.count_tokens(" ".join(words)) / CHUNK_TOKENS))
+    bounds = [round(i * len(words) / count) for i in range(count + 1)]
+    return [" ".join(words[bounds[i]:bounds[i + 1]]) for i in range(count)]
+
+
+async def _summarize(prompt: str, text: str, purpose: str) -> TranscriptSummary:
+    contents = [
+        types.Content(
+            role="user",
+            parts=[types.Part.from_text(text=f'{prompt}\n"""\n{text}\n"""')]
+        )
+    ]
+    config = types.GenerateContentConfig(
+        temperature=0.2,
+        max_output_tokens=SUMMARY_OUTPUT_TOKENS,
+        response_mime_type="application/json",
+        response_schema=TranscriptSummary,
+    )
+    data = await llm_gateway.generate_json(
+        contents, config, purpose=purpose, cache_version=DIGEST_PROMPT_VERSION
+    )
+    return TranscriptSummary.model_validate(data)
+
+
+async def _reduce(summaries: Sequence[str]) -> TranscriptSummary:
+    """Summarize summaries REDUCE_FAN_IN at a time until one remains."""
+    level = list(summaries)
+    while True:
+        groups = [level[i:i + REDUCE_FAN_IN] for i in range(0, len(level), REDUCE_FAN_IN)]
+        reduced = await asyncio.gather(
+            *(_summarize(REDUCE_PROMPT, "\n\n".join(group), "digest_reduce") for group in groups)
+        )
+        if len(reduced) == 1:
+            return reduced[0]
+        level = [summary.summary for summary in reduced]
+
+
+async def build_digest(transcript: str) -> TranscriptDigest:
+    """Summarize the transcript's chunks in parallel and reduce them to one digest."""
+    chunks = split_into_chunks(transcript)
+    print(f"[Digest] Summarizing {len(chunks)} transcript chunks")
+    summaries = await asyncio.gather(
+        *(
+            _summarize(CHUNK_PROMPT.format(part=i + 1, parts=len(chunks)), chunk, "digest_map")
+            for i, chunk in enumerate(chunks)
+        )
+    )
+    chunk_summaries = [summary.summary for summary in summaries]
+    if len(summaries) == 1:
+        top = summaries[0]
+    else:
+        top = await _reduce(chunk_summaries)
+
+    total_words = sum(len(chunk.split()) for chunk in chunks) or 1
+    ends, words = [], 0
+    for chunk in chunks:
+        words += len(chunk.split())
+        ends.append(words / total_words)
+    return TranscriptDigest(
+        content_hash=content_hash(transcript),
+        overview=top.summary,
+        key_points=top.key_points,
+        chunk_summaries=chunk_summaries,
+        chunk_ends=ends,
+    )
+
+
+def _remember(digest: TranscriptDigest) -> None:
+    _digests[digest.content_hash] = digest
+    _digests.move_to_end(digest.content_hash)
+    while len(_digests) > MAX_DIGESTS:
+        _digests.popitem(last=False)
+
+
+async def _load(transcript_hash: str) -> Optional[TranscriptDigest]:
+    if transcript_hash in _digests:
+        _digests.move_to_end(transcript_hash)
+        return _digests[transcript_hash]
+    stored = await llm_cache.get(_cache_key(transcript_hash), purpose="digest")
+    if stored is None:
+        return None
+    try:
+        digest = TranscriptDigest(**json.loads(stored))
+    except (TypeError, ValueError) as e:
+        print(f"[Digest] Ignoring unreadable cached digest: {e}")
+        return None
+    _remember(digest)
+    return digest
+
+
+async def cached_digest(transcript: str) -> Optional[TranscriptDigest]:
+    """The digest of transcript if one was already built, without building it."""
+    if not DIGEST_ENABLED or prompt_budget.count_tokens(transcript) < MIN_TOKENS:
+        return None
+    return await _load(content_hash(transcript))
+
+
+async def get_digest(transcript: str) -> Optional[TranscriptDigest]:
+    """
+    The digest of transcript (cached, or built now), or None when the
+    transcript is short enough to use raw or the digest could not be built.
+    """
+    if not DIGEST_ENABLED or prompt_budget.count_tokens(transcript) < MIN_TOKENS:
+        return None
+
+    transcript_hash = content_hash(transcript)
+    digest = await _load(transcript_hash)
+    if digest is not None:
+        return digest
+
+    async def build() -> TranscriptDigest:
+        digest = await build_digest(transcript)
+        _remember(digest)
+        await llm_cache.put(_cache_key(transcript_hash), json.dumps(digest._asdict()), purpose="digest")
+        return digest
+
+    try:
+        return await _flights.do(transcript_hash, build)
+    except Exception as e:
+        print(f"[Digest] Could not build digest, using the raw transcript: {e}")
+        return None
+
+
+def reset() -> None:
+    """Forget the digests kept in this process (used by tests)."""
+    _digests.clear()
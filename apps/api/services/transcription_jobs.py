@@ -0,0 +1,405 @@
+"""
+Asynchronous transcription jobs.
+
+POST /api/transcription/jobs stores the upload and returns a job id right
+away; a bounded pool of asyncio workers runs the transcription and
+reports progress through these stages:
+
+    upload_received -> audio_extracted -> chunk_transcribed (per chunk) -> done
+
+(or ``failed``). Job state lives in a local SQLite database next to the
+stored uploads, so queued and interrupted jobs are picked up again after a
+worker restart; its queries run on the "storage" thread pool. Submitting
+media that already has a queued, running or finished job (same content
+hash and transcription settings) attaches to that job instead of starting
+a new one. Finished jobs are deleted JOB_TTL_SECONDS after they end.
+"""
+
+import asyncio
+import contextlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from services import executors, metrics, transcript_cache, transcription_service
+from services.transcription_service import StoredUpload
+
+T = TypeVar("T")
+
+JOBS_DIR = Path(
+    os.getenv("TRANSCRIPTION_JOBS_DIR", os.path.join(tempfile.gettempdir(), "youedu-jobs"))
+)
+JOB_WORKERS = int(os.getenv("TRANSCRIPTION_JOB_WORKERS", "2"))
+# How long done and failed jobs stay queryable (re-submitting the media
+# afterwards is still served by the transcript cache)
+JOB_TTL_SECONDS = float(os.getenv("TRANSCRIPTION_JOB_TTL_HOURS", "24")) * 3600
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+TERMINAL_STATES = (DONE, FAILED)
+
+# Overall progress reported when each stage is reached
+STAGE_PROGRESS = {
+    "upload_received": 0.05,
+    "audio_extracted": 0.2,
+    "done": 1.0,
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    media_key TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    video_path TEXT,
+    status TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    progress REAL NOT NULL,
+    detail TEXT,
+    result TEXT,
+    error TEXT,
+    worker_pid INTEGER,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_media_key ON jobs (media_key);
+CREATE INDEX IF NOT EXISTS jobs_status_updated ON jobs (status, updated_at);
+"""
+
+
+class JobStore:
+    """
+    SQLite-backed job state, shared by every worker process on the host.
+    Its methods block; the manager calls them on the storage pool.
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def _row_to_job(self, row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["detail"] = json.loads(job["detail"]) if job["detail"] else {}
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def create(self, job_id: str, media_key: str, upload: StoredUpload, video_path: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, media_key, content_hash, size_bytes, video_path, status,"
+                " stage, progress, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, media_key, upload.sha256, upload.size_bytes, video_path, QUEUED,
+                 "upload_received", STAGE_PROGRESS["upload_received"], now, now),
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row)
+
+    def find_reusable(self, media_key: str) -> Optional[Dict[str, Any]]:
+        """Most recent non-failed job for the same media and settings."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE media_key = ? AND status != ?"
+                " ORDER BY created_at DESC LIMIT 1",
+                (media_key, FAILED),
+            ).fetchone()
+        return self._row_to_job(row)
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        for key in ("detail", "result"):
+            if key in fields and fields[key] is not None:
+                fields[key] = json.dumps(fields[key], ensure_ascii=False)
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{key} = ?" for key in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id)
+            )
+
+    def claim(self, job_id: str) -> bool:
+        """Atomically move a queued job to running for this process."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, worker_pid = ?, updated_at = ?"
+                " WHERE id = ? AND status = ?",
+                (RUNNING, os.getpid(), time.time(), job_id, QUEUED),
+            )
+        return cursor.rowcount == 1
+
+    def recoverable(self) -> List[str]:
+        """
+        Ids of queued jobs plus running jobs whose worker process is gone,
+        which are reset to queued.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, status, worker_pid FROM jobs WHERE status IN (?, ?)"
+                " ORDER BY created_at",
+                (QUEUED, RUNNING),
+            ).fetchall()
+
+        job_ids = []
+        for row in rows:
+            if row["status"] == RUNNING:
+                if _process_alive(row["worker_pid"]):
+                    continue
+                self.update(row["id"], status=QUEUED)
+            job_ids.append(row["id"])
+        return job_ids
+
+    def prune(self, max_age_seconds: float) -> int:
+        """Delete done and failed jobs that ended more than max_age_seconds ago."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (*TERMINAL_STATES, time.time() - max_age_seconds),
+            )
+        return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _process_alive(pid: Optional[int]) -> bool:
+    if not pid or pid == os.getpid():
+        return False  # our own pid means a previous run of this process
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def public_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Job fields returned by the API."""
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "progress": round(job["progress"], 3),
+        "detail": job["detail"],
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+
+
+class TranscriptionJobManager:
+    """Queues jobs, runs them on a bounded worker pool and publishes progress."""
+
+    def __init__(
+        self,
+        jobs_dir: Path = JOBS_DIR,
+        workers: int = JOB_WORKERS,
+        ttl_seconds: float = JOB_TTL_SECONDS,
+    ):
+        self.jobs_dir = jobs_dir
+        self.workers = workers
+        self.ttl_seconds = ttl_seconds
+        self.store: Optional[JobStore] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._updates: Dict[str, asyncio.Event] = {}
+        # Latest store write per job; each write waits for the one before it
+        self._writes: Dict[str, asyncio.Task] = {}
+
+    async def _call(self, method: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run a JobStore method on the storage pool."""
+        return await executors.run_blocking("storage", method, *args, **kwargs)
+
+    async def start(self) -> None:
+        """Open the store, start the workers, prune old jobs and re-queue unfinished ones."""
+        if self.store is not None:
+            return
+        store = await executors.run_blocking("storage", JobStore, self.jobs_dir / "jobs.sqlite3")
+        if self.store is not None:
+            store.close()  # another caller opened it while this one waited
+            return
+        self.store = store
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+        await self._prune()
+        recovered = await self._call(self.store.recoverable)
+        for job_id in recovered:
+            self._queue.put_nowait(job_id)
+        if recovered:
+            print(f"♻️ Re-queued {len(recovered)} transcription job(s) after restart")
+        self._publish_depth()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._writes.values(), return_exceptions=True)
+        self._tasks = []
+        if self.store:
+            self.store.close()
+            self.store = None
+
+    async def _prune(self) -> None:
+        pruned = await self._call(self.store.prune, self.ttl_seconds)
+        if pruned:
+            metrics.increment("transcription_jobs_pruned", pruned)
+
+    def _publish_depth(self) -> None:
+        metrics.set_gauge("transcription_jobs_queued", self._queue.qsize() if self._queue else 0)
+
+    async def submit(self, upload: StoredUpload, filename: str = "") -> Tuple[Dict[str, Any], bool]:
+        """
+        Register a job for an upload already on disk.
+
+        Returns (job, created). When the same media already has a job, the
+        new upload is discarded and the existing job is returned.
+        """
+        await self.start()
+        media_key = transcript_cache.make_key(
+            upload.sha256, transcription_service.transcription_settings()
+        )
+
+        existing = await self._call(self.store.find_reusable, media_key)
+        if existing is not None:
+            os.unlink(upload.path)
+            metrics.increment("transcription_jobs_deduplicated")
+            return existing, False
+
+        job_id = uuid.uuid4().hex
+        suffix = Path(filename).suffix or Path(upload.path).suffix or ".mp4"
+        video_path = str(self.jobs_dir / f"{job_id}{suffix}")
+        await executors.run_blocking("storage", shutil.move, upload.path, video_path)
+
+        await self._call(self.store.create, job_id, media_key, upload, video_path)
+        metrics.increment("transcription_jobs_submitted")
+        self._queue.put_nowait(job_id)
+        self._publish_depth()
+        return await self._call(self.store.get, job_id), True
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self._call(self.store.get, job_id) if self.store else None
+
+    def _notify(self, job_id: str) -> None:
+        event = self._updates.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    def _update(self, job_id: str, **fields: Any) -> asyncio.Task:
+        """
+        Write job fields after the job's earlier writes, then wake its
+        followers. Returns the write, which the caller may await.
+        """
+        previous = self._writes.get(job_id)
+
+        async def write() -> None:
+            if previous is not None:
+                await asyncio.wait([previous])
+            await self._call(self.store.update, job_id, **fields)
+            self._notify(job_id)
+
+        def done(task: asyncio.Task) -> None:
+            if self._writes.get(job_id) is task:
+                del self._writes[job_id]
+            if not task.cancelled() and task.exception() is not None:
+                print(f"❌ Failed to save transcription job {job_id}: {task.exception()}")
+
+        task = asyncio.ensure_future(write())
+        self._writes[job_id] = task
+        task.add_done_callback(done)
+        return task
+
+    def _progress(self, job_id: str, stage: str, detail: Dict[str, Any]) -> None:
+        progress = STAGE_PROGRESS.get(stage)
+        if stage == "chunk_transcribed" and detail.get("total"):
+            low, high = STAGE_PROGRESS["audio_extracted"], STAGE_PROGRESS["done"]
+            progress = low + (high - low) * 0.95 * detail["completed"] / detail["total"]
+        fields: Dict[str, Any] = {"stage": stage, "detail": detail}
+        if progress is not None:
+            fields["progress"] = progress
+        # Called synchronously from the pipeline: the write goes to the
+        # storage pool in the background, queued behind the job's earlier ones
+        self._update(job_id, **fields)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            self._publish_depth()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                print(f"❌ Transcription job {job_id} crashed: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        if not await self._call(self.store.claim, job_id):
+            return  # already taken by another worker process
+        job = await self._call(self.store.get, job_id)
+        print(f"🎬 Running transcription job {job_id}")
+        self._notify(job_id)
+
+        try:
+            result = await transcription_service.transcribe_video(
+                job["video_path"],
+                content_hash=job["content_hash"],
+                size_bytes=job["size_bytes"],
+                on_progress=lambda stage, detail: self._progress(job_id, stage, detail),
+            )
+        except Exception as e:
+            await self._update(job_id, status=FAILED, stage="failed", error=str(e)[:500])
+            metrics.increment("transcription_jobs_failed")
+        else:
+            await self._update(
+                job_id, status=DONE, stage="done", progress=1.0, result=result, detail={}
+            )
+            metrics.increment("transcription_jobs_completed")
+        # Only a finished job gives up its upload: when cancelled (shutdown),
+        # the job stays running with its video and is re-queued on restart
+        if job["video_path"] and os.path.exists(job["video_path"]):
+            os.unlink(job["video_path"])
+        await self._update(job_id, video_path=None)
+        await self._prune()
+
+    async def events(self, job_id: str, poll_seconds: float = 1.0) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield the job state whenever it changes, ending after a terminal state.
+
+        Local updates wake the stream immediately; the store is also polled
+        so jobs run by another worker process are followed too.
+        """
+        last_seen = None
+        while True:
+            job = await self.get(job_id)
+            if job is None:
+                return
+            if job["updated_at"] != last_seen:
+                last_seen = job["updated_at"]
+                yield public_view(job)
+            if job["status"] in TERMINAL_STATES:
+                return
+
+            event = self._updates.setdefault(job_id, asyncio.Event())
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(event.wait(), timeout=poll_seconds)
+
+
+job_manager = TranscriptionJobManager()
@@ -7,14 +7,22 @@ Real transcription service using:
 No mocks - real transcription only.
 """
 
+import io
 import os
-import subprocess
 import tempfile
-import json
 import asyncio
-from typing import Dict, Any, Optional, List
+import hashlib
+import time
+from typing import Awaitable, Callable, Dict, Any, Optional, List, NamedTuple, Tuple
 from pathlib import Path
 
+from fastapi import UploadFile
+
+from schemas.quiz import CodingExercise, GeneratedQuiz, QuizQuestion
+from services import ai_clients, audio_segmentation, context_cache, executors, hedging, llm_gateway, llm_json, local_asr, media_pipeline, metrics, prompt_budget, transcript_cache, transcript_digest
+from services.media_pipeline import ExtractedAudio
+from services.provider_health import CircuitOpenError, ProviderHealthRegistry
+
 # Google Cloud Speech
 try:
     from google.cloud import speech
@@ -30,7 +38,6 @@ except ImportError:
     ASSEMBLYAI_AVAILABLE = False
 
 # Google Gemini (tertiary)
-from google import genai
 from google.genai import types
 
 # Environment variables
@@ -38,13 +45,97 @@ GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 ASSEMBLYAI_API_KEY = os.getenv("ASSEMBLYAI_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-# Gemini model fallback order
-GEMINI_MODELS = [
-    "gemini-2.0-flash",
-    "gemini-2.5-flash-lite", 
-    "gemini-2.0-flash-lite",
-    "gemini-2.5-flash",
-]
+# Upload ingest settings
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MiB per read/write
+MAX_UPLOAD_BYTES = int(os.getenv("TRANSCRIPTION_MAX_UPLOAD_MB", "2048")) * 1024 * 1024
+
+# Chunked transcription: long audio is split at pauses and the chunks are
+# transcribed concurrently ("auto" enables it above the minimum duration)
+CHUNKING_MODE = os.getenv("TRANSCRIPTION_CHUNKING", "auto").lower()
+CHUNK_SECONDS = float(os.getenv("TRANSCRIPTION_CHUNK_MINUTES", "5")) * 60
+CHUNKING_MIN_SECONDS = float(os.getenv("TRANSCRIPTION_CHUNKING_MIN_MINUTES", "8")) * 60
+CHUNK_CONCURRENCY = int(os.getenv("TRANSCRIPTION_CHUNK_CONCURRENCY", "4"))
+
+# Provider execution policy: sequential | hedged | race (see services/hedging.py)
+PROVIDER_POLICY = os.getenv("TRANSCRIPTION_PROVIDER_POLICY", "sequential").lower()
+# Hedge delay used until a provider has latency history, and its lower bound
+HEDGE_DELAY_SECONDS = float(os.getenv("TRANSCRIPTION_HEDGE_DELAY_SECONDS", "60"))
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv("TRANSCRIPTION_HEDGE_MIN_DELAY_SECONDS", "5"))
+
+# Provider order and display names. The local CPU tier goes first or last
+# depending on TRANSCRIPTION_LOCAL_ASR (see services/local_asr.py).
+PROVIDER_ORDER = ["google_cloud", "assemblyai", "gemini"]
+if local_asr.MODE == "primary":
+    PROVIDER_ORDER.insert(0, "local")
+elif local_asr.MODE == "fallback":
+    PROVIDER_ORDER.append("local")
+PROVIDER_LABELS = {
+    "google_cloud": "Google Cloud",
+    "assemblyai": "AssemblyAI",
+    "gemini": "Gemini",
+    "local": "Local ASR",
+}
+
+# Audio encoding uploaded to each provider: lossless FLAC (or LINEAR16 WAV)
+# for Google Cloud, a compressed encoding (opus or mp3) for the hosted APIs.
+# Every format needed is produced in the same ffmpeg pass as the WAV.
+GOOGLE_AUDIO_FORMAT = os.getenv("TRANSCRIPTION_GOOGLE_AUDIO_FORMAT", "flac").lower()
+HOSTED_AUDIO_FORMAT = os.getenv("TRANSCRIPTION_HOSTED_AUDIO_FORMAT", "opus").lower()
+PROVIDER_AUDIO_FORMATS = {
+    "google_cloud": GOOGLE_AUDIO_FORMAT,
+    "assemblyai": HOSTED_AUDIO_FORMAT,
+    "gemini": HOSTED_AUDIO_FORMAT,
+    "local": "wav",
+}
+
+# Transcription profiles: "accurate" (the default) favours quality, "fast"
+# is a cheaper, quicker preview pass. Each maps to provider settings plus
+# the pipeline's sample rate, silence trimming and chunking.
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "accurate": {
+        "google_model": "latest_long",
+        "alternative_languages": ["en-US", "es-ES"],
+        "punctuation": True,
+        "assemblyai_model": "best",
+        "sample_rate": 16000,
+        "trim_silence": audio_segmentation.TRIM_ENABLED,
+        "chunking": CHUNKING_MODE,
+    },
+    "fast": {
+        "google_model": "default",
+        "alternative_languages": [],
+        "punctuation": False,
+        "assemblyai_model": "nano",
+        "sample_rate": 8000,
+        "trim_silence": True,
+        "chunking": "always",
+    },
+}
+DEFAULT_PROFILE = "accurate"
+
+# Circuit breaker and latency tracking shared by every transcription request
+provider_health = ProviderHealthRegistry(
+    failure_threshold=int(os.getenv("TRANSCRIPTION_BREAKER_FAILURES", "3")),
+    cooldown_seconds=float(os.getenv("TRANSCRIPTION_BREAKER_COOLDOWN_SECONDS", "60")),
+)
+
+class UploadTooLargeError(Exception):
+    """Raised when an uploaded file exceeds MAX_UPLOAD_BYTES."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        super().__init__(f"Upload exceeds the {max_bytes // (1024 * 1024)} MB limit")
+
+
+class StoredUpload(NamedTuple):
+    """An upload written to disk, with the content hash computed while streaming."""
+    path: str
+    sha256: str
+    size_bytes: int
+
+
+# Progress callback: on_progress(stage, detail)
+ProgressCallback = Callable[[str, Dict[str, Any]], None]
 
 
 class TranscriptSegment:
@@ -57,46 +148,63 @@ class TranscriptSegment:
         return {"start": float(self.start), "end": float(self.end), "text": self.text}
 
 
-def extract_audio_from_video(video_path: str, output_format: str = "wav") -> Optional[str]:
-    """Extract audio from video using FFmpeg, optimized for speech recognition."""
-    try:
-        suffix = f".{output_format}"
-        temp_audio = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
-        temp_audio.close()
-        audio_path = temp_audio.name
-        
-        # Settings optimized for speech recognition
-        if output_format == "wav":
-            cmd = [
-                "ffmpeg", "-y", "-i", video_path,
-                "-vn", "-acodec", "pcm_s16le",
-                "-ac", "1", "-ar", "16000",
-                audio_path
-            ]
-        else:  # mp3 for AssemblyAI
-            cmd = [
-                "ffmpeg", "-y", "-i", video_path,
-                "-vn", "-acodec", "libmp3lame",
-                "-ac", "1", "-ar", "16000", "-q:a", "4",
-                audio_path
-            ]
-        
-        subprocess.run(cmd, check=True, capture_output=True)
-        return audio_path
-        
-    except subprocess.CalledProcessError as e:
-        error_msg = e.stderr.decode()
-        print(f"FFmpeg error: {error_msg}")
-        if "Output file does not contain any stream" in error_msg:
-            return None
-        raise Exception(f"Failed to extract audio: {error_msg}")
+async def _provider_audio(audio: ExtractedAudio, provider: str) -> Tuple[bytes, str]:
+    """
+    The audio in the provider's preferred encoding, as (data, format).
+
+    Encodings are kept on the ExtractedAudio's disk, so fallbacks and
+    hedged attempts reuse them; only this request holds the bytes.
+    Payload size is recorded per provider.
+    """
+    fmt = PROVIDER_AUDIO_FORMATS[provider]
+    data = await audio.get(fmt)
+    metrics.increment("transcription_payload_bytes", len(data), provider=provider, format=fmt)
+    if data:
+        metrics.set_gauge(
+            "transcription_payload_compression", audio.size("wav") / len(data), provider=provider
+        )
+    return data, fmt
 
 
 # ============================================================================
 # GOOGLE CLOUD SPEECH-TO-TEXT (PRIMARY)
 # ============================================================================
 
-async def transcribe_with_google_cloud(audio_path: str) -> Dict[str, Any]:
+def google_recognition_config(
+    fmt: str = "wav", profile: str = DEFAULT_PROFILE, sample_rate: int = 16000
+):
+    """Recognition settings shared by batch and streaming Google Cloud requests."""
+    settings = PROFILES[profile]
+    encoding = speech.RecognitionConfig.AudioEncoding
+    return speech.RecognitionConfig(
+        encoding=encoding.FLAC if fmt == "flac" else encoding.LINEAR16,
+        sample_rate_hertz=sample_rate,
+        language_code="pt-BR",
+        alternative_language_codes=settings["alternative_languages"],
+        enable_word_time_offsets=True,
+        enable_automatic_punctuation=settings["punctuation"],
+        model=settings["google_model"],
+    )
+
+
+def _recognize_with_google_cloud(
+    content: bytes, fmt: str = "wav", profile: str = DEFAULT_PROFILE, sample_rate: int = 16000
+):
+    """Blocking Google Cloud recognition; runs on the speech executor pool."""
+    client = ai_clients.get_speech_client()
+    
+    audio = speech.RecognitionAudio(content=content)
+    config = google_recognition_config(fmt, profile, sample_rate)
+    
+    # Use async long-running recognition for longer audio
+    operation = client.long_running_recognize(config=config, audio=audio)
+    print("Waiting for Google Cloud operation to complete...")
+    return operation.result(timeout=300)
+
+
+async def transcribe_with_google_cloud(
+    audio: ExtractedAudio, profile: str = DEFAULT_PROFILE
+) -> Dict[str, Any]:
     """
     Transcribe audio using Google Cloud Speech-to-Text.
     Requires GOOGLE_APPLICATION_CREDENTIALS environment variable.
@@ -109,28 +217,11 @@ async def transcribe_with_google_cloud(audio_path: str) -> Dict[str, Any]:
     
     print("📢 Transcribing with Google Cloud Speech-to-Text...")
     
-    client = speech.SpeechClient()
-    
-    with open(audio_path, "rb") as audio_file:
-        content = audio_file.read()
-    
-    audio = speech.RecognitionAudio(content=content)
-    
-    config = speech.RecognitionConfig(
-        encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
-        sample_rate_hertz=16000,
-        language_code="pt-BR",
-        alternative_language_codes=["en-US", "es-ES"],
-        enable_word_time_offsets=True,
-        enable_automatic_punctuation=True,
-        model="latest_long",
+    content, fmt = await _provider_audio(audio, "google_cloud")
+    response = await executors.run_blocking(
+        "speech", _recognize_with_google_cloud, content, fmt, profile, audio.sample_rate
     )
     
-    # Use async long-running recognition for longer audio
-    operation = client.long_running_recognize(config=config, audio=audio)
-    print("Waiting for Google Cloud operation to complete...")
-    response = operation.result(timeout=300)
-    
     segments = []
     full_transcript = []
     
@@ -165,7 +256,9 @@ async def transcribe_with_google_cloud(audio_path: str) -> Dict[str, Any]:
 # ASSEMBLYAI (SECONDARY FALLBACK)
 # ============================================================================
 
-async def transcribe_with_assemblyai(audio_path: str) -> Dict[str, Any]:
+async def transcribe_with_assemblyai(
+    audio: ExtractedAudio, profile: str = DEFAULT_PROFILE
+) -> Dict[str, Any]:
     """
     Transcribe audio using AssemblyAI.
     Requires ASSEMBLYAI_API_KEY environment variable.
@@ -180,14 +273,20 @@ async def transcribe_with_assemblyai(audio_path: str) -> Dict[str, Any]:
     
     aai.settings.api_key = ASSEMBLYAI_API_KEY
     
+    settings = PROFILES[profile]
     config = aai.TranscriptionConfig(
         language_code="pt",
-        punctuate=True,
-        format_text=True,
+        punctuate=settings["punctuation"],
+        format_text=settings["punctuation"],
+        speech_model=aai.SpeechModel(settings["assemblyai_model"]),
     )
     
+    audio_data, _ = await _provider_audio(audio, "assemblyai")
+    
     transcriber = aai.Transcriber()
-    transcript = transcriber.transcribe(audio_path, config=config)
+    transcript = await executors.run_blocking(
+        "speech", transcriber.transcribe, io.BytesIO(audio_data), config=config
+    )
     
     if transcript.status == aai.TranscriptStatus.error:
         raise Exception(f"AssemblyAI error: {transcript.error}")
@@ -236,43 +335,16 @@ async def transcribe_with_assemblyai(audio_path: str) -> Dict[str, Any]:
 # GEMINI (TERTIARY FALLBACK)
 # ============================================================================
 
-def _call_gemini_with_fallback(client: genai.Client, contents: list, config: types.GenerateContentConfig) -> str:
-    """Try multiple Gemini models with fallback on quota errors."""
-    last_error = None
-    
-    for model in GEMINI_MODELS:
-        try:
-            print(f"Trying Gemini model: {model}")
-            response = client.models.generate_content(
-                model=model,
-                contents=contents,
-                config=config
-            )
-            if response.text:
-                print(f"Success with model: {model}")
-                return response.text
-        except Exception as e:
-            error_str = str(e)
-            print(f"Model {model} failed: {error_str[:100]}")
-            if "429" in error_str or "RESOURCE_EXHAUSTED" in error_str or "404" in error_str:
-                last_error = e
-                continue
-            raise e
-    
-    raise Exception(f"All Gemini models failed. Last error: {last_error}")
-
-
-async def transcribe_with_gemini(audio_path: str) -> Dict[str, Any]:
+async def transcribe_with_gemini(
+    audio: ExtractedAudio, profile: str = DEFAULT_PROFILE
+) -> Dict[str, Any]:
     """Transcribe audio using Gemini (tertiary fallback)."""
     if not GEMINI_API_KEY:
         raise Exception("GEMINI_API_KEY not set")
     
     print("📢 Transcribing with Gemini AI...")
     
-    client = genai.Client(api_key=GEMINI_API_KEY)
-    
-    with open(audio_path, "rb") as f:
-        audio_data = f.read()
+    audio_data, fmt = await _provider_audio(audio, "gemini")
     
     prompt = """
     Transcreva o áudio a seguir com precisão.
@@ -290,7 +362,7 @@ async def transcribe_with_gemini(audio_path: str) -> Dict[str, Any]:
         types.Content(
             role="user",
             parts=[
-                types.Part.from_bytes(data=audio_data, mime_type="audio/mp3"),
+                types.Part.from_bytes(data=audio_data, mime_type=media_pipeline.MIME_TYPES[fmt]),
                 types.Part.from_text(text=prompt)
             ]
         )
@@ -301,8 +373,12 @@ async def transcribe_with_gemini(audio_path: str) -> Dict[str, Any]:
         response_mime_type="application/json"
     )
     
-    response_text = _call_gemini_with_fallback(client, contents, config)
-    data = json.loads(response_text)
+    data = await llm_gateway.generate_json(contents, config, purpose="transcription")
+    if not isinstance(data, dict):
+        raise Exception("Gemini returned no transcript object")
+    # A truncated answer keeps its complete segments
+    if "transcript" not in data:
+        data["transcript"] = " ".join(s.get("text", "") for s in data.get("segments") or [])
     
     duration = 0
     if "segments" in data and data["segments"]:
@@ -314,100 +390,348 @@ async def transcribe_with_gemini(audio_path: str) -> Dict[str, Any]:
 
 
 # ============================================================================
-# MAIN TRANSCRIPTION FUNCTION (with fallback chain)
+# LOCAL CPU ASR (OFFLINE TIER)
 # ============================================================================
 
-async def transcribe_audio(audio_path: str, prefer_mp3: bool = False) -> Dict[str, Any]:
+async def transcribe_with_local(
+    audio: ExtractedAudio, profile: str = DEFAULT_PROFILE
+) -> Dict[str, Any]:
     """
-    Transcribe audio using the fallback chain:
-    1. Google Cloud Speech-to-Text (best quality)
-    2. AssemblyAI (good quality, cloud-based)
-    3. Gemini AI (fallback)
-    
-    Raises exception if all providers fail.
+    Transcribe audio with the local CPU model (no network).
+    Requires TRANSCRIPTION_LOCAL_ASR and TRANSCRIPTION_LOCAL_MODEL_PATH.
     """
-    errors = []
+    if not local_asr.is_available():
+        raise Exception("Local ASR not enabled or model not found")
     
-    # 1. Try Google Cloud Speech-to-Text
-    if GOOGLE_APPLICATION_CREDENTIALS and GOOGLE_CLOUD_AVAILABLE:
-        try:
-            return await transcribe_with_google_cloud(audio_path)
-        except Exception as e:
-            print(f"❌ Google Cloud failed: {e}")
-            errors.append(f"Google Cloud: {str(e)[:100]}")
-    else:
-        print("⚠️ Google Cloud Speech not configured (missing GOOGLE_APPLICATION_CREDENTIALS)")
+    print("📢 Transcribing with local ASR...")
     
-    # 2. Try AssemblyAI
-    if ASSEMBLYAI_API_KEY and ASSEMBLYAI_AVAILABLE:
+    result = await local_asr.transcribe(audio.path("wav"))
+    result["provider"] = "local"
+    return result
+
+
+# ============================================================================
+# MAIN TRANSCRIPTION FUNCTION (with fallback chain)
+# ============================================================================
+
+def configured_providers() -> List[str]:
+    """Names of the providers with credentials and SDKs available, in priority order."""
+    configured = {
+        "google_cloud": bool(GOOGLE_APPLICATION_CREDENTIALS and GOOGLE_CLOUD_AVAILABLE),
+        "assemblyai": bool(ASSEMBLYAI_API_KEY and ASSEMBLYAI_AVAILABLE),
+        "gemini": bool(GEMINI_API_KEY),
+        "local": local_asr.is_available(),
+    }
+    return [name for name in PROVIDER_ORDER if configured[name]]
+
+
+def extraction_formats(profile: str = DEFAULT_PROFILE) -> List[str]:
+    """
+    Encodings to produce alongside the WAV when extracting a video.
+
+    Chunked transcription encodes each chunk separately, so when every
+    video is chunked only the WAV is extracted.
+    """
+    if PROFILES[profile]["chunking"] == "always":
+        return []
+    formats = [PROVIDER_AUDIO_FORMATS[name] for name in configured_providers()]
+    return [fmt for fmt in dict.fromkeys(formats) if fmt != "wav"]
+
+
+def _provider_call(
+    name: str,
+    fn: Callable[[ExtractedAudio, str], Awaitable[Dict[str, Any]]],
+    audio: ExtractedAudio,
+    profile: str = DEFAULT_PROFILE,
+):
+    """
+    Bind a provider to the audio. The call checks the provider's circuit
+    breaker first and reports the outcome (and real-time factor) back to
+    provider_health.
+    """
+    async def call() -> Dict[str, Any]:
+        if not provider_health.allow(name):
+            raise CircuitOpenError(name)
+        started = time.perf_counter()
         try:
-            # AssemblyAI works better with mp3
-            mp3_path = audio_path
-            if not audio_path.endswith('.mp3'):
-                mp3_path = audio_path.replace('.wav', '.mp3')
-                # Convert if needed
-                if not os.path.exists(mp3_path):
-                    cmd = ["ffmpeg", "-y", "-i", audio_path, "-acodec", "libmp3lame", "-q:a", "4", mp3_path]
-                    subprocess.run(cmd, check=True, capture_output=True)
-            
-            return await transcribe_with_assemblyai(mp3_path)
+            result = await fn(audio, profile)
+        except asyncio.CancelledError:
+            provider_health.record_cancelled(name)
+            raise
         except Exception as e:
-            print(f"❌ AssemblyAI failed: {e}")
-            errors.append(f"AssemblyAI: {str(e)[:100]}")
-    else:
-        print("⚠️ AssemblyAI not configured (missing ASSEMBLYAI_API_KEY)")
+            provider_health.record_failure(name, e)
+            raise
+        elapsed = time.perf_counter() - started
+        provider_health.record_success(name, elapsed, audio.duration or None)
+        if audio.duration > 0:
+            metrics.observe("transcription_provider_rtf", elapsed / audio.duration, provider=name)
+        return result
+    return name, call
+
+
+def _hedge_delay_for(audio: ExtractedAudio) -> Callable[[str], float]:
+    """
+    Seconds to wait on a provider before hedging: its p95 real-time factor
+    scaled to this audio's duration, or HEDGE_DELAY_SECONDS without history.
+    """
+    def delay(name: str) -> float:
+        rtf = metrics.percentile("transcription_provider_rtf", 95, provider=name)
+        if rtf is None:
+            return HEDGE_DELAY_SECONDS
+        return max(HEDGE_MIN_DELAY_SECONDS, rtf * audio.duration)
+    return delay
+
+
+async def transcribe_audio(
+    audio: ExtractedAudio,
+    policy: Optional[str] = None,
+    profile: str = DEFAULT_PROFILE,
+) -> Dict[str, Any]:
+    """
+    Transcribe audio using the provider chain:
+    1. Google Cloud Speech-to-Text (best quality)
+    2. AssemblyAI (good quality, cloud-based)
+    3. Gemini AI (fallback)
+    plus the local CPU model first or last, per TRANSCRIPTION_LOCAL_ASR.
     
-    # 3. Try Gemini
-    if GEMINI_API_KEY:
-        try:
-            return await transcribe_with_gemini(audio_path)
-        except Exception as e:
-            print(f"❌ Gemini failed: {e}")
-            errors.append(f"Gemini: {str(e)[:100]}")
-    else:
-        print("⚠️ Gemini not configured (missing GEMINI_API_KEY)")
+    The order adapts to provider health: providers with an open circuit
+    breaker are skipped and the fastest healthy provider goes first.
+    policy (default TRANSCRIPTION_PROVIDER_POLICY) selects sequential
+    fallback, hedged requests or racing all providers, and profile picks
+    the provider settings ("accurate" or "fast", see PROFILES).
     
-    # All providers failed
-    raise Exception(f"All transcription providers failed: {'; '.join(errors)}")
+    Raises exception if all providers fail.
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown transcription profile: {profile}")
+    functions = {
+        "google_cloud": transcribe_with_google_cloud,
+        "assemblyai": transcribe_with_assemblyai,
+        "gemini": transcribe_with_gemini,
+        "local": transcribe_with_local,
+    }
+    configured = configured_providers()
+    for name in PROVIDER_ORDER:
+        if name not in configured:
+            print(f"⚠️ {PROVIDER_LABELS[name]} not configured")
+    names = provider_health.order(configured)
+    if configured and not names:
+        raise Exception(
+            f"All transcription providers failed: circuit open for {', '.join(configured)}"
+        )
+
+    def report_failure(name: str, error: BaseException) -> None:
+        print(f"❌ {PROVIDER_LABELS[name]} failed: {error}")
 
+    try:
+        _, result = await hedging.run_providers(
+            [_provider_call(name, functions[name], audio, profile) for name in names],
+            policy=policy or PROVIDER_POLICY,
+            hedge_delay=_hedge_delay_for(audio),
+            metric_prefix="transcription_provider",
+            on_failure=report_failure,
+        )
+    except hedging.ProvidersFailedError as e:
+        errors = [f"{PROVIDER_LABELS[name]}: {str(error)[:100]}" for name, error in e.errors]
+        raise Exception(f"All transcription providers failed: {'; '.join(errors)}")
+
+    return result
+
+
+def _should_chunk(audio: ExtractedAudio, mode: str = CHUNKING_MODE) -> bool:
+    if mode == "off":
+        return False
+    if mode == "always":
+        return True
+    return audio.duration >= CHUNKING_MIN_SECONDS
+
+
+async def transcribe_audio_chunked(
+    audio: ExtractedAudio,
+    on_progress: Optional[ProgressCallback] = None,
+    profile: str = DEFAULT_PROFILE,
+) -> Dict[str, Any]:
+    """
+    Transcribe long audio as silence-aligned chunks processed concurrently.
+
+    At most CHUNK_CONCURRENCY chunks are in flight at once; each one goes
+    through the regular provider fallback chain, and the results are
+    merged back into one timeline with corrected offsets. on_progress
+    receives a "chunk_transcribed" event as each chunk completes.
+    A chunk's audio is cut from the WAV only once it gets its turn, and
+    deleted as soon as it is transcribed.
+    """
+    chunks = await executors.run_blocking(
+        "media", audio_segmentation.chunk_ranges, audio.path("wav"), CHUNK_SECONDS
+    )
+    print(f"✂️ Transcribing {len(chunks)} chunks (concurrency {CHUNK_CONCURRENCY})")
+    semaphore = asyncio.Semaphore(CHUNK_CONCURRENCY)
+    completed = 0
+
+    async def transcribe_chunk(offset: float, end: float):
+        nonlocal completed
+        async with semaphore:
+            chunk = await audio.excerpt(offset, end)
+            try:
+                result = await transcribe_audio(chunk, profile=profile)
+            finally:
+                chunk.close()
+        completed += 1
+        if on_progress:
+            on_progress("chunk_transcribed", {"completed": completed, "total": len(chunks)})
+        return offset, result
+
+    results = await asyncio.gather(*(transcribe_chunk(offset, end) for offset, end in chunks))
+    return audio_segmentation.merge_chunk_results(list(results))
+
+
+async def save_upload_to_disk(
+    upload: UploadFile,
+    max_bytes: Optional[int] = None,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> StoredUpload:
+    """
+    Stream an uploaded file into a temp file in fixed-size chunks.
+
+    Only one chunk is held in memory at a time, so peak memory stays
+    constant regardless of the upload size. The SHA-256 of the content is
+    computed on the same pass. Raises UploadTooLargeError (and removes the
+    partial file) once more than max_bytes were received.
+    """
+    suffix = Path(upload.filename or "").suffix or ".mp4"
+    max_bytes = max_bytes if max_bytes is not None else MAX_UPLOAD_BYTES
+    received = 0
+    digest = hashlib.sha256()
+
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as temp_video:
+        try:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                received += len(chunk)
+                if received > max_bytes:
+                    raise UploadTooLargeError(max_bytes)
+                digest.update(chunk)
+                temp_video.write(chunk)
+        except BaseException:
+            os.unlink(temp_video.name)
+            raise
+
+    return StoredUpload(temp_video.name, digest.hexdigest(), received)
+
+
+def transcription_settings(profile: str = DEFAULT_PROFILE) -> Dict[str, Any]:
+    """
+    Settings that influence the transcript produced for a given media file.
 
-async def transcribe_video(video_data: bytes, mime_type: str) -> Dict[str, Any]:
+    Part of the transcript cache key, so changing any of them (e.g.
+    configuring a new provider) never serves a stale result.
+    """
+    profile_settings = PROFILES[profile]
+    settings = {"language": "pt-BR", "providers": configured_providers(), "profile": profile}
+    if profile_settings["chunking"] != "off":
+        settings["chunk_seconds"] = CHUNK_SECONDS
+    if profile_settings["trim_silence"]:
+        settings["trim_silence_seconds"] = audio_segmentation.TRIM_MIN_SILENCE_SECONDS
+    return settings
+
+
+async def cached_transcript(content_hash: str, profile: str, size_bytes: int) -> Optional[Dict[str, Any]]:
+    """Cached transcript for the profile; any profile is upgraded to a cached accurate one."""
+    profiles = [DEFAULT_PROFILE] if profile == DEFAULT_PROFILE else [DEFAULT_PROFILE, profile]
+    for candidate in profiles:
+        key = transcript_cache.make_key(content_hash, transcription_settings(candidate))
+        cached = await transcript_cache.get(key, media_bytes=size_bytes)
+        if cached is not None:
+            return cached
+    return None
+
+
+async def transcribe_video(
+    video_path: str,
+    content_hash: Optional[str] = None,
+    size_bytes: int = 0,
+    on_progress: Optional[ProgressCallback] = None,
+    profile: str = DEFAULT_PROFILE,
+) -> Dict[str, Any]:
     """
     Main entry point for video transcription.
-    1. Saves video to temp
-    2. Extracts audio
-    3. Transcribes using available providers
+    1. Returns the cached transcript if this media was transcribed before
+    2. Extracts audio from the video file through the ffmpeg pipeline
+    3. Trims long silences (timestamps stay on the original timeline)
+    4. Transcribes using available providers
+
+    profile selects "accurate" (default) or "fast" settings; see PROFILES.
+    on_progress, if given, is called with ("audio_extracted", ...) and, for
+    chunked transcription, ("chunk_transcribed", ...) events.
+    The caller owns video_path and is responsible for removing it.
     """
-    with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as temp_video:
-        temp_video.write(video_data)
-        temp_video_path = temp_video.name
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown transcription profile: {profile}")
+    settings = PROFILES[profile]
+
+    if content_hash:
+        cached = await cached_transcript(content_hash, profile, size_bytes)
+        if cached is not None:
+            print(f"⚡ Transcript cache hit for {content_hash[:12]}")
+            return cached
+
+    started = time.perf_counter()
+    # Decode once: the WAV plus every configured provider's encoding in the
+    # same ffmpeg pass, written to the audio's working directory rather
+    # than held in memory. When silence is trimmed only the WAV is decoded;
+    # the encodings are made from the trimmed WAV.
+    extra_formats = extraction_formats(profile)
+    audio = await media_pipeline.extract_for_transcription(
+        video_path, [] if settings["trim_silence"] else extra_formats, settings["sample_rate"]
+    )
     
-    audio_path = None
+    if audio is None:
+        raise Exception("No audio track found in video")
+
     try:
-        # Extract audio as WAV (best for Google Cloud)
-        audio_path = extract_audio_from_video(temp_video_path, "wav")
-        
-        if not audio_path:
-            raise Exception("No audio track found in video")
-        
-        result = await transcribe_audio(audio_path)
-        return result
-        
+        # Cut long pauses; segment timestamps are mapped back afterwards
+        offset_map = None
+        if settings["trim_silence"]:
+            offset_map = await audio.trim_silence()
+            if offset_map.trimmed_seconds > 0:
+                print(f"🔇 Trimmed {offset_map.trimmed_seconds:.1f}s of silence")
+                metrics.increment("transcription_trimmed_seconds", offset_map.trimmed_seconds)
+            await audio.encode(extra_formats)
+        trimmed_seconds = round(offset_map.trimmed_seconds, 1) if offset_map else 0.0
+        if on_progress:
+            on_progress(
+                "audio_extracted", {"duration": audio.duration, "trimmed_seconds": trimmed_seconds}
+            )
+
+        if _should_chunk(audio, settings["chunking"]):
+            result = await transcribe_audio_chunked(audio, on_progress, profile)
+        else:
+            result = await transcribe_audio(audio, profile=profile)
     finally:
-        if os.path.exists(temp_video_path):
-            os.unlink(temp_video_path)
-        if audio_path and os.path.exists(audio_path):
-            os.unlink(audio_path)
-        # Clean up potential mp3 conversion
-        mp3_path = audio_path.replace('.wav', '.mp3') if audio_path else None
-        if mp3_path and os.path.exists(mp3_path):
-            os.unlink(mp3_path)
+        audio.close()
+    if trimmed_seconds:
+        result = offset_map.remap_result(result)
+    result["trimmed_seconds"] = trimmed_seconds
+    result["profile"] = profile
+    metrics.observe("transcription_latency_seconds", time.perf_counter() - started, profile=profile)
+
+    if content_hash:
+        await transcript_cache.put(
+            transcript_cache.make_key(content_hash, transcription_settings(profile)), result
+        )
+    return result
 
 
 # ============================================================================
 # QUIZ GENERATION (using Gemini)
 # ============================================================================
 
+# Bump when the quiz prompt changes (invalidates cached responses)
+QUIZ_PROMPT_VERSION = "1"
+
+
 def calculate_quiz_questions(duration_seconds: int) -> int:
     """
     Calculate the number of quiz questions based on video duration.
@@ -425,7 +749,39 @@ def calculate_quiz_questions(duration_seconds: int) -> int:
     return num_questions
 
 
-def generate_quiz_from_transcript(transcript_text: str, duration_seconds: int = 300) -> Dict[str, Any]:
+async def _quiz_lecture(transcript_text: str, instructions: str) -> Tuple[str, Optional[str]]:
+    """
+    The lecture section of the quiz prompt, and the shared_context to send.
+
+    With context caching the whole transcript is referenced as cached
+    context. Otherwise long lectures are covered by their digest plus short
+    raw excerpts, and shorter ones are sampled into the budget left by the
+    instructions.
+    """
+    if context_cache.enabled_for(transcript_text):
+        return "TEXTO: a transcrição completa da aula, enviada acima.", transcript_text
+
+    digest = await transcript_digest.get_digest(transcript_text)
+    if digest:
+        section, template = "quiz_excerpts", instructions + digest.text()
+    else:
+        section, template = "quiz_transcript", instructions
+    model = llm_gateway.routed_model()
+    budget = prompt_budget.section_budget(
+        section, template, llm_gateway.DEFAULT_OUTPUT_TOKENS, llm_gateway.GEMINI_MODELS, model=model
+    )
+    transcript_excerpt = prompt_budget.fit_text(transcript_text, budget, model)
+    if digest:
+        lecture = (
+            f"RESUMO DA AULA:\n    {digest.text()}\n\n"
+            f'    TRECHOS DA TRANSCRIÇÃO:\n    "{transcript_excerpt}"'
+        )
+    else:
+        lecture = f'TEXTO:\n    "{transcript_excerpt}"'
+    return lecture, None
+
+
+async def generate_quiz_from_transcript(transcript_text: str, duration_seconds: int = 300) -> Dict[str, Any]:
     """
     Generate quiz questions based on transcript using Gemini.
 
@@ -443,18 +799,11 @@ def generate_quiz_from_transcript(transcript_text: str, duration_seconds: int =
 
     print(f"📝 Generating quiz: {num_questions} questions for {duration_minutes:.1f} min video")
 
-    client = genai.Client(api_key=GEMINI_API_KEY)
-
     # Decide if coding exercise should be included (only for longer videos)
     include_coding = duration_seconds >= 600  # 10+ minutes
     coding_instruction = "e 1 exercício de código (se o conteúdo envolver programação)" if include_coding else ""
 
-    prompt = f"""
-    Com base no seguinte texto transcrito de uma aula, crie um quiz educativo.
-
-    TEXTO:
-    "{transcript_text[:10000]}"
-
+    instructions = f"""
     TAREFA:
     Gere EXATAMENTE {num_questions} perguntas de múltipla escolha{coding_instruction}.
     
@@ -481,16 +830,41 @@ def generate_quiz_from_transcript(transcript_text: str, duration_seconds: int =
     }}
     """
 
+    lecture, shared_context = await _quiz_lecture(transcript_text, instructions)
+    prompt = f"""
+    Com base no seguinte texto transcrito de uma aula, crie um quiz educativo.
+
+    {lecture}
+{instructions}"""
+
     config = types.GenerateContentConfig(
         temperature=0.5,
-        response_mime_type="application/json"
+        response_mime_type="application/json",
+        response_schema=GeneratedQuiz,
     )
     
-    response_text = _call_gemini_with_fallback(client, [prompt], config)
-    result = json.loads(response_text)
+    data = await llm_gateway.generate_json(
+        [prompt],
+        config,
+        purpose="quiz",
+        cache_version=QUIZ_PROMPT_VERSION,
+        shared_context=shared_context,
+    )
+    if not isinstance(data, dict):
+        raise Exception("Quiz response is not an object")
+
+    # Keep the valid questions and exercises, even if some are not
+    result = {
+        "questions": llm_json.validate_items(data.get("questions"), QuizQuestion, "question"),
+        "codingExercises": llm_json.validate_items(
+            data.get("codingExercises"), CodingExercise, "coding exercise"
+        ),
+    }
+    if not result["questions"]:
+        raise Exception("Quiz response has no valid questions")
     
-    q_count = len(result.get("questions", []))
-    ex_count = len(result.get("codingExercises", []))
+    q_count = len(result["questions"])
+    ex_count = len(result["codingExercises"])
     result["totalPoints"] = (q_count * 20) + (ex_count * 50)
     
     return result
@@ -0,0 +1,134 @@
+"""
+Shared AI Client Tests
+
+SDK clients are built once per process so their connection pools are
+reused across requests.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from google import genai
+from google.genai import types
+
+from services import ai_clients
+
+GENERATE_RESPONSE = json.dumps({
+    "candidates": [{"content": {"role": "model", "parts": [{"text": "ok"}]}}]
+}).encode()
+
+
+# Handshake cost of a new connection (TCP + TLS to a real API endpoint),
+# and the server's time per request
+CONNECT_SECONDS = 0.02
+REQUEST_SECONDS = 0.002
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    """Answers every POST like generateContent; counts TCP connections."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # keep-alive responses must not wait on delayed ACKs
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+        time.sleep(CONNECT_SECONDS)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(REQUEST_SECONDS)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(GENERATE_RESPONSE)))
+        self.end_headers()
+        self.wfile.write(GENERATE_RESPONSE)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_gemini(monkeypatch):
+    FakeGeminiHandler.connections = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGeminiHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("GOOGLE_GEMINI_BASE_URL", f"http://127.0.0.1:{server.server_port}/")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+async def fresh_clients():
+    await ai_clients.close_clients()
+    yield
+    await ai_clients.close_clients()
+
+
+async def test_gemini_client_is_shared_per_key():
+    """Test the same instance is returned per API key."""
+    client = ai_clients.get_gemini_client("key-a")
+
+    assert ai_clients.get_gemini_client("key-a") is client
+    assert ai_clients.get_gemini_client("key-b") is not client
+
+
+def test_gemini_client_requires_key(monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+
+    with pytest.raises(Exception, match="GEMINI_API_KEY"):
+        ai_clients.get_gemini_client()
+
+
+async def test_shared_client_is_faster_than_per_call_clients(fake_gemini):
+    """Benchmark: sequential calls through the shared client skip the per-call handshake."""
+    requests = 20
+
+    def generate(client):
+        return client.models.generate_content(model="gemini-test", contents="ping").text
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        client = genai.Client(api_key="test-key")
+        assert generate(client) == "ok"
+        client.close()
+    per_call_seconds = time.perf_counter() - started
+    per_call_connections = FakeGeminiHandler.connections
+
+    FakeGeminiHandler.connections = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        assert generate(ai_clients.get_gemini_client("test-key")) == "ok"
+    shared_seconds = time.perf_counter() - started
+    shared_connections = FakeGeminiHandler.connections
+
+    print(
+        f"\n{requests} requests: per-call {per_call_connections} connections "
+        f"{per_call_seconds * 1000:.0f} ms, shared {shared_connections} connections "
+        f"{shared_seconds * 1000:.0f} ms"
+    )
+    assert per_call_connections == requests
+    assert shared_connections == 1
+    # Per-call clients pay CONNECT_SECONDS on every request, the shared one once
+    assert per_call_seconds >= requests * CONNECT_SECONDS
+    assert shared_seconds < per_call_seconds / 2
+
+
+async def test_shared_async_client_reuses_connections(fake_gemini):
+    client = ai_clients.get_gemini_client("test-key")
+
+    for _ in range(5):
+        response = await client.aio.models.generate_content(
+            model="gemini-test",
+            contents="ping",
+            config=types.GenerateContentConfig(temperature=0),
+        )
+        assert response.text == "ok"
+
+    assert FakeGeminiHandler.connections == 1
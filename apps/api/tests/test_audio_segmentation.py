@@ -0,0 +1,137 @@
+"""
+Audio Segmentation Tests
+"""
+
+import math
+import struct
+import wave
+
+import pytest
+
+from services import audio_segmentation
+
+RATE = 16000
+
+
+def _write_wav(path, spans):
+    """Write a 16 kHz mono WAV from (seconds, is_tone) spans."""
+    frames = bytearray()
+    for seconds, is_tone in spans:
+        for i in range(int(seconds * RATE)):
+            value = int(8000 * math.sin(2 * math.pi * 440 * i / RATE)) if is_tone else 0
+            frames += struct.pack("<h", value)
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes(bytes(frames))
+
+
+@pytest.fixture
+def lecture_wav(tmp_path):
+    """25 s of speech-like tone with pauses around 8 s and 17 s."""
+    path = tmp_path / "lecture.wav"
+    _write_wav(path, [(7.5, True), (1.0, False), (8.0, True), (1.0, False), (7.5, True)])
+    return str(path)
+
+
+def test_plan_chunks_cuts_inside_pauses(lecture_wav):
+    """Test chunk boundaries land in silence rather than at fixed offsets."""
+    ranges = audio_segmentation.plan_chunks(lecture_wav, chunk_seconds=6)
+
+    cuts = [start for start, _ in ranges[1:]]
+    assert len(cuts) == 2
+    assert 7.5 <= cuts[0] <= 8.5
+    assert 16.5 <= cuts[1] <= 17.5
+    assert ranges[-1][1] == pytest.approx(25.0)
+
+
+def test_split_wav_returns_overlapping_chunks(lecture_wav):
+    """Test chunks cover the audio with a short overlap at each cut."""
+    with open(lecture_wav, "rb") as f:
+        chunks = audio_segmentation.split_wav(f.read(), chunk_seconds=6)
+
+    offsets = [offset for _, offset in chunks]
+    assert offsets[0] == 0.0
+    total = sum(audio_segmentation.wav_duration(chunk) for chunk, _ in chunks)
+    overlap = audio_segmentation.CHUNK_OVERLAP_SECONDS * (len(chunks) - 1)
+    assert total == pytest.approx(25.0 + overlap, abs=0.01)
+
+
+def test_merge_chunk_results_shifts_and_deduplicates():
+    """Test offsets are applied and words repeated across the cut are dropped."""
+    first = {
+        "provider": "google_cloud",
+        "language": "pt-BR",
+        "segments": [{"start": 0.0, "end": 9.5, "text": "hoje vamos falar de listas"}],
+    }
+    second = {
+        "provider": "google_cloud",
+        "segments": [
+            {"start": 0.2, "end": 3.0, "text": "de listas em Python"},
+            {"start": 3.5, "end": 6.0, "text": "e também tuplas"},
+        ],
+    }
+
+    merged = audio_segmentation.merge_chunk_results([(0.0, first), (9.0, second)])
+
+    assert [s["text"] for s in merged["segments"]] == [
+        "hoje vamos falar de listas",
+        "em Python",
+        "e também tuplas",
+    ]
+    assert merged["segments"][2]["start"] == pytest.approx(12.5)
+    assert merged["duration"] == pytest.approx(15.0)
+    assert merged["provider"] == "google_cloud"
+    assert merged["chunks"] == 2
+
+
+def test_merge_keeps_chunks_without_segments_in_timeline_order():
+    """Test a chunk transcript without timestamps stays between its neighbours."""
+    merged = audio_segmentation.merge_chunk_results([
+        (0.0, {"segments": [{"start": 0.0, "end": 5.0, "text": "primeira parte"}]}),
+        (5.0, {"transcript": "segunda parte", "segments": []}),
+        (10.0, {"segments": [{"start": 0.0, "end": 4.0, "text": "terceira parte"}]}),
+    ])
+
+    assert merged["transcript"] == "primeira parte segunda parte terceira parte"
+    assert len(merged["segments"]) == 2
+
+
+def test_trim_silence_cuts_long_pauses_and_remaps_timestamps(tmp_path):
+    """Test a 10 s pause is cut and segment times map back to the video timeline."""
+    path = tmp_path / "pause.wav"
+    _write_wav(path, [(4.0, True), (10.0, False), (4.0, True), (1.0, False)])
+    trimmed = str(tmp_path / "trimmed.wav")
+
+    offset_map = audio_segmentation.trim_silence(str(path), trimmed)
+
+    pad = audio_segmentation.TRIM_PAD_SECONDS
+    assert offset_map.trimmed_seconds == pytest.approx(10.0 - 2 * pad, abs=0.05)
+    assert audio_segmentation.wav_duration(trimmed) == pytest.approx(
+        19.0 - offset_map.trimmed_seconds, abs=0.01
+    )
+    assert len(offset_map.spans) == 2
+
+    # Second tone starts at 4 s + pad in the trimmed audio, 14 s in the original
+    result = offset_map.remap_result({
+        "transcript": "a b",
+        "segments": [
+            {"start": 0.5, "end": 4.0, "text": "a"},
+            {"start": 4.0 + 2 * pad, "end": 8.0 + 2 * pad, "text": "b"},
+        ],
+    })
+    assert result["segments"][0] == {"start": 0.5, "end": 4.0, "text": "a"}
+    assert result["segments"][1]["start"] == pytest.approx(14.0, abs=0.05)
+    assert result["segments"][1]["end"] == pytest.approx(18.0, abs=0.05)
+    assert result["duration"] == result["segments"][1]["end"]
+
+
+def test_trim_silence_leaves_short_pauses_alone(lecture_wav, tmp_path):
+    """Test audio whose pauses are all short is left untouched."""
+    trimmed = tmp_path / "trimmed.wav"
+
+    offset_map = audio_segmentation.trim_silence(lecture_wav, str(trimmed))
+
+    assert not trimmed.exists()
+    assert offset_map.trimmed_seconds == 0
@@ -0,0 +1,128 @@
+"""
+Checkpoint AI Service Tests
+"""
+
+import asyncio
+
+from services import checkpoint_ai_service, llm_gateway
+
+TRANSCRIPT = " ".join(f"palavra{i}" for i in range(200))
+
+
+def question(text, segment=None):
+    data = {
+        "question": text,
+        "options": ["A", "B", "C", "D"],
+        "correct_answer": 1,
+        "explanation": "porque sim",
+    }
+    if segment is not None:
+        data["segment"] = segment
+    return data
+
+
+async def test_all_checkpoints_come_from_a_single_call(monkeypatch):
+    """Test batched mode needs one Gemini round trip for all four checkpoints."""
+    calls = []
+
+    async def fake_generate(contents, config, **kwargs):
+        calls.append(kwargs["purpose"])
+        return [question(f"Q{i}", segment=i) for i in range(1, 5)]
+
+    monkeypatch.setattr(checkpoint_ai_service, "api_key", "test-key")
+    monkeypatch.setattr(checkpoint_ai_service, "GENERATION_MODE", "batched")
+    monkeypatch.setattr(llm_gateway, "generate_json", fake_generate)
+
+    checkpoints = await checkpoint_ai_service.generate_checkpoint_questions(TRANSCRIPT, 400, "vid")
+
+    assert calls == ["checkpoint_batch"]
+    assert [c.question for c in checkpoints] == ["Q1", "Q2", "Q3", "Q4"]
+    assert [c.timestamp_seconds for c in checkpoints] == [100, 200, 300, 395]
+
+
+async def test_only_invalid_slots_fall_back_to_per_segment_calls(monkeypatch):
+    """Test a slot failing validation is regenerated alone, and static fallback is last resort."""
+    calls = []
+
+    async def fake_generate(contents, config, **kwargs):
+        calls.append(kwargs["purpose"])
+        if kwargs["purpose"] == "checkpoint_batch":
+            broken = dict(question("Q2", segment=2), correct_answer=7)
+            return [question("Q1", 1), broken, question("Q3", 3)]
+        prompt = contents[0].parts[0].text
+        if "Segmento 2" in prompt:
+            return question("Q2 again")
+        return {"question": ""}
+
+    monkeypatch.setattr(checkpoint_ai_service, "api_key", "test-key")
+    monkeypatch.setattr(checkpoint_ai_service, "GENERATION_MODE", "batched")
+    monkeypatch.setattr(llm_gateway, "generate_json", fake_generate)
+
+    checkpoints = await checkpoint_ai_service.generate_checkpoint_questions(TRANSCRIPT, 400, "vid")
+
+    assert calls == ["checkpoint_batch", "checkpoint", "checkpoint"]
+    assert [c.question for c in checkpoints[:3]] == ["Q1", "Q2 again", "Q3"]
+    assert checkpoints[3].id.startswith("fallback-cp-3")
+
+
+async def test_progressive_generation_answers_with_the_first_checkpoint(monkeypatch):
+    """Test the response carries the 25% checkpoint while the rest keep generating."""
+    from routers import assessment
+    from services import checkpoint_progress
+
+    release = asyncio.Event()
+
+    async def fake_generate(contents, config, **kwargs):
+        prompt = contents[0].parts[0].text
+        if "Segmento 1" not in prompt:
+            await release.wait()
+        return question(prompt.split("(Segmento ")[1][0])
+
+    monkeypatch.setattr(checkpoint_ai_service, "api_key", "test-key")
+    monkeypatch.setattr(llm_gateway, "generate_json", fake_generate)
+    monkeypatch.setattr(assessment, "generated_checkpoints_cache", {})
+    checkpoint_progress.reset()
+
+    request = assessment.GenerateCheckpointsRequest(
+        video_id="vid", duration_seconds=400, transcript=TRANSCRIPT, progressive=True
+    )
+    first = await assessment.generate_ai_checkpoints(request)
+
+    assert [c.question for c in first] == ["1"]
+    assert (await assessment.get_checkpoint_progress("vid"))["status"] == "generating"
+
+    release.set()
+    views = [view async for view in checkpoint_progress.get("vid").updates()]
+
+    assert views[-1]["status"] == "complete"
+    assert [c["question"] for c in views[-1]["checkpoints"]] == ["1", "2", "3", "4"]
+    assert len(assessment.generated_checkpoints_cache["vid:400"]) == 4
+
+
+async def test_progressive_runs_are_keyed_by_transcript_and_evicted(monkeypatch):
+    """Test an edited transcript starts a new run and finished runs are dropped."""
+    from services import checkpoint_progress
+
+    checkpoint_progress.reset()
+    release = asyncio.Event()
+
+    async def generate(emit):
+        await release.wait()
+        raise RuntimeError("sem cota")
+
+    first = checkpoint_progress.start("vid", 400, TRANSCRIPT, 4, generate)
+    assert checkpoint_progress.start("vid", 400, TRANSCRIPT, 4, generate) is first
+    edited = checkpoint_progress.start("vid", 400, TRANSCRIPT + " fim", 4, generate)
+    assert edited is not first
+    assert checkpoint_progress.get("vid") is edited
+
+    release.set()
+    await first.wait_for(1)
+    await edited.wait_for(1)
+
+    monkeypatch.setattr(checkpoint_progress, "MAX_RUNS", 1)
+    assert checkpoint_progress.get("vid") is edited
+    assert len(checkpoint_progress._runs) == 1
+
+    monkeypatch.setattr(checkpoint_progress, "FINISHED_TTL_SECONDS", -1)
+    assert checkpoint_progress.get("vid") is None
@@ -0,0 +1,106 @@
+"""
+Context Cache Tests
+"""
+
+from types import SimpleNamespace
+
+import pytest
+from google.genai import types
+
+from services import ai_clients, context_cache, llm_gateway
+
+TRANSCRIPT = "Nesta aula estudamos grafos, filas e pilhas. " * 50
+
+
+class RecordingModels:
+    """generate_content stand-in that records what each call sent."""
+
+    def __init__(self, failures=None):
+        self.failures = failures or []
+        self.calls = []
+
+    async def generate_content(self, model, contents, config):
+        self.calls.append((model, contents, config))
+        if self.failures:
+            raise Exception(self.failures.pop(0))
+        return SimpleNamespace(text="ok", usage_metadata=None)
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    llm_gateway.reset()
+    context_cache.reset()
+    monkeypatch.setattr(context_cache, "BACKEND", "local")
+    monkeypatch.setattr(context_cache, "MIN_TOKENS", 100)
+    models = RecordingModels()
+    client = SimpleNamespace(aio=SimpleNamespace(models=models))
+    monkeypatch.setattr(ai_clients, "get_gemini_client", lambda api_key=None: client)
+    yield models
+    llm_gateway.reset()
+    context_cache.reset()
+
+
+def sent_text(contents):
+    return "\n".join(part.text for content in contents for part in content.parts)
+
+
+def test_only_large_transcripts_use_the_cache(monkeypatch):
+    """Test caching is off by default and skipped below MIN_TOKENS."""
+    monkeypatch.setattr(context_cache, "BACKEND", "off")
+    assert not context_cache.enabled_for(TRANSCRIPT)
+
+    monkeypatch.setattr(context_cache, "BACKEND", "gemini")
+    monkeypatch.setattr(context_cache, "MIN_TOKENS", 100)
+    assert context_cache.enabled_for(TRANSCRIPT)
+    assert not context_cache.enabled_for("Uma aula curta.")
+
+
+async def test_transcript_is_cached_once_per_model_and_referenced(fake_models):
+    """Test follow-up prompts reuse one handle per model for the same transcript."""
+    for prompt in ("quiz", "checkpoint 1", "checkpoint 2"):
+        await llm_gateway.generate([prompt], models=["a"], shared_context=TRANSCRIPT)
+    await llm_gateway.generate(["quiz"], models=["b"], shared_context=TRANSCRIPT)
+
+    backend = context_cache.backend()
+    assert len(backend.contents) == 2
+    for _, contents, _ in fake_models.calls:
+        assert "grafos" in sent_text(contents)
+    assert sent_text(fake_models.calls[2][1]).endswith("checkpoint 2")
+
+
+async def test_handles_expire_and_are_recreated(fake_models, monkeypatch):
+    """Test a handle is not used past its TTL (minus the safety margin)."""
+    now = [1000.0]
+    monkeypatch.setattr(context_cache.time, "monotonic", lambda: now[0])
+
+    first = await context_cache.reference("a", TRANSCRIPT)
+    now[0] += context_cache.TTL_SECONDS - context_cache.EXPIRY_MARGIN_SECONDS - 1
+    assert await context_cache.reference("a", TRANSCRIPT) == first
+
+    now[0] += 2
+    second = await context_cache.reference("a", TRANSCRIPT)
+    assert second.name != first.name
+    assert first.name not in context_cache.backend().contents
+
+
+async def test_expired_server_side_cache_is_recreated_once(fake_models):
+    """Test a call rejected for an unknown cached content retries with a fresh handle."""
+    await llm_gateway.generate(["quiz"], models=["a"], shared_context=TRANSCRIPT)
+    fake_models.failures = ["404 NOT_FOUND: CachedContent not found"]
+
+    assert await llm_gateway.generate(["quiz"], models=["a"], shared_context=TRANSCRIPT) == "ok"
+    assert len(fake_models.calls) == 3
+    assert llm_gateway.router.snapshot(["a"])["models"]["a"]["state"] == "available"
+    assert len(context_cache.backend().contents) == 1  # the forgotten one was deleted
+
+
+def test_gemini_backend_references_the_handle():
+    """Test the Gemini backend sends the handle instead of the transcript."""
+    handle = context_cache.CachedContext("cachedContents/123", "a", 0.0)
+    config = types.GenerateContentConfig(temperature=0.5)
+
+    contents, config = context_cache.GeminiBackend().apply(handle, ["quiz"], config)
+
+    assert contents == ["quiz"]
+    assert config.cached_content == "cachedContents/123"
+    assert config.temperature == 0.5
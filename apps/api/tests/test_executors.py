@@ -0,0 +1,92 @@
+"""
+Executor Pool Tests
+
+Blocking provider calls must not stall the event loop serving other
+requests such as the health check.
+"""
+
+import asyncio
+import gc
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from services import executors, metrics, transcription_service
+from services.media_pipeline import ExtractedAudio, pcm_to_wav
+
+
+@pytest.fixture(autouse=True)
+def fresh_pools():
+    """Recreate pools so per-test sizes take effect and don't leak."""
+    executors.shutdown()
+    yield
+    executors.shutdown()
+
+
+async def test_run_blocking_tracks_queue_depth(monkeypatch):
+    """Test work beyond the pool size waits in the queue."""
+    monkeypatch.setitem(executors.POOL_SIZES, "media", 1)
+    metrics.reset()
+
+    tasks = [
+        asyncio.create_task(executors.run_blocking("media", time.sleep, 0.05)) for _ in range(3)
+    ]
+    await asyncio.sleep(0.01)
+    assert executors.pool_stats()["media"]["queued"] == 2
+
+    await asyncio.gather(*tasks)
+    assert executors.pool_stats()["media"] == {"size": 1, "queued": 0, "active": 0}
+
+
+async def test_cancelled_queued_call_leaves_the_queue(monkeypatch):
+    """Test a call cancelled before a worker picked it up is not counted as queued."""
+    monkeypatch.setitem(executors.POOL_SIZES, "media", 1)
+
+    running = asyncio.create_task(executors.run_blocking("media", time.sleep, 0.05))
+    queued = asyncio.create_task(executors.run_blocking("media", time.sleep, 0.05))
+    await asyncio.sleep(0.01)
+    assert executors.pool_stats()["media"]["queued"] == 1
+
+    queued.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await queued
+    await running
+    assert executors.pool_stats()["media"] == {"size": 1, "queued": 0, "active": 0}
+
+
+async def test_health_check_stays_fast_during_transcriptions(monkeypatch):
+    """Benchmark: health p99 stays flat while 10 transcriptions are in flight."""
+    from main import app
+
+    def slow_recognize(content, *config):
+        time.sleep(0.5)  # stands in for operation.result() on a long recording
+        return SimpleNamespace(results=[])
+
+    monkeypatch.setattr(transcription_service, "GOOGLE_APPLICATION_CREDENTIALS", "creds.json")
+    monkeypatch.setattr(transcription_service, "GOOGLE_CLOUD_AVAILABLE", True)
+    monkeypatch.setattr(transcription_service, "_recognize_with_google_cloud", slow_recognize)
+    monkeypatch.setitem(executors.POOL_SIZES, "speech", 10)
+
+    audio = ExtractedAudio.from_bytes({"wav": pcm_to_wav(b"\x00" * 32000), "flac": b"fLaC"})
+    transcriptions = [
+        asyncio.create_task(transcription_service.transcribe_audio(audio)) for _ in range(10)
+    ]
+
+    latencies = []
+    gc.collect()  # a full collection mid-measurement would look like a stalled loop
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        await asyncio.sleep(0.05)
+        for _ in range(20):
+            started = time.perf_counter()
+            response = await client.get("/api/health")
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200
+    in_flight = sum(not task.done() for task in transcriptions)
+
+    results = await asyncio.gather(*transcriptions)
+    assert in_flight == 10
+    assert all(result["provider"] == "google_cloud" for result in results)
+    assert max(latencies) < 0.1
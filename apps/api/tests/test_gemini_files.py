@@ -0,0 +1,137 @@
+"""
+Gemini File Handle Tests
+"""
+
+import base64
+import json
+from types import SimpleNamespace
+
+import pytest
+from google.genai import errors, types
+
+from services import ai_clients, gemini_files, gemini_service, llm_cache, llm_gateway
+
+CHALLENGES = {
+    "challenges": [{
+        "timestamp": 30, "timestampLabel": "00:30", "type": "quiz", "title": "T",
+        "content": "Pergunta?", "options": ["A", "B", "C", "D"], "correctAnswer": 0,
+        "summary": "Resumo",
+    }]
+}
+
+
+class FakeFiles:
+    """files API stand-in: uploads start PROCESSING and become ACTIVE on the next get."""
+
+    def __init__(self):
+        self.uploads = []
+
+    async def upload(self, file, config):
+        self.uploads.append(len(file.read()))
+        name = f"files/{len(self.uploads)}"
+        return types.File(name=name, uri=f"https://files/{name}", mime_type=config.mime_type,
+                          state=types.FileState.PROCESSING)
+
+    async def get(self, name):
+        return types.File(name=name, uri=f"https://files/{name}", mime_type="video/mp4",
+                          state=types.FileState.ACTIVE)
+
+
+class FakeModels:
+    def __init__(self):
+        self.calls = []
+        self.failures = {}
+
+    async def generate_content(self, model, contents, config):
+        self.calls.append((model, contents[0].parts[0]))
+        failure = self.failures.get(model)
+        if isinstance(failure, Exception):
+            raise failure
+        if failure:
+            raise Exception(failure)
+        return SimpleNamespace(text=json.dumps(CHALLENGES), usage_metadata=None)
+
+
+@pytest.fixture
+def fake_client(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "CACHE_PATH", str(tmp_path / "llm.sqlite3"))
+    monkeypatch.setattr(llm_cache, "CACHE_ENABLED", True)
+    monkeypatch.setattr(gemini_files, "INLINE_MAX_BYTES", 1000)
+    monkeypatch.setattr(gemini_files, "ACTIVE_POLL_SECONDS", 0)
+    monkeypatch.setattr(gemini_service, "api_key", "test-key")
+    client = SimpleNamespace(aio=SimpleNamespace(files=FakeFiles(), models=FakeModels()))
+    monkeypatch.setattr(ai_clients, "get_gemini_client", lambda api_key=None: client)
+    llm_gateway.reset()
+    gemini_files.reset()
+    yield client.aio
+    llm_cache.close()
+    llm_gateway.reset()
+    gemini_files.reset()
+
+
+async def test_tiny_clips_are_sent_inline(fake_client):
+    """Test clips up to INLINE_MAX_BYTES skip the files API."""
+    part = await gemini_files.video_part(b"x" * 1000, "video/mp4")
+
+    assert part.inline_data.data == b"x" * 1000
+    assert fake_client.files.uploads == []
+
+
+async def test_video_is_uploaded_once_for_fallbacks_and_repeat_analyses(fake_client, monkeypatch):
+    """Test every model attempt and later analysis reference the same uploaded file."""
+    monkeypatch.setattr(llm_gateway, "GEMINI_MODELS", ["a", "b"])
+    fake_client.models.failures = {"a": "429 RESOURCE_EXHAUSTED"}
+    video = base64.b64encode(b"v" * 5000).decode()
+
+    challenges = await gemini_service.analyze_video(video, "video/mp4")
+    again = await gemini_service.analyze_video(video, "video/mp4")
+
+    assert fake_client.files.uploads == [5000]
+    assert [model for model, _ in fake_client.models.calls] == ["a", "b"]
+    assert {part.file_data.file_uri for _, part in fake_client.models.calls} == {"https://files/files/1"}
+    assert challenges[0]["content"] == again[0]["content"] == "Pergunta?"
+
+
+async def test_cached_analysis_uploads_nothing(fake_client):
+    """Test the response cache is checked before the video is uploaded."""
+    data = b"v" * 5000
+    video = base64.b64encode(data).decode()
+    await gemini_service.analyze_video(video, "video/mp4")
+    await gemini_files.forget(gemini_files.content_hash(data))
+    gemini_files.reset()
+
+    challenges = await gemini_service.analyze_video(video, "video/mp4")
+
+    assert fake_client.files.uploads == [5000]
+    assert challenges[0]["content"] == "Pergunta?"
+
+
+async def test_rejected_file_is_forgotten(fake_client, monkeypatch):
+    """Test a 403 on the file URI drops the handle so the next analysis uploads again."""
+    monkeypatch.setattr(llm_gateway, "GEMINI_MODELS", ["a"])
+    fake_client.models.failures = {"a": errors.ClientError(
+        403, {"error": {"code": 403, "message": "Permission denied", "status": "PERMISSION_DENIED"}}
+    )}
+    data = b"v" * 5000
+
+    await gemini_service.analyze_video(base64.b64encode(data).decode(), "video/mp4")
+    gemini_files.reset()
+
+    assert (await gemini_files.get_file(data, "video/mp4")).name == "files/2"
+
+
+async def test_handles_are_shared_until_they_expire(fake_client, monkeypatch):
+    """Test another worker reuses a stored handle, and expired handles are re-uploaded."""
+    data = b"v" * 5000
+    first = await gemini_files.get_file(data, "video/mp4")
+
+    gemini_files.reset()  # another worker: only the persistent store
+    assert await gemini_files.get_file(data, "video/mp4") == first
+
+    now = first.expires_at - gemini_files.EXPIRY_MARGIN_SECONDS
+    monkeypatch.setattr(gemini_files.time, "time", lambda: now)
+    assert (await gemini_files.get_file(data, "video/mp4")).name == "files/2"
+
+    await gemini_files.forget(gemini_files.content_hash(data))
+    gemini_files.reset()
+    assert (await gemini_files.get_file(data, "video/mp4")).name == "files/3"
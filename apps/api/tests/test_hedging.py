@@ -0,0 +1,121 @@
+"""
+Provider Policy Tests
+"""
+
+import asyncio
+import gc
+import time
+
+import pytest
+
+from services import hedging, metrics
+
+
+def _provider(name, delay, log, fail=False):
+    async def call():
+        log.append(f"start:{name}")
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            log.append(f"cancel:{name}")
+            raise
+        if fail:
+            raise RuntimeError(f"{name} down")
+        return name
+
+    return name, call
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+
+
+async def test_hedged_starts_backup_and_cancels_loser():
+    """Test a slow primary is hedged and cancelled once the backup wins."""
+    log = []
+    winner, result = await hedging.run_providers(
+        [_provider("slow", 1.0, log), _provider("fast", 0.01, log)],
+        policy="hedged",
+        hedge_delay=lambda name: 0.05,
+        metric_prefix="test",
+    )
+    await asyncio.sleep(0)
+
+    assert (winner, result) == ("fast", "fast")
+    assert log == ["start:slow", "start:fast", "cancel:slow"]
+    assert metrics.get_counter("test_wins", provider="fast") == 1
+    assert metrics.get_counter("test_hedges", provider="fast") == 1
+
+
+async def test_sequential_only_moves_on_after_failure():
+    """Test the sequential policy never runs two providers at once."""
+    log = []
+    winner, _ = await hedging.run_providers(
+        [_provider("a", 0.02, log, fail=True), _provider("b", 0.01, log)],
+        policy="sequential",
+    )
+
+    assert winner == "b"
+    assert log == ["start:a", "start:b"]
+
+
+async def test_race_starts_everything_and_reports_all_failures():
+    """Test race-all launches every provider and aggregates errors."""
+    log = []
+    with pytest.raises(hedging.ProvidersFailedError) as excinfo:
+        await hedging.run_providers(
+            [_provider("a", 0.01, log, fail=True), _provider("b", 0.02, log, fail=True)],
+            policy="race",
+        )
+
+    assert log == ["start:a", "start:b"]
+    assert [name for name, _ in excinfo.value.errors] == ["a", "b"]
+
+
+async def test_hedged_failure_starts_the_next_provider_immediately():
+    """Test a hedge that fails is replaced at once instead of after another hedge delay."""
+    log = []
+    started = time.perf_counter()
+    winner, _ = await hedging.run_providers(
+        [
+            _provider("slow", 1.0, log),
+            _provider("broken", 0.02, log, fail=True),
+            _provider("fast", 0.01, log),
+        ],
+        policy="hedged",
+        hedge_delay=lambda name: 0.1,
+    )
+
+    assert winner == "fast"
+    assert time.perf_counter() - started < 0.2
+    assert log[:3] == ["start:slow", "start:broken", "start:fast"]
+
+
+async def test_failures_finishing_with_the_winner_are_retrieved():
+    """Test a failure completing in the same step as the winner is reported, not leaked."""
+    unhandled = []
+    loop = asyncio.get_running_loop()
+    loop.set_exception_handler(lambda _, context: unhandled.append(context))
+    failed = []
+
+    async def broken():
+        raise RuntimeError("down")
+
+    async def ok():
+        return "ok"
+
+    try:
+        for _ in range(5):
+            winner, _ = await hedging.run_providers(
+                [("broken", broken), ("ok", ok)],
+                policy="race",
+                on_failure=lambda name, error: failed.append(name),
+            )
+            assert winner == "ok"
+        gc.collect()
+    finally:
+        loop.set_exception_handler(None)
+
+    assert failed == ["broken"] * 5
+    assert unhandled == []
@@ -0,0 +1,103 @@
+"""
+LLM Response Cache Tests
+"""
+
+from types import SimpleNamespace
+
+import pytest
+from google.genai import types
+
+from schemas.quiz import GeneratedQuiz
+from services import ai_clients, llm_cache, llm_gateway, metrics
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    llm_cache.close()
+    monkeypatch.setattr(llm_cache, "CACHE_PATH", str(tmp_path / "llm.sqlite3"))
+    monkeypatch.setattr(llm_cache, "CACHE_ENABLED", True)
+    metrics.reset()
+    yield tmp_path
+    llm_cache.close()
+
+
+def test_key_covers_prompt_version_config_and_content():
+    """Test every input that shapes the response changes the key."""
+    config = types.GenerateContentConfig(temperature=0.5)
+    base = llm_cache.make_key("quiz", "1", "gemini", config, ["texto"])
+
+    assert base == llm_cache.make_key("quiz", "1", "gemini", config, ["texto"])
+    assert base != llm_cache.make_key("quiz", "2", "gemini", config, ["texto"])
+    hotter = types.GenerateContentConfig(temperature=0.7)
+    assert base != llm_cache.make_key("quiz", "1", "gemini", hotter, ["texto"])
+    assert base != llm_cache.make_key("quiz", "1", "gemini", config, ["outro texto"])
+
+
+def test_key_covers_pydantic_response_schemas():
+    """Test configs with a Pydantic response schema can be keyed, by the schema."""
+    quiz = types.GenerateContentConfig(response_schema=GeneratedQuiz)
+    quizzes = types.GenerateContentConfig(response_schema=list[GeneratedQuiz])
+
+    key = llm_cache.make_key("quiz", "1", "gemini", quiz, ["texto"])
+
+    assert key == llm_cache.make_key("quiz", "1", "gemini", quiz, ["texto"])
+    assert key != llm_cache.make_key("quiz", "1", "gemini", quizzes, ["texto"])
+
+
+async def test_entries_survive_a_restart_and_expire_after_ttl(monkeypatch):
+    """Test entries are read back by a fresh connection and dropped once stale."""
+    await llm_cache.put("k", '{"questions": []}', "quiz")
+    llm_cache.close()  # e.g. another worker, or after a deploy
+
+    assert await llm_cache.get("k", "quiz") == '{"questions": []}'
+
+    monkeypatch.setattr(llm_cache, "TTL_SECONDS", -1)
+    assert await llm_cache.get("k", "quiz") is None
+    assert (await llm_cache.stats())["entries"] == 0
+
+
+async def test_least_recently_used_entries_are_evicted_by_size(monkeypatch):
+    """Test the store stays under MAX_CACHE_BYTES, dropping cold entries first."""
+    monkeypatch.setattr(llm_cache, "MAX_CACHE_BYTES", 250)
+    await llm_cache.put("old", "a" * 100)
+    await llm_cache.put("hot", "b" * 100)
+    await llm_cache.get("old")  # touch
+
+    await llm_cache.put("new", "c" * 100)
+
+    assert await llm_cache.get("hot") is None
+    assert await llm_cache.get("old") is not None
+    assert await llm_cache.get("new") is not None
+
+
+async def test_total_size_follows_replaced_and_evicted_entries(monkeypatch):
+    """Test the running total matches the stored entries without rescanning them."""
+    monkeypatch.setattr(llm_cache, "MAX_CACHE_BYTES", 200)
+    await llm_cache.put("a", "a" * 100)
+    await llm_cache.put("a", "a" * 40)  # replaced
+    await llm_cache.put("b", "b" * 100)
+    await llm_cache.put("c", "c" * 100)  # evicts "a"
+
+    assert metrics.snapshot()["gauges"]["llm_cache_bytes"] == 200
+    assert (await llm_cache.stats())["size_bytes"] == 200
+
+
+async def test_gateway_reads_through_the_cache(monkeypatch):
+    """Test a cached response skips Gemini and a prompt version bump misses."""
+    llm_gateway.reset()
+    calls = []
+
+    async def generate_content(model, contents, config):
+        calls.append(model)
+        return SimpleNamespace(text='{"ok": true}', usage_metadata=None)
+
+    client = SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=generate_content)))
+    monkeypatch.setattr(ai_clients, "get_gemini_client", lambda api_key=None: client)
+    config = types.GenerateContentConfig(response_mime_type="application/json")
+
+    for _ in range(3):
+        await llm_gateway.generate(["prompt"], config, purpose="quiz", cache_version="1")
+    await llm_gateway.generate(["prompt"], config, purpose="quiz", cache_version="2")
+
+    assert len(calls) == 2
+    assert metrics.get_counter("llm_cache_hits", purpose="quiz") == 2
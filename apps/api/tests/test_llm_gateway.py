@@ -0,0 +1,141 @@
+"""
+LLM Gateway Tests
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services import ai_clients, llm_gateway
+
+
+class FakeModels:
+    """Async generate_content stand-in that records calls and in-flight peaks."""
+
+    def __init__(self, failures=None, delay=0.0):
+        self.failures = failures or {}
+        self.delay = delay
+        self.calls = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def generate_content(self, model, contents, config):
+        self.calls.append(model)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if model in self.failures:
+                raise Exception(self.failures[model])
+            return SimpleNamespace(text=f"ok from {model}", usage_metadata=None)
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    llm_gateway.reset()
+    models = FakeModels()
+    client = SimpleNamespace(aio=SimpleNamespace(models=models))
+    monkeypatch.setattr(ai_clients, "get_gemini_client", lambda api_key=None: client)
+    yield models
+    llm_gateway.reset()
+
+
+async def test_quota_errors_fall_back_to_the_next_model(fake_models):
+    """Test a 429 moves on to the next model and other errors are raised."""
+    fake_models.failures = {"a": "429 RESOURCE_EXHAUSTED"}
+    assert await llm_gateway.generate(["hi"], models=["a", "b"]) == "ok from b"
+
+    fake_models.failures = {"c": "400 INVALID_ARGUMENT"}
+    with pytest.raises(Exception, match="INVALID_ARGUMENT"):
+        await llm_gateway.generate(["hi"], models=["c", "d"])
+
+    fake_models.failures = {"e": "429", "f": "404 NOT_FOUND"}
+    with pytest.raises(llm_gateway.AllModelsFailedError):
+        await llm_gateway.generate(["hi"], models=["e", "f"])
+
+
+async def test_cooled_down_model_is_skipped_by_later_calls(fake_models):
+    """Test only the first call pays for the exhausted model."""
+    fake_models.failures = {"a": "429 RESOURCE_EXHAUSTED. 'retryDelay': '40s'"}
+
+    for _ in range(5):
+        await llm_gateway.generate(["hi"], models=["a", "b"])
+
+    assert fake_models.calls == ["a", "b", "b", "b", "b", "b"]
+    assert llm_gateway.router.snapshot(["a", "b"])["models"]["a"]["retry_in_seconds"] > 35
+
+
+async def test_concurrency_is_capped_per_model(fake_models, monkeypatch):
+    """Test no more than MODEL_CONCURRENCY requests run on one model at once."""
+    monkeypatch.setattr(llm_gateway, "MODEL_CONCURRENCY", 2)
+    fake_models.delay = 0.05
+
+    await asyncio.gather(*(llm_gateway.generate(["hi"], models=["a"]) for _ in range(6)))
+
+    assert fake_models.peak == 2
+    assert len(fake_models.calls) == 6
+
+
+async def test_bursts_are_spread_over_models_instead_of_hitting_429(fake_models, monkeypatch):
+    """Test requests beyond a model's per-minute budget go to the next model."""
+    monkeypatch.setattr(llm_gateway, "REQUESTS_PER_MINUTE", 2)
+
+    await asyncio.gather(*(llm_gateway.generate(["hi"], models=["a", "b"]) for _ in range(4)))
+
+    assert sorted(fake_models.calls) == ["a", "a", "b", "b"]
+
+
+async def test_requests_fail_when_capacity_is_not_back_before_the_deadline(fake_models, monkeypatch):
+    """Test a queued request gives up at its deadline instead of waiting a minute."""
+    monkeypatch.setattr(llm_gateway, "REQUESTS_PER_MINUTE", 1)
+    await llm_gateway.generate(["hi"], models=["a"])
+
+    with pytest.raises(llm_gateway.LLMDeadlineError):
+        await llm_gateway.generate(["hi"], models=["a"], deadline_seconds=0.5)
+
+
+async def test_slot_timeouts_do_not_spend_rate_limit_capacity(fake_models, monkeypatch):
+    """Test a request that never got a slot leaves the model's request budget alone."""
+    monkeypatch.setattr(llm_gateway, "MODEL_CONCURRENCY", 1)
+    fake_models.delay = 0.3
+    running = asyncio.create_task(llm_gateway.generate(["hi"], models=["a"]))
+    await asyncio.sleep(0.05)
+
+    with pytest.raises(llm_gateway.LLMDeadlineError):
+        await llm_gateway.generate(["hi"], models=["a"], deadline_seconds=0.1)
+    await running
+
+    requests = llm_gateway._model_limits("a").requests
+    assert requests.capacity - requests.level == pytest.approx(1, abs=0.1)
+
+
+async def test_probe_failing_with_any_error_cools_the_model_down_again(fake_models):
+    """Test a probe that fails with a non-quota error does not leave the model stuck probing."""
+    fake_models.failures = {"a": "429 RESOURCE_EXHAUSTED. 'retryDelay': '0s'"}
+    await llm_gateway.generate(["hi"], models=["a", "b"])
+
+    fake_models.failures = {"a": "500 INTERNAL"}
+    with pytest.raises(Exception, match="INTERNAL"):
+        await llm_gateway.generate(["hi"], models=["a", "b"])
+
+    route = llm_gateway.router.get("a")
+    assert route.state == "cooling"
+    assert not route.probe_in_flight
+
+
+def test_token_bucket_refills_over_time():
+    """Test the bucket reports the wait for missing tokens and refills at its rate."""
+    now = [0.0]
+    bucket = llm_gateway.TokenBucket(60, clock=lambda: now[0])
+
+    bucket.take(60)
+    assert bucket.wait_time(30) == pytest.approx(30)
+
+    now[0] = 30
+    assert bucket.wait_time(30) == 0
+
+    bucket.adjust(-100)
+    assert bucket.level == 60
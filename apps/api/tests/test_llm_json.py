@@ -0,0 +1,67 @@
+"""
+Tolerant LLM JSON Decoder Tests
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from schemas.quiz import QuizQuestion
+from services import ai_clients, llm_gateway, llm_json, metrics
+
+
+def test_valid_and_fenced_json_decode_without_repair():
+    """Test plain JSON and Markdown-fenced JSON parse as-is."""
+    assert llm_json.decode('{"a": [1, 2]}') == ({"a": [1, 2]}, False)
+    assert llm_json.decode('```json\n[{"a": 1}]\n```') == ([{"a": 1}], False)
+
+
+def test_truncated_output_keeps_its_complete_members():
+    """Test output cut off by max_output_tokens salvages everything that was finished."""
+    text = '{"questions": [{"id": "q1", "question": "Oi?"}, {"id": "q2", "question": "Tchau'
+
+    value, repaired = llm_json.decode(text)
+
+    assert repaired
+    assert value == {"questions": [{"id": "q1", "question": "Oi?"}, {"id": "q2"}]}
+
+
+def test_trailing_commas_and_brackets_inside_strings_are_handled():
+    """Test the scanner ignores brackets in strings and drops dangling commas."""
+    value, repaired = llm_json.decode('[{"text": "a ] b, {c"}, {"text": "d"},]')
+
+    assert repaired
+    assert value == [{"text": "a ] b, {c"}, {"text": "d"}]
+
+    with pytest.raises(llm_json.LLMJSONError):
+        llm_json.decode("Desculpe, não consigo ajudar.")
+
+
+def test_invalid_items_are_dropped_individually():
+    """Test one malformed question does not cost the valid ones."""
+    items = [
+        {"id": "q1", "question": "Oi?", "options": ["a", "b"], "correctAnswer": 0},
+        {"id": "q2", "question": "Sem opções"},
+    ]
+
+    assert [q["id"] for q in llm_json.validate_items(items, QuizQuestion)] == ["q1"]
+
+
+async def test_parse_outcomes_are_tracked_per_model(monkeypatch):
+    """Test generate_json repairs output and records the parse-failure rate per model."""
+    llm_gateway.reset()
+    metrics.reset()
+    replies = iter(['[{"a": 1}, {"a": 2', "não é JSON"])
+
+    async def generate_content(model, contents, config):
+        return SimpleNamespace(text=next(replies), usage_metadata=None)
+
+    client = SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=generate_content)))
+    monkeypatch.setattr(ai_clients, "get_gemini_client", lambda api_key=None: client)
+
+    assert await llm_gateway.generate_json(["x"], models=["m"]) == [{"a": 1}]
+    with pytest.raises(llm_json.LLMJSONError):
+        await llm_gateway.generate_json(["x"], models=["m"])
+
+    assert metrics.get_counter("llm_parse_results", model="m", purpose="default", outcome="repaired") == 1
+    assert llm_gateway.router.snapshot(["m"])["models"]["m"]["parse_failure_rate"] == 0.5
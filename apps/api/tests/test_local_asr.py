@@ -0,0 +1,64 @@
+"""
+Local ASR Tests
+"""
+
+import os
+
+import pytest
+
+from services import executors, local_asr, provider_health, transcription_service
+from services.media_pipeline import ExtractedAudio, pcm_to_wav
+
+
+@pytest.fixture(autouse=True)
+def fresh_pools():
+    executors.shutdown()
+    yield
+    executors.shutdown(wait=True)
+
+
+def fake_recognize(source, start_s, end_s, model_path):
+    """Stands in for the Vosk model: one segment per chunk, tagged with the worker pid."""
+    return {
+        "transcript": f"chunk {os.getpid()}",
+        "segments": [{"start": 0.5, "end": 1.0, "text": f"chunk {os.getpid()}"}],
+        "language": "pt-BR",
+        "provider": "local",
+    }
+
+
+async def test_chunks_are_recognized_in_worker_processes(monkeypatch, tmp_path):
+    """Test chunks run outside the API process and land on the right offsets."""
+    monkeypatch.setattr(local_asr, "recognize_range", fake_recognize)
+    monkeypatch.setattr(local_asr, "CHUNK_SECONDS", 2)
+    monkeypatch.setitem(executors.PROCESS_POOL_SIZES, "local_asr", 2)
+    wav = tmp_path / "lecture.wav"
+    wav.write_bytes(pcm_to_wav(b"\x00" * 32000 * 7))
+
+    result = await local_asr.transcribe(str(wav))
+
+    assert [segment["start"] for segment in result["segments"]] == [0.5, 1.5, 3.5, 5.5]
+    assert f"chunk {os.getpid()}" not in result["transcript"]
+    assert result["provider"] == "local"
+
+
+async def test_local_tier_is_the_fallback_when_hosted_providers_fail(monkeypatch):
+    """Test the chain falls through to the local model when Gemini fails."""
+    async def gemini_down(audio, profile):
+        raise Exception("503 UNAVAILABLE")
+
+    async def local_ok(audio, profile):
+        return {"transcript": "olá", "segments": [], "provider": "local"}
+
+    monkeypatch.setattr(transcription_service, "PROVIDER_ORDER", ["gemini", "local"])
+    monkeypatch.setattr(transcription_service, "configured_providers", lambda: ["gemini", "local"])
+    monkeypatch.setattr(transcription_service, "transcribe_with_gemini", gemini_down)
+    monkeypatch.setattr(transcription_service, "transcribe_with_local", local_ok)
+    monkeypatch.setattr(
+        transcription_service, "provider_health", provider_health.ProviderHealthRegistry()
+    )
+
+    audio = ExtractedAudio.from_bytes({"wav": pcm_to_wav(b"\x00" * 3200)})
+    result = await transcription_service.transcribe_audio(audio)
+
+    assert result["provider"] == "local"
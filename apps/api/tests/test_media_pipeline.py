@@ -0,0 +1,186 @@
+"""
+Media Pipeline Tests
+"""
+
+import asyncio
+import os
+import shutil
+import tracemalloc
+import wave
+
+from services import audio_segmentation, llm_gateway, media_pipeline, transcription_service
+from services.audio_segmentation import OffsetMap
+from services.media_pipeline import ExtractedAudio, pcm_to_wav
+
+
+def test_pcm_to_wav_reports_duration():
+    """Test raw PCM from the ffmpeg pipe is wrapped with a correct header."""
+    audio = ExtractedAudio.from_bytes({"wav": pcm_to_wav(b"\x00" * 32000 * 3)})
+
+    assert audio.duration == 3.0
+    audio.close()
+    assert not os.path.exists(audio.directory)
+
+
+async def test_missing_encoding_is_transcoded_once(monkeypatch):
+    """Test concurrent fallbacks share a single transcode per format."""
+    calls = []
+
+    async def fake_transcode(wav_path, fmt, directory):
+        calls.append(fmt)
+        await asyncio.sleep(0.01)
+        path = media_pipeline.encoding_path(directory, fmt)
+        with open(path, "wb") as f:
+            f.write(b"mp3-bytes")
+        return path
+
+    monkeypatch.setattr(media_pipeline, "transcode", fake_transcode)
+    audio = ExtractedAudio.from_bytes({"wav": pcm_to_wav(b"\x00" * 320)})
+
+    results = await asyncio.gather(audio.get("mp3"), audio.get("mp3"))
+
+    assert results == [b"mp3-bytes", b"mp3-bytes"]
+    assert await audio.get("mp3") == b"mp3-bytes"
+    assert calls == ["mp3"]
+
+
+async def test_extraction_produces_each_provider_encoding(monkeypatch):
+    """Test configured providers' encodings come from the extraction pass."""
+    requested = []
+
+    async def fake_extract(video_path, directory, formats, sample_rate=16000):
+        requested.extend(formats)
+        with open(media_pipeline.encoding_path(directory, "wav"), "wb") as f:
+            f.write(pcm_to_wav(b"\x00" * 320))
+
+    monkeypatch.setattr(media_pipeline, "extract_audio", fake_extract)
+    monkeypatch.setattr(
+        transcription_service, "configured_providers", lambda: ["google_cloud", "gemini"]
+    )
+    monkeypatch.setattr(transcription_service, "CHUNKING_MODE", "auto")
+
+    audio = await media_pipeline.extract_for_transcription(
+        "video.mp4", transcription_service.extraction_formats()
+    )
+    audio.close()
+
+    assert requested == ["wav", "flac", "opus"]
+
+
+async def test_gemini_receives_compressed_audio_with_matching_mime(monkeypatch):
+    """Test Gemini gets the cached Opus encoding labelled audio/ogg, not WAV."""
+    sent = {}
+
+    async def fake_generate(contents, config, **kwargs):
+        sent["part"] = contents[0].parts[0]
+        return {"transcript": "oi", "segments": []}
+
+    monkeypatch.setattr(transcription_service, "GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(llm_gateway, "generate_json", fake_generate)
+    audio = ExtractedAudio.from_bytes({"wav": pcm_to_wav(b"\x00" * 3200), "opus": b"OggS-opus"})
+
+    result = await transcription_service.transcribe_with_gemini(audio)
+
+    assert result["provider"] == "gemini"
+    assert sent["part"].inline_data.data == b"OggS-opus"
+    assert sent["part"].inline_data.mime_type == "audio/ogg"
+
+
+async def test_trimmed_job_encodes_the_trimmed_audio(monkeypatch):
+    """Test a trimmed job decodes only the WAV, then encodes the trimmed WAV in one pass."""
+    commands = []
+
+    class FakeProcess:
+        returncode = 0
+
+        async def communicate(self, input=None):
+            return b"", b""
+
+    async def fake_exec(*cmd, **kwargs):
+        commands.append(cmd)
+        for arg in cmd:
+            if arg.endswith(".part"):
+                with open(arg, "wb") as f:
+                    f.write(pcm_to_wav(b"\x00" * 3200) if arg.endswith(".wav.part") else b"extra")
+        return FakeProcess()
+
+    trimmed_wav = pcm_to_wav(b"\x00" * 1600)
+    offset_map = OffsetMap([(0.0, 0.0)], original_duration=0.1, trimmed_duration=0.05)
+    transcribed = {}
+
+    def fake_trim(source, target):
+        with open(target, "wb") as f:
+            f.write(trimmed_wav)
+        return offset_map
+
+    async def fake_transcribe(audio, profile="accurate"):
+        transcribed["audio"] = audio
+        transcribed["wav"] = await audio.get("wav")
+        transcribed["formats"] = [fmt for fmt in ("flac", "opus") if audio.has(fmt)]
+        return {"transcript": "oi", "segments": []}
+
+    monkeypatch.setattr(media_pipeline.asyncio, "create_subprocess_exec", fake_exec)
+    monkeypatch.setattr(audio_segmentation, "trim_silence", fake_trim)
+    monkeypatch.setattr(
+        transcription_service, "configured_providers", lambda: ["google_cloud", "gemini"]
+    )
+    monkeypatch.setitem(transcription_service.PROFILES["accurate"], "trim_silence", True)
+    monkeypatch.setitem(transcription_service.PROFILES["accurate"], "chunking", "auto")
+    monkeypatch.setattr(transcription_service, "transcribe_audio", fake_transcribe)
+
+    await transcription_service.transcribe_video("video.mp4")
+
+    assert len(commands) == 2
+    assert "video.mp4" in commands[0] and "flac" not in commands[0]
+    assert "flac" in commands[1] and "libopus" in commands[1]
+    assert transcribed["audio"].path("wav") in commands[1]
+    assert transcribed["wav"] == trimmed_wav
+    assert transcribed["formats"] == ["flac", "opus"]
+    assert not os.path.exists(transcribed["audio"].directory)
+
+
+async def test_long_lecture_is_transcribed_in_bounded_memory(tmp_path, monkeypatch):
+    """Test a 20-minute lecture never has more than a few chunks of audio in memory."""
+    lecture = tmp_path / "lecture.wav"
+    with wave.open(str(lecture), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        for _ in range(20 * 60):
+            wav.writeframes(b"\x00" * 32000)
+    wav_size = lecture.stat().st_size
+
+    async def fake_extract(video_path, directory, formats, sample_rate=16000):
+        shutil.copyfile(lecture, media_pipeline.encoding_path(directory, "wav"))
+
+    async def fake_encode(wav_path, formats, directory):
+        for fmt in formats:
+            with open(media_pipeline.encoding_path(directory, fmt), "wb") as f:
+                f.write(b"OggS-opus")
+
+    chunk_bytes = []
+
+    async def fake_transcribe(audio, profile="accurate"):
+        data = await audio.get("wav")
+        chunk_bytes.append(len(data))
+        return {"transcript": "oi", "segments": [{"start": 0.0, "end": 1.0, "text": "oi"}]}
+
+    monkeypatch.setattr(media_pipeline, "extract_audio", fake_extract)
+    monkeypatch.setattr(media_pipeline, "encode_wav", fake_encode)
+    monkeypatch.setattr(transcription_service, "configured_providers", lambda: ["gemini"])
+    monkeypatch.setattr(transcription_service, "CHUNK_SECONDS", 60)
+    monkeypatch.setattr(transcription_service, "CHUNK_CONCURRENCY", 2)
+    monkeypatch.setitem(transcription_service.PROFILES["accurate"], "trim_silence", True)
+    monkeypatch.setitem(transcription_service.PROFILES["accurate"], "chunking", "always")
+    monkeypatch.setattr(transcription_service, "transcribe_audio", fake_transcribe)
+
+    tracemalloc.start()
+    try:
+        result = await transcription_service.transcribe_video("video.mp4")
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert result["chunks"] == 20
+    assert sum(chunk_bytes) >= wav_size
+    assert peak < wav_size / 4
@@ -0,0 +1,85 @@
+"""
+Model Routing Tests
+"""
+
+from services.model_routing import AVAILABLE, COOLING, PROBING, ModelRouter, retry_after_seconds
+
+MODELS = ["flash", "flash-lite", "pro"]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_quota_error_cools_down_then_probes_ahead_of_the_sticky_model():
+    """Test the cooling -> probing -> available cycle and sticky preference."""
+    clock = FakeClock()
+    router = ModelRouter(quota_cooldown_seconds=30, clock=clock)
+
+    router.record_quota_error("flash")
+    router.record_success("flash-lite", 1.0)
+    assert router.get("flash").state == COOLING
+    assert router.order(MODELS) == ["flash-lite", "pro"]
+
+    clock.now = 31
+    assert router.order(MODELS) == ["flash", "flash-lite", "pro"]
+    assert router.allow("flash") is True
+    assert router.get("flash").state == PROBING
+    assert router.order(MODELS) == ["flash-lite", "pro"]  # one probe at a time
+
+    router.record_success("flash", 0.5)
+    assert router.get("flash").state == AVAILABLE
+    assert router.sticky == "flash"
+
+
+def test_repeated_quota_errors_double_the_cooldown_unless_retry_after_is_given():
+    """Test exponential cooldowns and that Retry-After wins."""
+    clock = FakeClock()
+    router = ModelRouter(quota_cooldown_seconds=10, clock=clock)
+
+    router.record_quota_error("flash")
+    clock.now = 11
+    router.record_quota_error("flash")
+    assert router.get("flash").cooldown_until == 31
+
+    router.record_quota_error("pro", retry_after=7)
+    assert router.get("pro").cooldown_until == 18
+
+
+def test_waiting_on_a_probe_in_flight_is_not_a_busy_loop():
+    """Test callers back off while the only model left is being probed by another call."""
+    clock = FakeClock()
+    router = ModelRouter(quota_cooldown_seconds=30, probe_poll_seconds=0.25, clock=clock)
+    router.record_quota_error("flash")
+    assert router.next_available_in(["flash"]) == 30
+
+    clock.now = 31
+    assert router.allow("flash") is True
+    assert router.order(["flash"]) == []
+    assert router.next_available_in(["flash"]) == 0.25
+
+    router.record_success("flash", 0.5)
+    assert router.next_available_in(["flash"]) == 0.0
+
+
+def test_sticky_model_leads_and_fallbacks_are_ordered_by_latency():
+    """Test the last working model stays first and known-fast fallbacks come next."""
+    router = ModelRouter(clock=FakeClock())
+    router.record_success("pro", 0.5)
+    router.record_success("flash-lite", 3.0)
+
+    assert router.order(MODELS) == ["flash-lite", "pro", "flash"]
+
+
+def test_retry_after_is_read_from_the_error_details():
+    """Test the RetryInfo delay in a RESOURCE_EXHAUSTED error is honored."""
+    error = Exception(
+        "429 RESOURCE_EXHAUSTED. {'error': {'details': [{'@type': "
+        "'type.googleapis.com/google.rpc.RetryInfo', 'retryDelay': '37s'}]}}"
+    )
+    assert retry_after_seconds(error) == 37
+    assert retry_after_seconds(Exception("429")) is None
@@ -0,0 +1,76 @@
+"""
+Prompt Budget Tests
+"""
+
+from types import SimpleNamespace
+
+from services import prompt_budget
+
+
+def _lecture(parts: int) -> str:
+    """A long transcript whose parts each talk about a distinct topic."""
+    return " ".join(
+        f"Agora falamos sobre o tema{i} e sua aplicacao{i} pratica. " * 30 for i in range(parts)
+    )
+
+
+def test_short_text_is_returned_unchanged():
+    """Test text within budget is kept (whitespace normalized only)."""
+    assert prompt_budget.fit_text("Uma aula  curta\nsobre grafos.", 100) == "Uma aula curta sobre grafos."
+    assert prompt_budget.fit_text("", 100) == ""
+
+
+def test_long_text_fits_budget_and_covers_the_whole_lecture():
+    """Test sampling respects the budget and keeps the start, middle and end."""
+    text = _lecture(10)
+    budget = 600
+
+    fitted = prompt_budget.fit_text(text, budget)
+
+    assert prompt_budget.count_tokens(fitted) <= budget
+    assert prompt_budget.count_tokens(text) > budget
+    for topic in ("tema0", "tema5", "tema9"):
+        assert topic in fitted
+    assert "[...]" in fitted
+
+
+def test_section_budget_subtracts_template_and_output():
+    """Test the budget is capped by the section limit and by the context left."""
+    models = ["unknown-model"]
+    context = prompt_budget.DEFAULT_CONTEXT_TOKENS
+    template = "x" * 700  # 200 tokens
+
+    assert prompt_budget.section_budget("checkpoint_segment", template, 1024, models) == (
+        prompt_budget.SECTION_BUDGETS["checkpoint_segment"]
+    )
+    assert prompt_budget.section_budget(
+        "quiz_transcript", template, context - 1000, models
+    ) == 800
+    assert prompt_budget.section_budget(
+        "quiz_transcript", template, context - 1000, models, parts=4
+    ) == 200
+
+
+async def test_tokenizers_are_only_used_once_preloaded(monkeypatch):
+    """Test counting never loads a tokenizer; preload() does, off the event loop."""
+    loaded = []
+
+    class FakeTokenizer:
+        def __init__(self, model_name):
+            loaded.append(model_name)
+
+        def count_tokens(self, text):
+            return SimpleNamespace(total_tokens=len(text.split()))
+
+    monkeypatch.setattr(prompt_budget, "LOCAL_TOKENIZER_AVAILABLE", True)
+    monkeypatch.setattr(prompt_budget, "LocalTokenizer", FakeTokenizer, raising=False)
+    monkeypatch.setattr(prompt_budget, "_tokenizers", {})
+    text = "uma aula sobre grafos e caminhos mínimos"
+
+    assert prompt_budget.count_tokens(text, "gemini-2.0-flash") == 12  # estimate
+    assert loaded == []
+
+    await prompt_budget.preload(["gemini-2.0-flash", "gemini-2.0-flash"])
+
+    assert loaded == ["gemini-2.0-flash"]
+    assert prompt_budget.count_tokens(text, "gemini-2.0-flash") == 7
@@ -0,0 +1,87 @@
+"""
+Provider Health Registry Tests
+"""
+
+import httpx
+
+from services.provider_health import CLOSED, HALF_OPEN, OPEN, ProviderHealthRegistry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_then_probes_then_closes():
+    """Test the closed -> open -> half-open -> closed cycle."""
+    clock = FakeClock()
+    registry = ProviderHealthRegistry(failure_threshold=2, cooldown_seconds=30, clock=clock)
+
+    registry.record_failure("google_cloud")
+    registry.record_failure("google_cloud")
+    assert registry.get("google_cloud").state == OPEN
+    assert registry.order(["google_cloud", "gemini"]) == ["gemini"]
+
+    clock.now = 31
+    assert registry.order(["google_cloud", "gemini"]) == ["gemini", "google_cloud"]
+    assert registry.allow("google_cloud") is True
+    assert registry.get("google_cloud").state == HALF_OPEN
+    assert registry.allow("google_cloud") is False  # only one probe at a time
+
+    registry.record_success("google_cloud", 2.0)
+    assert registry.get("google_cloud").state == CLOSED
+
+
+def test_failed_probe_reopens_with_longer_cooldown():
+    """Test a failing probe doubles the cooldown."""
+    clock = FakeClock()
+    registry = ProviderHealthRegistry(failure_threshold=1, cooldown_seconds=10, clock=clock)
+
+    registry.record_failure("assemblyai")
+    clock.now = 11
+    assert registry.allow("assemblyai")
+    registry.record_failure("assemblyai")
+
+    health = registry.get("assemblyai")
+    assert health.state == OPEN
+    assert health.cooldown_seconds == 20
+
+
+def test_only_provider_faults_open_the_breaker():
+    """Test bad-input errors are ignored while timeouts, 5xx and 429 count."""
+    clock = FakeClock()
+    registry = ProviderHealthRegistry(failure_threshold=2, cooldown_seconds=10, clock=clock)
+
+    for _ in range(5):
+        registry.record_failure("gemini", Exception("400 INVALID_ARGUMENT: corrupt audio"))
+    assert registry.get("gemini").state == CLOSED
+    assert registry.get("gemini").consecutive_failures == 0
+
+    registry.record_failure("gemini", httpx.ConnectTimeout("connect timed out"))
+    registry.record_failure("gemini", Exception("503 UNAVAILABLE"))
+    assert registry.get("gemini").state == OPEN
+
+    # A probe rejected for its input is released rather than reopening the breaker
+    clock.now = 11
+    assert registry.allow("gemini")
+    registry.record_failure("gemini", ValueError("No audio track found in video"))
+    assert registry.get("gemini").state == HALF_OPEN
+    assert registry.allow("gemini")
+    registry.record_failure("gemini", TimeoutError())
+    assert registry.get("gemini").state == OPEN
+
+
+def test_order_prefers_fastest_healthy_provider():
+    """Test providers with a lower real-time factor move to the front."""
+    registry = ProviderHealthRegistry()
+    registry.record_success("google_cloud", 60.0, audio_seconds=100.0)
+    registry.record_success("assemblyai", 20.0, audio_seconds=100.0)
+
+    assert registry.order(["google_cloud", "assemblyai", "gemini"]) == [
+        "assemblyai",
+        "google_cloud",
+        "gemini",
+    ]
@@ -0,0 +1,66 @@
+"""
+Single-Flight Coalescing Tests
+"""
+
+import asyncio
+
+import pytest
+
+from routers import assessment
+from services import metrics, single_flight
+
+
+async def test_concurrent_checkpoint_requests_share_one_generation(monkeypatch):
+    """Test 40 students opening the same video trigger a single Gemini generation."""
+    calls = []
+
+    async def fake_generate(transcript, duration_seconds, video_id):
+        calls.append(video_id)
+        await asyncio.sleep(0.05)
+        return [f"checkpoint for {video_id}"]
+
+    monkeypatch.setattr(assessment, "ai_generate_checkpoints", fake_generate)
+    monkeypatch.setattr(assessment, "generated_checkpoints_cache", {})
+    metrics.reset()
+
+    transcripts = ["aula sobre variáveis", "  aula  sobre\nvariáveis "]
+    requests = [
+        assessment.GenerateCheckpointsRequest(
+            video_id="vid-1", duration_seconds=600, transcript=transcripts[i % 2]
+        )
+        for i in range(40)
+    ]
+    results = await asyncio.gather(*(assessment.generate_ai_checkpoints(r) for r in requests))
+
+    assert len(calls) == 1
+    assert all(result == ["checkpoint for vid-1"] for result in results)
+    assert metrics.get_counter("single_flight_requests", kind="checkpoints", role="coalesced") == 39
+    assert assessment.checkpoint_flights.in_flight() == 0
+
+
+async def test_errors_are_shared_and_leader_cancellation_does_not_cancel_followers():
+    """Test followers get the leader's exception and survive the leader going away."""
+    flights = single_flight.SingleFlight("test")
+    release = asyncio.Event()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await release.wait()
+        return "done"
+
+    leader = asyncio.ensure_future(flights.do("k", work))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(flights.do("k", work))
+    await asyncio.sleep(0)
+    leader.cancel()
+    release.set()
+
+    assert await follower == "done"
+    assert calls == [1]
+
+    async def fail():
+        raise ValueError("quota")
+
+    with pytest.raises(ValueError):
+        await asyncio.gather(flights.do("e", fail), flights.do("e", fail))
@@ -0,0 +1,123 @@
+"""
+Streaming Transcription Tests
+
+Runs streaming recognition against a local fake Speech gRPC server.
+"""
+
+import asyncio
+import datetime
+import math
+import struct
+import time
+from concurrent import futures
+
+import grpc
+import pytest
+from google.cloud import speech
+
+from services import ai_clients, media_pipeline, metrics, streaming_transcription
+
+SECOND = streaming_transcription.BYTES_PER_SECOND
+TONE = b"".join(
+    struct.pack("<h", int(8000 * math.sin(2 * math.pi * 440 * i / 16000))) for i in range(16000)
+)
+
+
+class FakeSpeechServer:
+    """Emits one final result per second of audio received on each stream."""
+
+    def __init__(self):
+        self.streams = []
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+        handler = grpc.stream_stream_rpc_method_handler(
+            self.streaming_recognize,
+            request_deserializer=speech.StreamingRecognizeRequest.deserialize,
+            response_serializer=speech.StreamingRecognizeResponse.serialize,
+        )
+        self.server.add_generic_rpc_handlers([
+            grpc.method_handlers_generic_handler(
+                "google.cloud.speech.v1.Speech", {"StreamingRecognize": handler}
+            )
+        ])
+        self.port = self.server.add_insecure_port("127.0.0.1:0")
+
+    def streaming_recognize(self, requests, context):
+        received = 0
+        stream = len(self.streams)
+        self.streams.append(0)
+        for request in requests:
+            if "streaming_config" in request:
+                continue
+            before = received // SECOND
+            received += len(request.audio_content)
+            self.streams[stream] = received
+            for second in range(before, received // SECOND):
+                word = speech.WordInfo(
+                    word=f"w{stream}.{second}",
+                    start_time=datetime.timedelta(seconds=second + 0.1),
+                    end_time=datetime.timedelta(seconds=second + 0.9),
+                )
+                yield speech.StreamingRecognizeResponse(results=[
+                    speech.StreamingRecognitionResult(
+                        is_final=True,
+                        alternatives=[speech.SpeechRecognitionAlternative(
+                            transcript=word.word, words=[word]
+                        )],
+                    )
+                ])
+
+
+@pytest.fixture
+async def fake_speech(monkeypatch):
+    fake = FakeSpeechServer()
+    fake.server.start()
+    await ai_clients.close_clients()
+    monkeypatch.setattr(ai_clients, "SPEECH_EMULATOR_HOST", f"127.0.0.1:{fake.port}")
+    yield fake
+    await ai_clients.close_clients()
+    fake.server.stop(None)
+
+
+def fake_decoder(seconds: int, delay: float, progress: dict):
+    """stream_pcm stand-in that decodes one second of audio every delay seconds."""
+
+    async def stream_pcm(video_path, read_size=media_pipeline.PCM_READ_SIZE):
+        for _ in range(seconds):
+            await asyncio.sleep(delay)
+            yield TONE
+        progress["finished_at"] = time.perf_counter()
+
+    return stream_pcm
+
+
+async def test_segments_arrive_before_decoding_finishes(fake_speech, monkeypatch):
+    """Test the first segment is emitted while ffmpeg is still decoding."""
+    progress = {}
+    monkeypatch.setattr(media_pipeline, "stream_pcm", fake_decoder(5, 0.1, progress))
+    metrics.reset()
+    arrivals = []
+
+    result = await streaming_transcription.transcribe_video_streaming(
+        "lecture.mp4", on_segment=lambda segment: arrivals.append(time.perf_counter())
+    )
+
+    assert [segment["text"] for segment in result["segments"]] == [
+        "w0.0", "w0.1", "w0.2", "w0.3", "w0.4"
+    ]
+    assert arrivals[0] < progress["finished_at"]
+    assert metrics.percentile("transcription_stream_first_segment_seconds", 50) < 0.5
+
+
+async def test_long_audio_is_split_into_streams_with_offsets(fake_speech, monkeypatch):
+    """Test each gRPC stream is limited and its times land on the video timeline."""
+    monkeypatch.setattr(media_pipeline, "stream_pcm", fake_decoder(5, 0, {}))
+    monkeypatch.setattr(streaming_transcription, "STREAM_SECONDS", 2)
+    monkeypatch.setattr(streaming_transcription, "STREAM_CUT_SEARCH_SECONDS", 0)
+
+    segments = [segment async for segment in streaming_transcription.iter_segments("lecture.mp4")]
+
+    assert fake_speech.streams == [2 * SECOND, 2 * SECOND, SECOND]
+    assert [segment["text"] for segment in segments] == [
+        "w0.0", "w0.1", "w1.0", "w1.1", "w2.0"
+    ]
+    assert [segment["start"] for segment in segments] == [0.1, 1.1, 2.1, 3.1, 4.1]
@@ -0,0 +1,109 @@
+"""
+Transcript Cache Tests
+"""
+
+import os
+import threading
+
+import pytest
+
+from services import media_pipeline, metrics, transcript_cache, transcription_service
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """Point the cache at a temp dir and start with clean metrics."""
+    monkeypatch.setattr(transcript_cache, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(transcript_cache, "CACHE_ENABLED", True)
+    metrics.reset()
+    yield tmp_path
+
+
+def test_key_depends_on_settings():
+    """Test the same media with different settings gets a different key."""
+    a = transcript_cache.make_key("abc", {"language": "pt-BR"})
+    b = transcript_cache.make_key("abc", {"language": "en-US"})
+
+    assert a != b
+    assert a == transcript_cache.make_key("abc", {"language": "pt-BR"})
+
+
+async def test_put_then_get_counts_hit_and_bytes_saved():
+    """Test stored transcripts are returned and counted as hits."""
+    result = {"transcript": "olá", "segments": [], "duration": 0, "provider": "gemini"}
+    await transcript_cache.put("k1", result)
+
+    assert await transcript_cache.get("missing") is None
+    assert await transcript_cache.get("k1", media_bytes=1000) == result
+
+    stats = await transcript_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["bytes_saved"] == 1000
+
+
+async def test_eviction_removes_least_recently_used(isolated_cache, monkeypatch):
+    """Test the store stays within its size bound, dropping the oldest entry."""
+    monkeypatch.setattr(transcript_cache, "MAX_CACHE_BYTES", 250)
+    payload = {"transcript": "x" * 100}
+
+    await transcript_cache.put("old", payload)
+    os.utime(isolated_cache / "old.json", (1, 1))
+    await transcript_cache.put("new", payload)
+    await transcript_cache.put("newer", payload)
+
+    assert not (isolated_cache / "old.json").exists()
+    assert (isolated_cache / "newer.json").exists()
+
+
+async def test_puts_keep_a_running_total_instead_of_listing_the_store(monkeypatch):
+    """Test only the first write (and evictions) recount the store, never on the event loop."""
+    scans = []
+    entries = transcript_cache._entries
+
+    def counted_entries():
+        scans.append(threading.current_thread())
+        return entries()
+
+    monkeypatch.setattr(transcript_cache, "_entries", counted_entries)
+    payload = {"transcript": "x" * 100}
+
+    for key in ("a", "b", "c", "a"):
+        await transcript_cache.put(key, payload)
+
+    assert len(scans) == 1
+    stats = await transcript_cache.stats()
+    assert metrics.snapshot()["gauges"]["transcript_cache_bytes"] == stats["size_bytes"]
+    assert stats["entries"] == 3
+    assert threading.main_thread() not in scans
+
+
+async def test_transcribe_video_serves_cache_hit_without_providers(monkeypatch):
+    """Test a cache hit never reaches audio extraction."""
+    result = {"transcript": "aula", "segments": [], "duration": 1.0, "provider": "gemini"}
+    key = transcript_cache.make_key("deadbeef", transcription_service.transcription_settings())
+    await transcript_cache.put(key, result)
+
+    async def fail_extract(*args, **kwargs):
+        raise AssertionError("audio extraction should not run on a cache hit")
+
+    monkeypatch.setattr(media_pipeline, "extract_for_transcription", fail_extract)
+
+    assert await transcription_service.transcribe_video("unused.mp4", content_hash="deadbeef") == result
+
+
+async def test_fast_profile_is_served_the_accurate_transcript_once_cached(monkeypatch):
+    """Test a finished accurate transcript replaces the fast preview."""
+    accurate = {"transcript": "aula completa", "segments": [], "profile": "accurate"}
+    key = transcript_cache.make_key("deadbeef", transcription_service.transcription_settings())
+    await transcript_cache.put(key, accurate)
+
+    async def fail_extract(*args, **kwargs):
+        raise AssertionError("audio extraction should not run on a cache hit")
+
+    monkeypatch.setattr(media_pipeline, "extract_for_transcription", fail_extract)
+
+    result = await transcription_service.transcribe_video(
+        "unused.mp4", content_hash="deadbeef", profile="fast"
+    )
+    assert result == accurate
@@ -0,0 +1,93 @@
+"""
+Transcript Digest Tests
+"""
+
+import asyncio
+
+import pytest
+
+from services import checkpoint_ai_service, llm_cache, llm_gateway, transcript_digest
+
+# Eight parts with distinct topics, ~150 tokens each
+TRANSCRIPT = " ".join(f"Nesta parte estudamos o topico{i} com exemplos. " * 12 for i in range(8))
+
+
+@pytest.fixture(autouse=True)
+def small_digests(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "CACHE_PATH", str(tmp_path / "llm.sqlite3"))
+    monkeypatch.setattr(llm_cache, "CACHE_ENABLED", True)
+    monkeypatch.setattr(transcript_digest, "MIN_TOKENS", 500)
+    monkeypatch.setattr(transcript_digest, "CHUNK_TOKENS", 160)
+    monkeypatch.setattr(transcript_digest, "REDUCE_FAN_IN", 4)
+    transcript_digest.reset()
+    yield
+    llm_cache.close()
+    transcript_digest.reset()
+
+
+@pytest.fixture
+def fake_summaries(monkeypatch):
+    calls = []
+
+    async def fake_generate(contents, config, **kwargs):
+        calls.append(kwargs["purpose"])
+        await asyncio.sleep(0.01)
+        text = contents[0].parts[0].text
+        topics = sorted({w for w in text.split() if w.startswith("topico")})
+        return {"summary": "resumo " + " ".join(topics), "key_points": topics[:2]}
+
+    monkeypatch.setattr(llm_gateway, "generate_json", fake_generate)
+    return calls
+
+
+async def test_short_transcripts_are_not_digested(fake_summaries):
+    """Test transcripts below MIN_TOKENS are used raw, without any call."""
+    assert await transcript_digest.get_digest("Uma aula curta.") is None
+    assert fake_summaries == []
+
+
+async def test_digest_is_built_hierarchically_once_per_transcript(fake_summaries):
+    """Test chunks are mapped in parallel, reduced level by level, and the digest reused."""
+    first, second = await asyncio.gather(
+        transcript_digest.get_digest(TRANSCRIPT), transcript_digest.get_digest(TRANSCRIPT)
+    )
+
+    chunks = len(fake_summaries) - fake_summaries.count("digest_reduce")
+    assert chunks == len(transcript_digest.split_into_chunks(TRANSCRIPT)) > 4
+    # More chunks than REDUCE_FAN_IN: two reduce levels
+    assert fake_summaries.count("digest_reduce") == 3
+    assert first is second
+    assert "topico0" in first.overview and "topico7" in first.overview
+    assert "topico7" in first.section(0.75, 1.0) and "topico0" not in first.section(0.75, 1.0)
+
+    # Persisted for other workers: no calls after forgetting the in-memory copy
+    transcript_digest.reset()
+    calls = len(fake_summaries)
+    assert await transcript_digest.get_digest(" ".join(TRANSCRIPT.split())) == first
+    assert len(fake_summaries) == calls
+
+
+async def test_checkpoints_prompt_from_the_digest(fake_summaries, monkeypatch):
+    """Test each checkpoint segment gets its section summary plus short excerpts."""
+    prompts = []
+    summarize = llm_gateway.generate_json
+
+    async def fake_generate(contents, config, **kwargs):
+        if not kwargs["purpose"].startswith("checkpoint"):
+            return await summarize(contents, config, **kwargs)
+        prompts.append(contents[0].parts[0].text)
+        return [
+            {"segment": i, "question": f"Q{i}", "options": ["A", "B", "C", "D"],
+             "correct_answer": 0, "explanation": "."}
+            for i in range(1, 5)
+        ]
+
+    monkeypatch.setattr(checkpoint_ai_service, "api_key", "test-key")
+    monkeypatch.setattr(checkpoint_ai_service, "GENERATION_MODE", "batched")
+    monkeypatch.setattr(llm_gateway, "generate_json", fake_generate)
+
+    checkpoints = await checkpoint_ai_service.generate_checkpoint_questions(TRANSCRIPT, 400, "vid")
+
+    assert [c.question for c in checkpoints] == ["Q1", "Q2", "Q3", "Q4"]
+    [prompt] = prompts
+    assert prompt.count("Resumo do trecho: resumo") == 4
@@ -0,0 +1,169 @@
+"""
+Transcription Job Tests
+"""
+
+import asyncio
+import os
+import threading
+
+import pytest
+
+from services import transcription_jobs, transcription_service
+from services.transcription_jobs import TranscriptionJobManager
+from services.transcription_service import StoredUpload
+
+RESULT = {"transcript": "aula", "segments": [], "duration": 1.0, "provider": "gemini"}
+
+
+@pytest.fixture
+def fake_transcribe(monkeypatch):
+    """Replace the pipeline with one that reports chunk progress."""
+    calls = []
+    release = asyncio.Event()
+
+    async def transcribe_video(video_path, content_hash=None, size_bytes=0, on_progress=None):
+        calls.append(content_hash)
+        on_progress("audio_extracted", {"duration": 600.0})
+        await release.wait()
+        on_progress("chunk_transcribed", {"completed": 1, "total": 2})
+        on_progress("chunk_transcribed", {"completed": 2, "total": 2})
+        return RESULT
+
+    monkeypatch.setattr(transcription_service, "transcribe_video", transcribe_video)
+    return calls, release
+
+
+def _upload(tmp_path, name, content=b"video"):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return StoredUpload(str(path), "hash-" + content.decode(), len(content))
+
+
+async def test_job_runs_and_duplicates_attach(tmp_path, fake_transcribe):
+    """Test a job completes and identical media attaches to it."""
+    calls, release = fake_transcribe
+    manager = TranscriptionJobManager(jobs_dir=tmp_path / "jobs", workers=1)
+    await manager.start()
+    try:
+        job, created = await manager.submit(_upload(tmp_path, "a.mp4"), "a.mp4")
+        duplicate, duplicate_created = await manager.submit(_upload(tmp_path, "b.mp4"), "b.mp4")
+        assert created and not duplicate_created
+        assert duplicate["id"] == job["id"]
+
+        stages = []
+
+        async def follow():
+            async for state in manager.events(job["id"], poll_seconds=0.05):
+                stages.append(state["stage"])
+
+        follower = asyncio.create_task(follow())
+        await asyncio.sleep(0.05)
+        release.set()
+        await asyncio.wait_for(follower, timeout=2)
+
+        final = await manager.get(job["id"])
+        assert final["status"] == transcription_jobs.DONE
+        assert final["stage"] == "done"
+        assert final["result"] == RESULT
+        assert stages[-1] == "done"
+        assert calls == ["hash-video"]
+    finally:
+        await manager.stop()
+
+
+async def test_queued_jobs_survive_restart(tmp_path, fake_transcribe):
+    """Test a job queued before a restart is picked up by the new workers."""
+    _, release = fake_transcribe
+    release.set()
+    jobs_dir = tmp_path / "jobs"
+
+    first = TranscriptionJobManager(jobs_dir=jobs_dir, workers=0)
+    await first.start()
+    job, _ = await first.submit(_upload(tmp_path, "a.mp4"), "a.mp4")
+    await first.stop()
+
+    second = TranscriptionJobManager(jobs_dir=jobs_dir, workers=1)
+    await second.start()
+    try:
+        for _ in range(50):
+            if (await second.get(job["id"]))["status"] == transcription_jobs.DONE:
+                break
+            await asyncio.sleep(0.02)
+        assert (await second.get(job["id"]))["status"] == transcription_jobs.DONE
+    finally:
+        await second.stop()
+
+
+async def test_job_cancelled_while_running_is_recovered(tmp_path, fake_transcribe):
+    """Test a job interrupted by shutdown keeps its upload and runs after the restart."""
+    calls, release = fake_transcribe
+    jobs_dir = tmp_path / "jobs"
+
+    first = TranscriptionJobManager(jobs_dir=jobs_dir, workers=1)
+    await first.start()
+    job, _ = await first.submit(_upload(tmp_path, "a.mp4"), "a.mp4")
+    for _ in range(50):
+        if calls:
+            break
+        await asyncio.sleep(0.01)
+    await first.stop()  # cancels the running job
+
+    second = TranscriptionJobManager(jobs_dir=jobs_dir, workers=0)
+    await second.start()
+    interrupted = await second.get(job["id"])
+    await second.stop()
+    assert interrupted["status"] == transcription_jobs.QUEUED
+    assert os.path.exists(interrupted["video_path"])
+
+    release.set()
+    third = TranscriptionJobManager(jobs_dir=jobs_dir, workers=1)
+    await third.start()
+    try:
+        for _ in range(50):
+            if (await third.get(job["id"]))["status"] == transcription_jobs.DONE:
+                break
+            await asyncio.sleep(0.02)
+        final = await third.get(job["id"])
+        assert final["status"] == transcription_jobs.DONE
+        assert final["video_path"] is None
+        assert not os.path.exists(interrupted["video_path"])
+    finally:
+        await third.stop()
+
+
+async def test_finished_jobs_are_pruned_off_the_event_loop(tmp_path, fake_transcribe, monkeypatch):
+    """Test done jobs older than the TTL are deleted and the store never runs on the loop."""
+    _, release = fake_transcribe
+    release.set()
+    threads = set()
+    update = transcription_jobs.JobStore.update
+
+    def tracked_update(self, job_id, **fields):
+        threads.add(threading.current_thread())
+        update(self, job_id, **fields)
+
+    monkeypatch.setattr(transcription_jobs.JobStore, "update", tracked_update)
+    manager = TranscriptionJobManager(jobs_dir=tmp_path / "jobs", workers=1, ttl_seconds=0.2)
+    await manager.start()
+    try:
+        async def run(name, content):
+            job, _ = await manager.submit(_upload(tmp_path, name, content), name)
+            for _ in range(50):
+                if (await manager.get(job["id"]))["status"] == transcription_jobs.DONE:
+                    break
+                await asyncio.sleep(0.02)
+            return job
+
+        old = await run("a.mp4", b"old")
+        await asyncio.sleep(0.3)
+        new = await run("b.mp4", b"new")
+        for _ in range(50):
+            if await manager.get(old["id"]) is None:
+                break
+            await asyncio.sleep(0.02)
+
+        assert await manager.get(old["id"]) is None
+        assert (await manager.get(new["id"]))["status"] == transcription_jobs.DONE
+        assert threads and threading.main_thread() not in threads
+    finally:
+        await manager.stop()
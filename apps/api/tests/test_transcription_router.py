@@ -0,0 +1,154 @@
+"""
+Transcription Router Tests
+"""
+
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi import UploadFile
+
+from services import transcription_service
+
+
+async def test_save_upload_to_disk_streams_in_chunks():
+    """Test uploads are copied to disk chunk by chunk."""
+    payload = os.urandom(10_000)
+    upload = UploadFile(file=io.BytesIO(payload), filename="lecture.mp4")
+
+    stored = await transcription_service.save_upload_to_disk(upload, chunk_size=1024)
+    try:
+        assert stored.path.endswith(".mp4")
+        assert stored.size_bytes == len(payload)
+        assert stored.sha256 == hashlib.sha256(payload).hexdigest()
+        with open(stored.path, "rb") as f:
+            assert f.read() == payload
+    finally:
+        os.unlink(stored.path)
+
+
+async def test_save_upload_to_disk_rejects_oversized_upload():
+    """Test the size limit is enforced while streaming."""
+    upload = UploadFile(file=io.BytesIO(b"x" * 5000), filename="lecture.mp4")
+
+    with pytest.raises(transcription_service.UploadTooLargeError):
+        await transcription_service.save_upload_to_disk(upload, max_bytes=4096, chunk_size=1024)
+
+
+def test_transcribe_rejects_oversized_upload(client, monkeypatch):
+    """Test oversized uploads return 413 without reaching the providers."""
+    monkeypatch.setattr(transcription_service, "MAX_UPLOAD_BYTES", 1024)
+
+    response = client.post(
+        "/api/transcription/transcribe",
+        files={"file": ("lecture.mp4", b"x" * 4096, "video/mp4")},
+    )
+
+    assert response.status_code == 413
+
+
+def test_fast_profile_schedules_accurate_upgrade(client, monkeypatch):
+    """Test profile=fast&upgrade=true returns the preview plus an upgrade job id."""
+    from routers import transcription as transcription_router
+
+    calls = {}
+
+    async def fake_transcribe(path, content_hash=None, size_bytes=0, profile="accurate"):
+        calls["profile"] = profile
+        return {"transcript": "prévia", "segments": [], "profile": profile}
+
+    async def fake_submit(upload, filename=""):
+        os.unlink(upload.path)
+        return {"id": "job-1"}, True
+
+    monkeypatch.setattr(transcription_router, "transcribe_video", fake_transcribe)
+    monkeypatch.setattr(transcription_router.job_manager, "submit", fake_submit)
+
+    response = client.post(
+        "/api/transcription/transcribe?profile=fast&upgrade=true",
+        files={"file": ("lecture.mp4", b"video", "video/mp4")},
+    )
+
+    assert response.status_code == 200
+    assert calls["profile"] == "fast"
+    assert response.json()["upgrade_job_id"] == "job-1"
+
+
+def test_fast_profile_uses_cheaper_google_settings():
+    """Test the fast profile drops alternatives and punctuation at 8 kHz."""
+    config = transcription_service.google_recognition_config("flac", "fast", 8000)
+
+    assert config.model == "default"
+    assert config.sample_rate_hertz == 8000
+    assert list(config.alternative_language_codes) == []
+    assert not config.enable_automatic_punctuation
+
+
+async def test_stream_removes_upload_when_client_leaves_before_streaming(tmp_path):
+    """Test the upload is deleted even if the SSE generator never starts."""
+    from starlette.requests import ClientDisconnect
+
+    from routers import transcription as transcription_router
+
+    upload_path = tmp_path / "lecture.mp4"
+    upload_path.write_bytes(b"video")
+    started = []
+
+    async def body():
+        started.append(True)
+        yield "event: done\ndata: {}\n\n"
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        raise OSError("client went away")
+
+    response = transcription_router.UploadStreamingResponse(
+        str(upload_path), body(), media_type="text/event-stream"
+    )
+    scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+    with pytest.raises(ClientDisconnect):
+        await response(scope, receive, send)
+
+    assert started == []
+    assert not upload_path.exists()
+
+
+def test_stream_caches_transcript_and_replays_it(client, tmp_path, monkeypatch):
+    """Test a streamed transcript is cached and served without streaming again."""
+    from routers import transcription as transcription_router
+    from services import streaming_transcription, transcript_cache
+
+    monkeypatch.setattr(transcript_cache, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(transcript_cache, "CACHE_ENABLED", True)
+    monkeypatch.setattr(streaming_transcription, "is_available", lambda: True)
+    saved = []
+
+    async def recording_save(file):
+        upload = await transcription_service.save_upload_to_disk(file)
+        saved.append(upload.path)
+        return upload
+
+    streams = []
+
+    async def fake_segments(video_path):
+        streams.append(video_path)
+        yield {"start": 0.0, "end": 1.0, "text": "aula"}
+
+    monkeypatch.setattr(transcription_router, "save_upload_to_disk", recording_save)
+    monkeypatch.setattr(streaming_transcription, "iter_segments", fake_segments)
+
+    for _ in range(2):
+        response = client.post(
+            "/api/transcription/transcribe/stream",
+            files={"file": ("lecture.mp4", b"video", "video/mp4")},
+        )
+        assert response.status_code == 200
+        assert "event: done" in response.text
+        assert '"text": "aula"' in response.text
+
+    assert len(streams) == 1
+    assert len(saved) == 2
+    assert not any(os.path.exists(path) for path in saved)